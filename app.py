@@ -5,18 +5,277 @@ import secrets
 import logging
 import asyncio
 import time
+
+# Reference point for the startup time reported by /ready
+app_import_started = time.perf_counter()
+
+import json
+import atexit
 from fastapi import Request, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse, Response
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel
 from agno.os import AgentOS
 from agno.os.config import AgentOSConfig, ChatConfig
 
+from agno.run.agent import RunEvent
+from agno.models.response import ToolExecution
+
 # Import the medical agent
-from medical_agent_with_team import create_hausarzt_agent
+from medical_agent_with_team import (
+    create_hausarzt_agent,
+    team_progress_callback,
+    team_session_context,
+    patient_session_context,
+    consultation_run_context,
+    consultation_checkpoints,
+    get_team_report,
+    team_session_stats,
+    shared_db,
+    get_team_components,
+    team_ready,
+    team_build_stats,
+    LAZY_AGENTS,
+    consultation_cache,
+    inflight_team_consultations,
+)
+from consultation_store import create_consultation_store
+from history_compaction import compact_session_history, log_prompt_size
+from model_routing import model_routes, model_routing_stats
+from http_pool import http_pool_stats
+from tracing import trace_span, record_queue_time, render_prometheus
+from session_storage import session_storage_stats
+from prompt_caching import prompt_cache_stats
+from latency_control import latency_control_stats
+from consultation_scheduler import (
+    ConsultationScheduler,
+    ConsultationQueueFull,
+    is_urgent_case,
+    URGENT_PRIORITY,
+    ROUTINE_PRIORITY,
+)
+from consultation_workers import JobQueue, WorkerPool, CONSULTATION_QUEUE, CONSULTATION_WORKERS, JOB_POLL_SECONDS
+
+# Serve /metrics without login even when AUTH_PASSWORD is set
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() == "true"
 
 # --- Consultation Store ---
-consultation_store = {}  # run_id -> {status, result, timestamp}
+consultation_store = create_consultation_store()  # run_id -> {status, result, timestamp}
+consultation_events = {}  # run_id -> asyncio.Event, set on every status change or published event
+consultation_streams = {}  # run_id -> [(event, data)] tokens/progress published while RUNNING
+
+# Seconds between SSE keep-alive comments (keeps proxies from closing idle streams)
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+# Stream tokens and team progress of background consultations to the status stream
+STREAM_CONSULTATIONS = os.getenv("STREAM_CONSULTATIONS", "true").lower() == "true"
+
+def notify_consultation_listeners(run_id: str):
+    """Wake up all status streams waiting on this run."""
+    event = consultation_events.pop(run_id, None)
+    if event is not None:
+        event.set()
+
+def update_consultation(run_id: str, status: str, result=None):
+    """Write consultation state and wake up any stream waiting on this run."""
+    consultation_store.set(run_id, {
+        "status": status,
+        "result": result,
+        "timestamp": time.time()
+    })
+    if status == "RUNNING":
+        consultation_streams[run_id] = []
+    else:
+        consultation_streams.pop(run_id, None)
+        consultation_last_seen.pop(run_id, None)
+        consultation_checkpoints.finish(run_id)
+    notify_consultation_listeners(run_id)
+
+def publish_consultation_event(run_id: str, event: str, data: dict):
+    """Publish a token or progress event to the status streams of a running consultation."""
+    messages = consultation_streams.get(run_id)
+    if messages is None:
+        return
+    messages.append((event, data))
+    notify_consultation_listeners(run_id)
+
+def publish_queue_positions(positions: dict):
+    """Tell waiting clients their new position after the queue changed."""
+    for run_id, position in positions.items():
+        publish_consultation_event(run_id, "queue", {"queue_position": position})
+
+def get_consultation_status_record(run_id: str):
+    """Stored consultation state plus the live queue position (None once running)."""
+    consultation = consultation_store.get(run_id)
+    if not consultation and consultation_checkpoints.is_unfinished(run_id):
+        # Started by an instance that went away; resumed once its lease expires
+        consultation = {"status": "RUNNING", "result": None, "timestamp": time.time()}
+    if not consultation:
+        return None
+    if consultation_jobs is not None:
+        return {**consultation, "queue_position": job_queue_positions.get(run_id)}
+    return {**consultation, "queue_position": consultation_scheduler.queue_position(run_id)}
+
+# --- Consultation Scheduler ---
+# Bounded concurrency for team consultations; excess runs wait in a priority queue
+# (red-flag cases first) and are rejected with 429 once the queue is full.
+consultation_scheduler = ConsultationScheduler(on_queue_change=publish_queue_positions)
+
+# --- Consultation Worker Processes ---
+# With CONSULTATION_QUEUE=sqlite paused runs go to a SQLite job queue instead of the
+# in-process scheduler and are continued by separate worker processes; their progress
+# and results are relayed back into the consultation store by this instance.
+consultation_jobs = JobQueue() if CONSULTATION_QUEUE == "sqlite" else None
+consultation_workers = WorkerPool()
+job_relay_task = None
+job_queue_positions = {}  # run_id -> queue position of this instance's jobs, refreshed by the relay
+
+def schedule_consultation(run_id: str, session_id: str, tools: list, make_job, priority: int = ROUTINE_PRIORITY):
+    """Hand a paused run to the job queue or the in-process scheduler. Returns its queue position."""
+    if consultation_jobs is not None:
+        position = consultation_jobs.enqueue(run_id, session_id, [tool.to_dict() for tool in tools], priority)
+        job_queue_positions[run_id] = position
+        return position
+    return consultation_scheduler.submit(run_id, make_job, priority=priority)
+
+def poll_job_queue(last_event_id: int, delivered: list) -> tuple:
+    """One relay round of SQLite calls, run in a thread so lock waits don't block requests."""
+    for run_id in delivered:
+        consultation_jobs.acknowledge(run_id)
+    events, finished = consultation_jobs.updates(last_event_id)
+    requeued = consultation_jobs.requeue_stale()
+    return events, finished, requeued, consultation_jobs.queue_positions()
+
+async def relay_job_updates():
+    """Forward worker progress and results of this instance's jobs to the status endpoints."""
+    last_event_id = 0
+    delivered = []  # finished jobs acknowledged at the start of the next round
+    while True:
+        events, finished, requeued, positions = await asyncio.to_thread(poll_job_queue, last_event_id, delivered)
+        delivered = []
+        for event_id, run_id, event, data in events:
+            last_event_id = event_id
+            publish_consultation_event(run_id, event, data)
+
+        for job in finished:
+            run_id = job["run_id"]
+            consultation = consultation_store.get(run_id)
+            if consultation is None or consultation["status"] == "RUNNING":
+                update_consultation(run_id, job["status"], job["result"])
+            # The worker appended the finished run to the session; read it from disk next time
+            if hasattr(shared_db, "forget"):
+                shared_db.forget(job["session_id"])
+            delivered.append(run_id)
+
+        # Restart crashed worker processes; their jobs are queued again once the lease expires
+        consultation_workers.supervise()
+        for run_id in requeued:
+            print(f"♻️ Consultation worker lost, queued run_id {run_id} again")
+
+        changed = {run_id: position for run_id, position in positions.items() if job_queue_positions.get(run_id) != position}
+        job_queue_positions.clear()
+        job_queue_positions.update(positions)
+        if changed:
+            publish_queue_positions(changed)
+
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+def ensure_consultation_workers():
+    """Start the worker processes and the result relay on first use."""
+    global job_relay_task
+    if consultation_jobs is None or (job_relay_task is not None and not job_relay_task.done()):
+        return
+    if CONSULTATION_WORKERS > 0 and not consultation_workers.processes:
+        consultation_workers.start()
+        atexit.register(consultation_workers.stop)
+    job_relay_task = asyncio.create_task(relay_job_updates())
+
+# --- Abandoned Consultation Cleanup ---
+# Runs nobody has polled or streamed for this many seconds are cancelled (0 disables).
+# Polling clients check every 10 s and streams send keep-alives, so live clients stay fresh.
+CONSULTATION_ABANDON_SECONDS = float(os.getenv("CONSULTATION_ABANDON_SECONDS", "120"))
+consultation_last_seen = {}  # run_id -> time a client last observed the run
+abandon_watchdog_task = None
+
+def mark_consultation_seen(run_id: str):
+    consultation_last_seen[run_id] = time.time()
+
+def cancel_consultation_run(run_id: str, reason: str) -> bool:
+    """Cancel a queued or running consultation and mark it CANCELLED."""
+    consultation = consultation_store.get(run_id)
+    if consultation and consultation["status"] != "RUNNING":
+        return False
+    scheduler = consultation_jobs if consultation_jobs is not None else consultation_scheduler
+    if not scheduler.cancel(run_id):
+        return False
+    print(f"🛑 Consultation cancelled for run_id {run_id}: {reason}")
+    consultation_last_seen.pop(run_id, None)
+    update_consultation(run_id, "CANCELLED", f"Consultation cancelled: {reason}")
+    return True
+
+async def cancel_abandoned_consultations():
+    """Periodically cancel consultations no client has observed recently."""
+    while True:
+        await asyncio.sleep(min(CONSULTATION_ABANDON_SECONDS, 15))
+        cutoff = time.time() - CONSULTATION_ABANDON_SECONDS
+        scheduler = consultation_jobs if consultation_jobs is not None else consultation_scheduler
+        for run_id in scheduler.active_run_ids():
+            if consultation_last_seen.get(run_id, 0) < cutoff:
+                cancel_consultation_run(run_id, "no client observed the run")
+
+def ensure_abandon_watchdog():
+    """Start the abandoned-consultation watchdog on first use."""
+    global abandon_watchdog_task
+    if CONSULTATION_ABANDON_SECONDS > 0 and (abandon_watchdog_task is None or abandon_watchdog_task.done()):
+        abandon_watchdog_task = asyncio.create_task(cancel_abandoned_consultations())
+
+# --- Checkpoint Recovery ---
+# Keeps this instance's checkpointed consultations leased and resumes orphaned ones
+# (started by an instance that crashed or was recycled) from their last completed stage.
+checkpoint_recovery_task = None
+
+async def recover_orphaned_consultations():
+    """Periodically refresh own leases and resume consultations whose owner went away."""
+    while True:
+        consultation_checkpoints.refresh_leases()
+        for claim in consultation_checkpoints.claim_orphaned():
+            run_id = claim["run_id"]
+            print(f"♻️ Resuming orphaned consultation for run_id: {run_id}")
+            update_consultation(run_id, "RUNNING")
+            mark_consultation_seen(run_id)
+            try:
+                if consultation_jobs is not None:
+                    consultation_jobs.enqueue(run_id, claim["session_id"], claim["tools"])
+                else:
+                    consultation_scheduler.submit(run_id, lambda claim=claim: resume_consultation(claim))
+            except ConsultationQueueFull:
+                print(f"🚦 No slot to resume run_id {run_id}, leaving it for a later round")
+                consultation_checkpoints.release(run_id)
+        await asyncio.sleep(consultation_checkpoints.lease_seconds / 3)
+
+def ensure_checkpoint_recovery():
+    """Start the checkpoint lease/recovery loop on first use."""
+    global checkpoint_recovery_task
+    if consultation_checkpoints.enabled and (checkpoint_recovery_task is None or checkpoint_recovery_task.done()):
+        checkpoint_recovery_task = asyncio.create_task(recover_orphaned_consultations())
+
+# --- Team Warm-up ---
+# With LAZY_AGENTS the specialist team is built in a worker thread once the instance
+# serves its first request (typically the startup probe) instead of during the import.
+WARMUP_TEAM = os.getenv("WARMUP_TEAM", "true").lower() == "true"
+team_warmup_task = None
+
+def ensure_team_warmup():
+    """Start building the team in the background on first use."""
+    global team_warmup_task
+    if WARMUP_TEAM and team_warmup_task is None and not team_ready():
+        team_warmup_task = asyncio.create_task(asyncio.to_thread(get_team_components))
+
+# --- Concurrency Configuration ---
+# Upper bound for Hausarzt runs awaiting the model API at the same time.
+# Requests beyond this limit wait for a free slot instead of piling up on OpenAI.
+MAX_CONCURRENT_AGENT_RUNS = int(os.getenv("MAX_CONCURRENT_AGENT_RUNS", "32"))
+agent_run_semaphore = asyncio.Semaphore(MAX_CONCURRENT_AGENT_RUNS)
 
 # --- Logging Setup ---
 logger = logging.getLogger(__name__)
@@ -78,6 +337,14 @@ def main():
     print("📋 System: Europäische Hausarztpraxis mit 5-köpfigem Spezialistenteam")
     print("👨‍⚕️ Agent: Dr. Hausarzt (Patientenschnittstelle)")
     print("🔧 Tools: Medizinisches Team-Konsultationstool aktiviert")
+    print(f"⚙️ Max. parallele Agent-Läufe: {MAX_CONCURRENT_AGENT_RUNS}")
+    print(f"🗄️ Konsultationsspeicher: {consultation_store.stats()['backend']}")
+    if consultation_jobs is not None:
+        print(f"👷 Team-Konsultationen in Worker-Prozessen: {CONSULTATION_WORKERS or 'extern gestartet'} (Warteschlange: {consultation_jobs.max_queue_size})")
+    else:
+        print(f"🚦 Max. parallele Team-Konsultationen: {consultation_scheduler.max_concurrency} (Warteschlange: {consultation_scheduler.max_queue_size})")
+    print(f"🧠 Modelle: {', '.join(f'{role}={model}' for role, model in model_routes.items())}")
+    print(f"⏱️ App geladen in {app_startup_seconds:.2f}s (Team: {'bei Bedarf' if LAZY_AGENTS else 'sofort'} erstellt)")
     print("=" * 60)
 
     print("🌐 Verfügbare Endpunkte:")
@@ -97,6 +364,16 @@ def main():
 # Create the AgentOS and get FastAPI app
 agent_os, hausarzt_agent = create_medical_app()
 app = agent_os.get_app()
+app_startup_seconds = time.perf_counter() - app_import_started
+
+# --- Background Tasks Middleware ---
+@app.middleware("http")
+async def background_tasks_middleware(request: Request, call_next):
+    # Orphaned consultations are picked up and the team is built once the instance serves traffic
+    ensure_checkpoint_recovery()
+    ensure_team_warmup()
+    ensure_consultation_workers()
+    return await call_next(request)
 
 # --- Auth Middleware ---
 @app.middleware("http")
@@ -110,7 +387,9 @@ async def auth_middleware(request: Request, call_next):
         return response
 
     # Define public paths that don't require authentication
-    public_paths = ["/login", "/api/login", "/favicon.ico", "/docs", "/openapi.json"]
+    public_paths = ["/login", "/api/login", "/favicon.ico", "/docs", "/openapi.json", "/health", "/ready"]
+    if METRICS_PUBLIC:
+        public_paths.append("/metrics")  # Prometheus scrapers have no login cookie
     public_static_extensions = [".css", ".js", ".png", ".ico", ".svg"]
 
     # Check if current path is public
@@ -209,35 +488,223 @@ async def serve_ui():
     return FileResponse(os.path.join(STATIC_DIR, "index.html"))
 
 # --- Background Processing Function ---
-async def continue_consultation_in_background(agent, run_response):
+async def continue_consultation_in_background(agent, run_response, queued_at: float):
     """Continue agent consultation in background after tool confirmation."""
+    run_id = run_response.run_id
     try:
-        print(f"🔄 Background consultation started for run_id: {run_response.run_id}")
+        print(f"🔄 Background consultation started for run_id: {run_id}")
+        record_queue_time(time.perf_counter() - queued_at)
+        publish_consultation_event(run_id, "queue", {"queue_position": None})
 
         # Auto-confirm all tools requiring confirmation
         for tool in run_response.tools_requiring_confirmation:
             tool.confirmed = True
             print(f"✅ Auto-confirmed tool: {tool.tool_name}")
 
-        # Continue agent run
-        final_response = await agent.acontinue_run(run_response=run_response)
+        # Isolated team session per consultation, derived from the patient's session and run
+        team_session_context.set(f"team:{run_response.session_id}:{run_id}")
+        patient_session_context.set(run_response.session_id)
+        consultation_run_context.set(run_id)
 
-        # Store final result
-        consultation_store[run_response.run_id] = {
-            "status": "COMPLETED",
-            "result": final_response.content,
-            "timestamp": time.time()
+        # Works for both a paused RunOutput and a paused stream event
+        continue_args = {
+            "run_id": run_id,
+            "updated_tools": run_response.tools,
+            "session_id": run_response.session_id,
         }
 
-        print(f"✅ Background consultation completed for run_id: {run_response.run_id}")
+        with trace_span("hausarzt_continue", model=agent.model.id) as span:
+            if STREAM_CONSULTATIONS:
+                # Forward team member progress (may be reported from a worker thread)
+                loop = asyncio.get_running_loop()
+
+                def report_progress(event, data):
+                    loop.call_soon_threadsafe(publish_consultation_event, run_id, event, data)
+
+                team_progress_callback.set(report_progress)
+
+                # Continue agent run, forwarding Dr. Hausarzt's answer token by token
+                result = ""
+                metrics = None
+                async for event in agent.acontinue_run(
+                    stream=True,
+                    stream_intermediate_steps=True,
+                    **continue_args
+                ):
+                    if event.event == RunEvent.run_content and event.content:
+                        result += str(event.content)
+                        publish_consultation_event(run_id, "token", {"content": str(event.content)})
+                    elif event.event == RunEvent.run_completed:
+                        metrics = getattr(event, "metrics", None)
+                    elif event.event == RunEvent.run_error:
+                        raise RuntimeError(event.content)
+            else:
+                # Continue agent run
+                final_response = await agent.acontinue_run(stream=False, **continue_args)
+                result = final_response.content
+                metrics = final_response.metrics
+            span["metrics"] = metrics
+
+        log_prompt_size(run_response.session_id, None, metrics)
+
+        # Store final result (notifies open status streams)
+        update_consultation(run_id, "COMPLETED", result)
+
+        print(f"✅ Background consultation completed for run_id: {run_id}")
+
+    except asyncio.CancelledError:
+        print(f"🛑 Background consultation cancelled for run_id: {run_id}")
+        consultation = consultation_store.get(run_id)
+        if consultation is None or consultation["status"] == "RUNNING":
+            update_consultation(run_id, "CANCELLED", "Consultation cancelled")
+        raise
 
     except Exception as e:
         print(f"❌ Background consultation failed: {e}")
-        consultation_store[run_response.run_id] = {
-            "status": "ERROR",
-            "result": f"Error: {str(e)}",
-            "timestamp": time.time()
-        }
+        update_consultation(run_id, "ERROR", f"Error: {str(e)}")
+
+async def resume_consultation(claim: dict):
+    """Finish a checkpointed consultation started by another (gone) instance."""
+    run_id = claim["run_id"]
+    session_id = claim["session_id"]
+    try:
+        team_session_context.set(f"team:{session_id}:{run_id}")
+        patient_session_context.set(session_id)
+        consultation_run_context.set(run_id)
+
+        tools = [ToolExecution.from_dict(tool) for tool in claim["tools"]]
+        for tool in tools:
+            if tool.requires_confirmation:
+                tool.confirmed = True
+
+        try:
+            # The team tool picks up the checkpointed stages / report of this run
+            final_response = await hausarzt_agent.acontinue_run(
+                run_id=run_id, updated_tools=tools, session_id=session_id, stream=False
+            )
+            result = final_response.content
+        except Exception as e:
+            # The paused run lived in the old instance's session storage: deliver the team report itself
+            print(f"⚠️ Could not continue Dr. Hausarzt's run {run_id} ({e}), returning the team report")
+            summary = next(
+                ((tool.tool_args or {}).get("patient_summary", "")
+                 for tool in tools if tool.tool_name == "medical_team_consultation"),
+                None,
+            )
+            if summary is None:
+                print(f"❌ Checkpoint of run_id {run_id} has no team consultation to resume")
+                update_consultation(run_id, "ERROR", "Error: consultation could not be resumed")
+                return
+            result = await get_team_report(summary)
+
+        update_consultation(run_id, "COMPLETED", result)
+        print(f"✅ Resumed consultation completed for run_id: {run_id}")
+
+    except asyncio.CancelledError:
+        consultation = consultation_store.get(run_id)
+        if consultation is None or consultation["status"] == "RUNNING":
+            update_consultation(run_id, "CANCELLED", "Consultation cancelled")
+        raise
+
+    except Exception as e:
+        print(f"❌ Resumed consultation failed: {e}")
+        update_consultation(run_id, "ERROR", f"Error: {str(e)}")
+
+def start_team_consultation(run_response) -> dict:
+    """Register a paused run and schedule its continuation in the background."""
+    run_id = run_response.run_id
+    print(f"🚨 Agent paused - starting background consultation for run_id: {run_id}")
+
+    # Red-flag symptoms in the team request jump the queue
+    tool_input = " ".join(
+        str(tool.tool_args or "") for tool in run_response.tools_requiring_confirmation
+    )
+    priority = URGENT_PRIORITY if is_urgent_case(tool_input) else ROUTINE_PRIORITY
+
+    # Store initial running state
+    update_consultation(run_id, "RUNNING")
+    mark_consultation_seen(run_id)
+    ensure_abandon_watchdog()
+
+    # Persist what is needed to resume the run if this instance goes away
+    consultation_checkpoints.start(
+        run_id, run_response.session_id, [tool.to_dict() for tool in run_response.tools]
+    )
+    ensure_checkpoint_recovery()
+
+    # Start or enqueue background task
+    queued_at = time.perf_counter()
+    try:
+        queue_position = schedule_consultation(
+            run_id,
+            run_response.session_id,
+            run_response.tools,
+            lambda: continue_consultation_in_background(hausarzt_agent, run_response, queued_at),
+            priority=priority
+        )
+    except ConsultationQueueFull:
+        consultation_store.delete(run_id)
+        consultation_streams.pop(run_id, None)
+        consultation_last_seen.pop(run_id, None)
+        consultation_checkpoints.finish(run_id)
+        raise
+
+    if queue_position is not None:
+        print(f"⏳ Consultation queued at position {queue_position} (priority {priority}) for run_id: {run_id}")
+
+    # Return immediately with code word
+    return {"status": "TEAM_CONSULTATION_STARTED", "run_id": run_id, "queue_position": queue_position}
+
+def format_sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_consultation_start(message: str, session_id: str, user_id):
+    """Stream Dr. Hausarzt's answer as Server-Sent Events while it is generated."""
+    try:
+        content = ""
+        paused_event = None
+        metrics = None
+        history_tokens = compact_session_history(
+            hausarzt_agent.db, session_id, hausarzt_agent.num_history_runs
+        )
+
+        async with agent_run_semaphore:
+            with trace_span("hausarzt_run", model=hausarzt_agent.model.id) as span:
+                async for event in hausarzt_agent.arun(
+                    message,
+                    session_id=session_id,
+                    user_id=user_id,
+                    stream=True,
+                    stream_intermediate_steps=True
+                ):
+                    if event.event == RunEvent.run_content and event.content:
+                        content += str(event.content)
+                        yield format_sse("token", {"content": str(event.content)})
+                    elif event.event == RunEvent.run_paused:
+                        paused_event = event
+                    elif event.event == RunEvent.run_completed:
+                        metrics = getattr(event, "metrics", None)
+                    elif event.event == RunEvent.run_error:
+                        raise RuntimeError(event.content)
+                metrics = metrics or getattr(paused_event, "metrics", None)
+                span["metrics"] = metrics
+
+        log_prompt_size(session_id, history_tokens, metrics)
+
+        if paused_event is not None:
+            yield format_sse("status", start_team_consultation(paused_event))
+        else:
+            print("➡️ Direct response streamed (no team consultation needed)")
+            yield format_sse("status", {"status": "COMPLETED", "result": content})
+
+    except ConsultationQueueFull as e:
+        print(f"🚦 Consultation rejected: {e}")
+        yield format_sse("status", {"status": "ERROR", "result": f"Error: {str(e)}. Please try again later."})
+
+    except Exception as e:
+        print(f"❌ Error in streamed consultation: {e}")
+        yield format_sse("status", {"status": "ERROR", "result": f"Error: {str(e)}"})
 
 # --- API Endpoints for Consultation ---
 @app.post("/api/consultation")
@@ -250,44 +717,57 @@ async def start_consultation(request: Request):
         session_id = str(form_data.get("session_id", ""))
         user_id = form_data.get("user_id")
         user_id = str(user_id) if user_id else None
+        stream = str(form_data.get("stream", "false")).lower() == "true"
 
         if not message:
             raise HTTPException(status_code=400, detail="Message is required")
 
-        print(f"🤖 Starting consultation: message='{message[:50]}...', session_id='{session_id}'")
+        print(f"🤖 Starting consultation: message='{message[:50]}...', session_id='{session_id}', stream={stream}")
 
-        # Run agent (will pause at tools requiring confirmation)
-        run_response = hausarzt_agent.run(
-            message,
-            session_id=session_id,
-            user_id=user_id
-        )
+        if stream:
+            # Token streaming mode: answer tokens first, then the final status event
+            return StreamingResponse(
+                stream_consultation_start(message, session_id, user_id),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
 
-        print(f"🔍 Agent run completed. is_paused: {getattr(run_response, 'is_paused', 'NO_ATTRIBUTE')}")
+        # Keep the replayed history within the token budget
+        history_tokens = compact_session_history(
+            hausarzt_agent.db, session_id, hausarzt_agent.num_history_runs
+        )
 
-        if hasattr(run_response, 'is_paused') and run_response.is_paused:
-            print(f"🚨 Agent paused - starting background consultation for run_id: {run_response.run_id}")
+        # Run agent asynchronously (will pause at tools requiring confirmation).
+        # arun keeps the event loop free while waiting on the model API.
+        async with agent_run_semaphore:
+            with trace_span("hausarzt_run", model=hausarzt_agent.model.id) as span:
+                run_response = await hausarzt_agent.arun(
+                    message,
+                    session_id=session_id,
+                    user_id=user_id,
+                    stream=False
+                )
+                span["metrics"] = run_response.metrics
 
-            # Store initial running state
-            consultation_store[run_response.run_id] = {
-                "status": "RUNNING",
-                "result": None,
-                "timestamp": time.time()
-            }
+        log_prompt_size(session_id, history_tokens, run_response.metrics)
 
-            # Start background task
-            asyncio.create_task(continue_consultation_in_background(
-                hausarzt_agent, run_response
-            ))
+        print(f"🔍 Agent run completed. is_paused: {getattr(run_response, 'is_paused', 'NO_ATTRIBUTE')}")
 
-            # Return immediately with code word
-            return {"status": "TEAM_CONSULTATION_STARTED", "run_id": run_response.run_id}
+        if hasattr(run_response, 'is_paused') and run_response.is_paused:
+            return start_team_consultation(run_response)
 
         else:
             # Direct response (no tool call requiring confirmation)
             print("➡️ Direct response (no team consultation needed)")
             return {"status": "COMPLETED", "result": run_response.content}
 
+    except HTTPException:
+        raise
+
+    except ConsultationQueueFull as e:
+        print(f"🚦 Consultation rejected: {e}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+
     except Exception as e:
         print(f"❌ Error in consultation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -295,12 +775,175 @@ async def start_consultation(request: Request):
 @app.get("/api/consultation/{run_id}/status")
 async def get_consultation_status(run_id: str):
     """Get status of ongoing consultation for polling."""
-    consultation = consultation_store.get(run_id)
+    consultation = get_consultation_status_record(run_id)
     if not consultation:
         raise HTTPException(status_code=404, detail="Consultation not found")
 
+    mark_consultation_seen(run_id)
+
     print(f"📊 Status check for run_id {run_id}: {consultation['status']}")
     return consultation
 
+@app.delete("/api/consultation/{run_id}")
+async def cancel_consultation(run_id: str):
+    """Cancel a queued or running team consultation and free its slot."""
+    consultation = consultation_store.get(run_id)
+    if not consultation:
+        raise HTTPException(status_code=404, detail="Consultation not found")
+
+    if not cancel_consultation_run(run_id, "cancelled by client"):
+        # Already finished (or running on another instance): nothing to cancel
+        return {"run_id": run_id, "status": consultation["status"]}
+
+    return {"run_id": run_id, "status": "CANCELLED"}
+
+@app.get("/api/consultation-store/stats")
+async def get_consultation_store_stats():
+    """Report entry count, stored bytes and evictions of the consultation store."""
+    return {**consultation_store.stats(), "checkpoints": consultation_checkpoints.stats()}
+
+@app.get("/api/consultation-cache/stats")
+async def get_consultation_cache_stats():
+    """Report hits, misses and size of the team consultation cache."""
+    return {**consultation_cache.stats(), **inflight_team_consultations.stats()}
+
+@app.get("/api/team-sessions/stats")
+async def get_team_session_stats():
+    """Report number and memory usage of stored team sessions."""
+    return await asyncio.to_thread(team_session_stats)
+
+@app.get("/api/session-storage/stats")
+async def get_session_storage_stats():
+    """Report the session backend, memory-tier hits and runs trimmed by the per-session limits."""
+    return session_storage_stats(shared_db)
+
+@app.get("/api/consultation-scheduler/stats")
+async def get_consultation_scheduler_stats():
+    """Report running and queued team consultations."""
+    return consultation_scheduler.stats()
+
+@app.get("/api/consultation-jobs/stats")
+async def get_consultation_job_stats():
+    """Report the job queue and worker processes (CONSULTATION_QUEUE=sqlite)."""
+    if consultation_jobs is None:
+        return {"queue": CONSULTATION_QUEUE}
+    job_stats = await asyncio.to_thread(consultation_jobs.stats)
+    return {"queue": CONSULTATION_QUEUE, **job_stats, "workers": consultation_workers.stats()}
+
+@app.get("/api/model-routing/stats")
+async def get_model_routing_stats():
+    """Report the model per agent role and how often small-model answers were escalated."""
+    return model_routing_stats()
+
+@app.get("/api/latency-control/stats")
+async def get_latency_control_stats():
+    """Report agent call timeouts, retries, hedged calls and partial reports."""
+    return latency_control_stats()
+
+@app.get("/api/prompt-cache/stats")
+async def get_prompt_cache_stats():
+    """Report cached prompt tokens and time to first token per agent, and prefix changes."""
+    return prompt_cache_stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics: consultation spans, tokens, cost, current load and event totals."""
+    scheduler_stats = consultation_scheduler.stats()
+    cache_stats = consultation_cache.stats()
+    gauges = {
+        "consultation_scheduler_running": scheduler_stats["running"],
+        "consultation_scheduler_queued": scheduler_stats["queued"],
+        "consultation_store_entries": consultation_store.stats()["entries"],
+    }
+    counters = {
+        "consultation_cache_hits": cache_stats["hits"],
+        "consultation_cache_misses": cache_stats["misses"],
+        "openai_http_connections_opened": http_pool_stats()["connections_opened"],
+    }
+    if consultation_jobs is not None:
+        job_stats = await asyncio.to_thread(consultation_jobs.stats)
+        gauges["consultation_jobs_queued"] = job_stats["queued"]
+        gauges["consultation_jobs_running"] = job_stats["running"]
+        gauges["consultation_workers_alive"] = consultation_workers.stats()["alive"]
+    latency_stats = latency_control_stats()
+    for key in ("timeouts", "retries", "hedged", "hedge_wins", "partial_reports"):
+        counters[f"consultation_agent_calls_{key}"] = latency_stats[key]
+    return PlainTextResponse(render_prometheus(gauges, counters), media_type="text/plain; version=0.0.4")
+
+# AgentOS ships its own JSON /metrics router; serve the Prometheus endpoint first
+metrics_routes = [route for route in app.routes if isinstance(route, APIRoute) and route.endpoint is get_metrics]
+for route in metrics_routes:
+    app.router.routes.remove(route)
+    app.router.routes.insert(0, route)
+
+@app.get("/ready", include_in_schema=False)
+async def get_readiness():
+    """Readiness probe: 503 until the specialist team is built (when warm-up is enabled)."""
+    ready = team_ready() or not WARMUP_TEAM
+    return JSONResponse(
+        {"ready": ready, "startup_seconds": round(app_startup_seconds, 3), **team_build_stats()},
+        status_code=200 if ready else 503,
+    )
+
+@app.get("/api/http-pool/stats")
+async def get_http_pool_stats():
+    """Report requests and connection reuse of the shared OpenAI HTTP client."""
+    return http_pool_stats()
+
+@app.get("/api/consultation/{run_id}/stream")
+async def stream_consultation_status(run_id: str, request: Request):
+    """Push consultation status, answer tokens and team progress via Server-Sent Events."""
+    if not get_consultation_status_record(run_id):
+        raise HTTPException(status_code=404, detail="Consultation not found")
+
+    async def event_stream():
+        print(f"📡 Status stream opened for run_id {run_id}")
+        sent = 0
+        consultation = get_consultation_status_record(run_id)
+        if consultation and consultation["status"] == "RUNNING":
+            yield format_sse("status", consultation)
+
+        while True:
+            # Snapshot state and register the waiter without yielding in between,
+            # so no published event can slip past this stream. Checkpointed runs of a
+            # gone instance count as running until they are resumed here or elsewhere.
+            consultation = get_consultation_status_record(run_id)
+            if not consultation:
+                yield format_sse("status", {"status": "ERROR", "result": "Consultation not found"})
+                return
+
+            if consultation["status"] != "RUNNING":
+                yield format_sse("status", consultation)
+                print(f"📡 Status stream closed for run_id {run_id}: {consultation['status']}")
+                return
+
+            # An open stream counts as an observing client
+            mark_consultation_seen(run_id)
+
+            messages = consultation_streams.get(run_id, [])
+            pending = messages[sent:]
+            sent = len(messages)
+            waiter = consultation_events.setdefault(run_id, asyncio.Event())
+
+            # Replay/forward tokens and progress (late joiners get the full backlog)
+            for event_name, data in pending:
+                yield format_sse(event_name, data)
+
+            if await request.is_disconnected():
+                print(f"📡 Status stream client disconnected for run_id {run_id}")
+                return
+            try:
+                await asyncio.wait_for(waiter.wait(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Re-check the store on every keep-alive: with a shared backend the
+                # run may have been completed by another worker or instance.
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,180 @@
+# batch_consultations.py - Run many patient cases from JSONL through Dr. Hausarzt or the team
+#
+# Usage: python batch_consultations.py cases.jsonl results.jsonl --concurrency 8 --rate 2
+#
+# Team reports are not cached by default, so every case of an evaluation reaches the
+# specialists; pass --cache to reuse reports of equivalent patient summaries.
+#
+# Input: one case per line, either
+#   {"id": "case-1", "messages": ["Hallo Doktor, ...", "Seit zwei Tagen ..."]}   Hausarzt conversation
+#   {"id": "case-2", "patient_summary": "PATIENT: ...\nCHIEF COMPLAINT: ..."}    team report only
+# Output: one result per line, appended as cases finish. Re-running with the same
+# output file skips cases that already completed successfully.
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+from medical_agent_with_team import (
+    create_hausarzt_agent,
+    get_team_report,
+    patient_session_context,
+    consultation_cache,
+    MEDICAL_TEAM_MODE,
+)
+from http_pool import close_http_client
+
+
+class RateLimiter:
+    """Spaces out case starts to at most ``rate`` per second (0 disables)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def load_cases(path: str) -> list:
+    cases = []
+    with open(path, encoding="utf-8") as cases_file:
+        for line_number, line in enumerate(cases_file, start=1):
+            if not line.strip():
+                continue
+            case = json.loads(line)
+            case.setdefault("id", f"line-{line_number}")
+            if not case.get("messages") and not case.get("patient_summary"):
+                raise ValueError(f"Case {case['id']} needs 'messages' or 'patient_summary'")
+            cases.append(case)
+    return cases
+
+
+def completed_case_ids(path: str) -> set:
+    """Ids of cases with a successful result in an existing output file."""
+    if not os.path.exists(path):
+        return set()
+    completed = set()
+    with open(path, encoding="utf-8") as results_file:
+        for line in results_file:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partially written last line of an interrupted run
+            if result.get("status") == "ok":
+                completed.add(result["id"])
+    return completed
+
+
+async def run_hausarzt_conversation(hausarzt, messages: list, session_id: str) -> list:
+    """Send each patient message to Dr. Hausarzt, confirming team consultations automatically."""
+    responses = []
+    for message in messages:
+        run_response = await hausarzt.arun(message, session_id=session_id, stream=False)
+        team_consulted = False
+        if getattr(run_response, "is_paused", False):
+            for tool in run_response.tools_requiring_confirmation:
+                tool.confirmed = True
+            run_response = await hausarzt.acontinue_run(
+                run_id=run_response.run_id,
+                updated_tools=run_response.tools,
+                session_id=session_id,
+                stream=False,
+            )
+            team_consulted = True
+        responses.append({"message": message, "answer": run_response.content, "team_consulted": team_consulted})
+    return responses
+
+
+async def run_case(case: dict, hausarzt) -> dict:
+    session_id = f"batch_{case['id']}_{uuid.uuid4().hex[:6]}"
+    patient_session_context.set(session_id)
+    started = time.perf_counter()
+    try:
+        if case.get("messages"):
+            result = {"responses": await run_hausarzt_conversation(hausarzt, case["messages"], session_id)}
+        else:
+            result = {"team_report": await get_team_report(case["patient_summary"])}
+        status, error = "ok", None
+    except Exception as e:
+        result, status, error = {}, "error", str(e)
+    return {
+        "id": case["id"],
+        "status": status,
+        "error": error,
+        "mode": MEDICAL_TEAM_MODE,
+        "seconds": round(time.perf_counter() - started, 2),
+        **result,
+    }
+
+
+async def run_batch(cases: list, output_path: str, concurrency: int, rate: float, use_cache: bool = False) -> dict:
+    consultation_cache.enabled = use_cache
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+    hausarzt = create_hausarzt_agent()
+    counts = {"ok": 0, "error": 0}
+
+    with open(output_path, "a+", encoding="utf-8") as results_file:
+        # Start on a fresh line if an interrupted run left a partial last line
+        if results_file.tell() > 0:
+            results_file.seek(results_file.tell() - 1)
+            if results_file.read(1) != "\n":
+                results_file.write("\n")
+
+        async def process(case: dict):
+            async with semaphore:
+                await limiter.wait()
+                result = await run_case(case, hausarzt)
+            # Written as soon as the case finishes, so an interrupted batch can be resumed
+            results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            results_file.flush()
+            counts[result["status"]] += 1
+            icon = "✅" if result["status"] == "ok" else "❌"
+            print(f"{icon} {result['id']} ({result['seconds']}s) [{sum(counts.values())}/{len(cases)}]")
+
+        await asyncio.gather(*(process(case) for case in cases))
+
+    await close_http_client()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch consultations from a JSONL file")
+    parser.add_argument("input", help="JSONL file with one case per line")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=4, help="Cases processed at the same time")
+    parser.add_argument("--rate", type=float, default=0, help="Max. case starts per second (0 = unlimited)")
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=False,
+                        help="Reuse cached team reports of equivalent cases (default: --no-cache)")
+    parser.add_argument("--no-resume", action="store_true", help="Re-run cases already completed in the output file")
+    args = parser.parse_args()
+
+    cases = load_cases(args.input)
+    if not args.no_resume:
+        completed = completed_case_ids(args.output)
+        if completed:
+            print(f"♻️ Skipping {len(completed)} case(s) already completed in {args.output}")
+        cases = [case for case in cases if case["id"] not in completed]
+
+    print(f"🗂️ {len(cases)} case(s), concurrency {args.concurrency}, rate {args.rate or 'unlimited'}/s, "
+          f"mode {MEDICAL_TEAM_MODE}, cache {'on' if args.cache else 'off'}")
+    started = time.perf_counter()
+    counts = asyncio.run(run_batch(cases, args.output, args.concurrency, args.rate, args.cache))
+    print(f"🏁 {counts['ok']} ok, {counts['error']} failed in {time.perf_counter() - started:.1f}s")
+    sys.exit(1 if counts["error"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+# benchmark.py - Offline load benchmark of app.py against a local fake OpenAI server
+#
+# Usage: python benchmark.py --patients 50 --concurrency 10 [--stream] [--latency 0.2]
+#        python benchmark.py --specialist-latency 5 (with e.g. AGENT_DEADLINE_SECONDS=2)
+#        python benchmark.py --startup [--startup-runs 5]
+#
+# Starts an OpenAI-compatible stub in a subprocess, runs app.py in-process on a
+# background thread and drives /api/consultation plus the status/stream endpoints
+# with simulated patients. No network access or API key is needed. In team mode the
+# fake leader delegates to every specialist in turn, like the real sequential workflow.
+# --startup instead measures cold starts of app.py (import time, time to the first
+# answered request and to /ready) with eager and lazy agent construction.
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import resource
+import statistics
+import subprocess
+import threading
+import contextlib
+import multiprocessing
+
+import httpx
+
+from prompt_caching import static_prefix
+from tracing import span_seconds
+
+CONSULT_MARKER = "[consult]"
+TERMINAL_STATUSES = {"COMPLETED", "ERROR", "CANCELLED"}
+MEMBER_SPANS = ("triage", "clinical_assessment", "diagnostic", "investigation", "treatment")
+
+# Team members as listed in the team leader's system prompt ("   - ID: triage-agent")
+MEMBER_ID_PATTERN = re.compile(r"^\s*- ID: ([\w-]+)\s*$", re.MULTILINE)
+DELEGATION_TOOLS = ("delegate_task_to_member", "transfer_task_to_member")
+
+PATIENT_MESSAGES = [
+    "I have had a headache for two days and paracetamol barely helps.",
+    "Since yesterday evening I feel nauseous and have a fever of 38.5.",
+    "My knee hurts when I climb stairs, it started after jogging last week.",
+    "I get chest pressure when walking uphill, it goes away after resting.",
+    "I have been coughing for three weeks and feel tired all the time.",
+]
+
+
+# --- Fake OpenAI Server ---
+def sample_from_schema(schema: dict, definitions: dict):
+    """Minimal valid instance of a JSON schema (enough for structured outputs)."""
+    if "$ref" in schema:
+        return sample_from_schema(definitions[schema["$ref"].split("/")[-1]], definitions)
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return sample_from_schema(options[0], definitions) if options else None
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):
+        schema_type = next((item for item in schema_type if item != "null"), "string")
+    if schema_type == "object":
+        return {
+            name: sample_from_schema(prop, definitions)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        return [sample_from_schema(schema.get("items", {}), definitions)]
+    if schema_type == "integer":
+        return 1
+    if schema_type == "number":
+        return 1.0
+    if schema_type == "boolean":
+        return False
+    return "Benchmark placeholder text."
+
+
+def create_fake_openai_app(latency: float, token_rate: float, answer_tokens: int, specialist_latency: float = 0.0):
+    """OpenAI-compatible /v1/chat/completions with simulated latency and token rate.
+
+    ``specialist_latency`` is added to structured specialist answers, e.g. to run into
+    AGENT_DEADLINE_SECONDS / CONSULTATION_DEADLINE_SECONDS.
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    fake = FastAPI()
+    seen_prefixes = set()  # static prompt prefixes sent before (simulated provider prompt cache)
+
+    def plan_response(body: dict) -> dict:
+        messages = body.get("messages", [])
+        tool_names = {tool["function"]["name"] for tool in body.get("tools") or []}
+        last = messages[-1] if messages else {}
+        last_content = str(last.get("content") or "")
+
+        if "medical_team_consultation" in tool_names and last.get("role") == "user" \
+                and CONSULT_MARKER in last_content:
+            arguments = json.dumps({"patient_summary": f"PATIENT: simulated\nCHIEF COMPLAINT: {last_content}"})
+            return {"tool_call": {"name": "medical_team_consultation", "arguments": arguments}}
+
+        # Team leader: delegate to one member per turn until every member answered
+        delegation_tool = next((name for name in DELEGATION_TOOLS if name in tool_names), None)
+        if delegation_tool:
+            system = next(
+                (str(m.get("content") or "") for m in messages if m.get("role") in ("system", "developer")), ""
+            )
+            member_ids = MEMBER_ID_PATTERN.findall(system)
+            last_user = max((index for index, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+            delegated = sum(1 for m in messages[last_user + 1:] if m.get("role") == "tool")
+            if delegated < len(member_ids):
+                arguments = json.dumps({
+                    "member_id": member_ids[delegated],
+                    "task_description": "Assess the patient case from your specialty's perspective.",
+                    "expected_output": "Your specialist assessment.",
+                })
+                return {"tool_call": {"name": delegation_tool, "arguments": arguments}}
+        elif "delegate_task_to_members" in tool_names and messages and messages[-1].get("role") == "user":
+            arguments = json.dumps({"task_description": "Assess the patient case from your specialty's perspective."})
+            return {"tool_call": {"name": "delegate_task_to_members", "arguments": arguments}}
+
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            content = json.dumps(sample_from_schema(schema, schema.get("$defs", {})))
+            if "priority" in schema.get("properties", {}):
+                content = content.replace('"URGENT"', '"ROUTINE"')
+            return {"content": content, "extra_latency": specialist_latency}
+
+        words = ["Simulated", "answer"] + ["lorem"] * max(answer_tokens - 2, 0)
+        return {"content": " ".join(words)}
+
+    def usage(body: dict, completion_tokens: int) -> dict:
+        prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+        # Like OpenAI: a known prefix of at least 1024 tokens is cached in 128-token steps
+        prefix = static_prefix(body)
+        prefix_tokens = min(len(prefix) // 4, prompt_tokens)
+        cached_tokens = prefix_tokens // 128 * 128 if prefix in seen_prefixes and prefix_tokens >= 1024 else 0
+        seen_prefixes.add(prefix)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+
+    @fake.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        plan = plan_response(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+
+        tool_call = plan.get("tool_call")
+        tool_calls = [{
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": tool_call,
+        }] if tool_call else None
+        tokens = (plan.get("content") or "").split(" ") if not tool_call else []
+        finish_reason = "tool_calls" if tool_call else "stop"
+        first_token_latency = latency + plan.get("extra_latency", 0.0)
+
+        if not body.get("stream"):
+            await asyncio.sleep(first_token_latency + len(tokens) / token_rate)
+            message = {"role": "assistant", "content": plan.get("content")}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage(body, len(tokens) or 20),
+            }
+
+        def chunk(delta: dict, finish=None, **extra) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if delta is not None else [],
+                **extra,
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(first_token_latency)
+            yield chunk({"role": "assistant", "content": ""})
+            if tool_calls:
+                yield chunk({"tool_calls": [{"index": 0, **tool_calls[0]}]})
+            for index, token in enumerate(tokens):
+                await asyncio.sleep(1 / token_rate)
+                yield chunk({"content": token if index == 0 else " " + token})
+            yield chunk({}, finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(None, usage=usage(body, len(tokens) or 20))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return fake
+
+
+def serve_fake_openai(port: int, latency: float, token_rate: float, answer_tokens: int, specialist_latency: float = 0.0):
+    import uvicorn
+    uvicorn.run(create_fake_openai_app(latency, token_rate, answer_tokens, specialist_latency),
+                host="127.0.0.1", port=port, log_level="warning")
+
+
+def wait_for_port(port: int, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Fake OpenAI server did not start on port {port}")
+
+
+# --- App Under Test ---
+def percentile(values: list, percent: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class AppServer:
+    """Runs app.py with uvicorn on its own thread and samples its event-loop lag."""
+
+    def __init__(self, app_module, port: int, lag_interval: float = 0.05):
+        import uvicorn
+        self.app_module = app_module
+        self.lag_interval = lag_interval
+        self.lag_samples = []
+        self.server = uvicorn.Server(uvicorn.Config(
+            app_module.app, host="127.0.0.1", port=port, log_level="warning", loop="asyncio"
+        ))
+        self.thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+
+    async def _monitor_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.lag_samples.append(max(0.0, loop.time() - expected))
+
+    async def _serve(self):
+        monitor = asyncio.create_task(self._monitor_lag())
+        try:
+            await self.server.serve()
+        finally:
+            monitor.cancel()
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+# --- Load Driver ---
+async def follow_consultation(client: httpx.AsyncClient, run_id: str, use_stream: bool) -> str:
+    """Wait for a background team consultation to finish; returns its final status."""
+    if use_stream:
+        async with client.stream("GET", f"/api/consultation/{run_id}/stream") as response:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:") and event == "status":
+                    status = json.loads(line[5:])["status"]
+                    if status in TERMINAL_STATUSES:
+                        return status
+        return "DISCONNECTED"
+
+    while True:
+        response = await client.get(f"/api/consultation/{run_id}/status")
+        status = response.json()["status"]
+        if status in TERMINAL_STATUSES:
+            return status
+        await asyncio.sleep(0.2)
+
+
+async def simulate_patient(client: httpx.AsyncClient, args, results: dict):
+    session_id = f"bench_{uuid.uuid4().hex[:8]}"
+    for _ in range(args.turns):
+        message = random.choice(PATIENT_MESSAGES)
+        consult = random.random() < args.consult_ratio
+        if consult:
+            message = f"{message} {CONSULT_MARKER}"
+
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/consultation", data={"message": message, "session_id": session_id}
+        )
+        results["first_response"].append(time.perf_counter() - started)
+
+        if response.status_code == 429:
+            results["rejected"] += 1
+            continue
+        if response.status_code != 200:
+            results["errors"] += 1
+            continue
+
+        body = response.json()
+        status = body.get("status")
+        if status == "TEAM_CONSULTATION_STARTED":
+            status = await follow_consultation(client, body["run_id"], args.stream)
+            results["team_consultations"] += 1
+
+        results["end_to_end"].append(time.perf_counter() - started)
+        if status != "COMPLETED":
+            results["errors"] += 1
+
+
+async def drive_load(base_url: str, args) -> dict:
+    results = {"first_response": [], "end_to_end": [], "errors": 0, "rejected": 0, "team_consultations": 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        async def patient():
+            async with semaphore:
+                try:
+                    await simulate_patient(client, args, results)
+                except Exception as e:
+                    print(f"❌ Simulated patient failed: {e}", file=sys.stderr)
+                    results["errors"] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(patient() for _ in range(args.patients)))
+        results["seconds"] = time.perf_counter() - started
+    return results
+
+
+def print_report(args, results: dict, lag_samples: list, store_before: dict, store_after: dict,
+                 rss_before: float, rss_after: float, cache_stats: dict, span_stats: dict, latency_stats: dict):
+    requests = len(results["first_response"])
+    print("=" * 60)
+    print(f"Patients: {args.patients} × {args.turns} turn(s), concurrency {args.concurrency}, "
+          f"mode {os.environ.get('MEDICAL_TEAM_MODE', 'team')}, stream {args.stream}")
+    print(f"Fake model: latency {args.latency}s (+{args.specialist_latency}s specialists), {args.token_rate} tokens/s")
+    print("-" * 60)
+    print(f"{'Requests':<28}{requests:>12}")
+    print(f"{'Team consultations':<28}{results['team_consultations']:>12}")
+    print(f"{'Errors':<28}{results['errors']:>12}")
+    print(f"{'Rejected (429)':<28}{results['rejected']:>12}")
+    member_spans = sum(series["count"] for (span, _), series in span_stats.items() if span in MEMBER_SPANS)
+    print(f"{'Specialist spans':<28}{member_spans:>12}")
+    print(f"{'Agent call timeouts':<28}{latency_stats['timeouts']:>12}")
+    print(f"{'Partial reports':<28}{latency_stats['partial_reports']:>12}")
+    print(f"{'Throughput':<28}{requests / results['seconds']:>10.2f}/s")
+    for name in ("first_response", "end_to_end"):
+        values = results[name]
+        for percent in (50, 95, 99):
+            value = percentile(values, percent)
+            label = f"{name.replace('_', ' ')} p{percent}"
+            print(f"{label:<28}{value:>11.3f}s" if value is not None else f"{label:<28}{'-':>12}")
+    print(f"{'Event loop lag p99':<28}{(percentile(lag_samples, 99) or 0) * 1000:>10.1f}ms")
+    print(f"{'Event loop lag max':<28}{max(lag_samples, default=0) * 1000:>10.1f}ms")
+    print(f"{'Store entries':<28}{store_before['entries']:>5} → {store_after['entries']:<5}")
+    print(f"{'Store bytes':<28}{store_after['bytes'] - store_before['bytes']:>+12}")
+    print(f"{'Max RSS growth':<28}{rss_after - rss_before:>+10.1f}MB")
+    prompt_tokens = sum(span.get("prompt_tokens", 0) for span in cache_stats["spans"].values())
+    cached_tokens = sum(span.get("cached_tokens", 0) for span in cache_stats["spans"].values())
+    print(f"{'Cached prompt tokens':<28}{cached_tokens / prompt_tokens if prompt_tokens else 0:>11.1%}")
+    print(f"{'Prompt prefix changes':<28}{sum(p['changes'] for p in cache_stats['prefixes'].values()):>12}")
+    print("=" * 60)
+
+
+# --- Startup Benchmark ---
+IMPORT_PROBE = """import time
+started = time.perf_counter()
+import app
+print(time.perf_counter() - started)
+"""
+
+
+def wait_for_status(url: str, started: float, timeout: float) -> float:
+    """Seconds from ``started`` until ``url`` answers with 200."""
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def measure_cold_start(lazy: bool, port: int, timeout: float) -> dict:
+    """Start app.py in fresh interpreters: import time, then time to /health and /ready."""
+    env = {**os.environ, "LAZY_AGENTS": str(lazy).lower(), "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "benchmark")}
+    env.pop("AUTH_PASSWORD", None)
+    probe = subprocess.run([sys.executable, "-c", IMPORT_PROBE], env=env, capture_output=True, text=True, check=True)
+    import_seconds = float(probe.stdout.strip().splitlines()[-1])
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        first_request = wait_for_status(f"http://127.0.0.1:{port}/health", started, timeout)
+        ready = wait_for_status(f"http://127.0.0.1:{port}/ready", started, timeout)
+    finally:
+        server.terminate()
+        server.wait()
+    return {"import": import_seconds, "first_request": first_request, "ready": ready}
+
+
+def run_startup_benchmark(args):
+    print("=" * 60)
+    print(f"🚀 Cold start of app.py (median of {args.startup_runs} run(s))")
+    for lazy in (False, True):
+        runs = [measure_cold_start(lazy, args.app_port, args.timeout) for _ in range(args.startup_runs)]
+        medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(f"{'lazy' if lazy else 'eager':>6}: import {medians['import']:.2f}s | "
+              f"first request {medians['first_request']:.2f}s | ready {medians['ready']:.2f}s")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load benchmark for app.py")
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=1, help="Messages per simulated patient")
+    parser.add_argument("--consult-ratio", type=float, default=0.5,
+                        help="Share of messages that trigger a team consultation")
+    parser.add_argument("--stream", action="store_true", help="Follow consultations via SSE instead of polling")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake model time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Fake model tokens per second")
+    parser.add_argument("--specialist-latency", type=float, default=0.0,
+                        help="Extra fake latency of specialist answers (s), to exercise deadlines")
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--fake-port", type=int, default=8991)
+    parser.add_argument("--app-port", type=int, default=8992)
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own output")
+    parser.add_argument("--startup", action="store_true", help="Measure cold-start time instead of load")
+    parser.add_argument("--startup-runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.startup:
+        run_startup_benchmark(args)
+        return
+
+    fake_server = multiprocessing.Process(
+        target=serve_fake_openai,
+        args=(args.fake_port, args.latency, args.token_rate, args.answer_tokens, args.specialist_latency),
+        daemon=True,
+    )
+    fake_server.start()
+    wait_for_port(args.fake_port)
+
+    # Point every OpenAI client at the stub before app.py creates its models
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.fake_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ.pop("AUTH_PASSWORD", None)
+
+    quiet = open(os.devnull, "w") if not args.verbose else None
+    with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+        import app as app_module
+        server = AppServer(app_module, args.app_port)
+        server.start()
+
+        store_before = app_module.consultation_store.stats()
+        rss_before = max_rss_mb()
+        results = asyncio.run(drive_load(f"http://127.0.0.1:{args.app_port}", args))
+        store_after = app_module.consultation_store.stats()
+        rss_after = max_rss_mb()
+        cache_stats = app_module.prompt_cache_stats()
+        span_stats = span_seconds.summaries()
+        latency_stats = app_module.latency_control_stats()
+
+        server.stop()
+    fake_server.terminate()
+
+    print_report(args, results, server.lag_samples, store_before, store_after, rss_before, rss_after,
+                 cache_stats, span_stats, latency_stats)
+    sys.exit(1 if results["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
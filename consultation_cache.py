@@ -0,0 +1,241 @@
+# consultation_cache.py - Content-aware cache for team consultation results
+import os
+import re
+import json
+import time
+import asyncio
+import contextvars
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# --- Cache Configuration ---
+CONSULTATION_CACHE_TTL_SECONDS = float(os.getenv("CONSULTATION_CACHE_TTL_SECONDS", "1800"))
+CONSULTATION_CACHE_MAX_ENTRIES = int(os.getenv("CONSULTATION_CACHE_MAX_ENTRIES", "500"))
+# Optional on-disk tier that survives restarts (empty disables)
+CONSULTATION_CACHE_DB_FILE = os.getenv("CONSULTATION_CACHE_DB_FILE", "")
+
+# Fields of the tool input format defined in Dr. Hausarzt's instructions
+SUMMARY_FIELDS = [
+    "patient",
+    "chief complaint",
+    "onset",
+    "duration",
+    "location",
+    "quality",
+    "severity",
+    "associated symptoms",
+    "aggravating factors",
+    "alleviating factors",
+    "medical history",
+    "medications",
+    "clinical questions",
+]
+
+FIELD_PATTERN = re.compile(
+    r"^[\s\-*•]*(" + "|".join(re.escape(field) for field in SUMMARY_FIELDS) + r")\s*:\s*(.*)$",
+    re.IGNORECASE,
+)
+
+
+BULLET_PATTERN = re.compile(r"^\s*[-*•]\s+")
+# Words, numbers with units, and comparison/sign characters ("> 40", "HIV -")
+TOKEN_PATTERN = re.compile(r"[\w/.%]+|[<>=≤≥+\-]+")
+
+
+def normalize_words(text: str) -> str:
+    """Lowercase and drop punctuation, list bullets and extra whitespace.
+
+    Every word is kept in its original order: negations ("not radiating", "keine
+    Atemnot"), word order and signs ("fever > 40", "HIV -") can change the
+    clinical meaning of a summary.
+    """
+    words = TOKEN_PATTERN.findall(BULLET_PATTERN.sub("", text.lower()))
+    return " ".join(word.strip(".") for word in words if word.strip("."))
+
+
+def canonicalize_summary(patient_summary: str) -> dict:
+    """Extract the structured summary fields in a normalized form.
+
+    Repeated fields keep all their values in order and text before the first
+    field is kept as well; without any field the normalized full text is used.
+    """
+    fields = {}  # field -> list of values in order of appearance
+    preamble = []
+    current = None
+    for line in patient_summary.splitlines():
+        match = FIELD_PATTERN.match(line)
+        if match:
+            current = match.group(1).lower()
+            fields.setdefault(current, []).append(match.group(2))
+        elif not line.strip():
+            continue
+        elif current is None:
+            preamble.append(BULLET_PATTERN.sub("", line))
+        elif not line.strip().endswith(":"):  # section headings between fields carry no content
+            fields[current][-1] += " " + BULLET_PATTERN.sub("", line)
+
+    canonical = {field: [normalize_words(value) for value in values] for field, values in sorted(fields.items())}
+    if preamble:
+        canonical["text"] = normalize_words(" ".join(preamble))
+    return canonical
+
+
+def consultation_cache_key(patient_summary: str, mode: str = "") -> str:
+    canonical = canonicalize_summary(patient_summary)
+    payload = json.dumps({"mode": mode, "summary": canonical}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ConsultationCache:
+    """LRU + TTL cache of team reports with an optional SQLite tier.
+
+    A disabled cache neither serves nor stores reports (e.g. for batch evaluations
+    where every case must reach the team).
+    """
+
+    def __init__(self, ttl_seconds=CONSULTATION_CACHE_TTL_SECONDS,
+                 max_entries=CONSULTATION_CACHE_MAX_ENTRIES, db_file=CONSULTATION_CACHE_DB_FILE, enabled=True):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (content, timestamp), least recently used first
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+        self._conn = None
+        if db_file:
+            directory = os.path.dirname(db_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    """CREATE TABLE IF NOT EXISTS consultation_cache (
+                        key TEXT PRIMARY KEY,
+                        content TEXT NOT NULL,
+                        timestamp REAL NOT NULL
+                    )"""
+                )
+
+    def _remember(self, key: str, content: str, timestamp: float) -> None:
+        self._entries[key] = (content, timestamp)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                content, timestamp = entry
+                if now - timestamp <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return content
+                del self._entries[key]
+                self._evictions += 1
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT content, timestamp FROM consultation_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    self._remember(key, row[0], row[1])
+                    self._hits += 1
+                    self._disk_hits += 1
+                    return row[0]
+
+            self._misses += 1
+            return None
+
+    def set(self, key: str, content: str) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, content, now)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO consultation_cache (key, content, timestamp) VALUES (?, ?, ?)",
+                        (key, content, now),
+                    )
+                    self._conn.execute(
+                        "DELETE FROM consultation_cache WHERE timestamp < ?", (now - self.ttl_seconds,)
+                    )
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "disk_hits": self._disk_hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "disk_tier": self._conn is not None,
+        }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one shared task.
+
+    Callers arriving while a task for their key is running await that task
+    instead of starting their own. A caller that gets cancelled only detaches;
+    the shared task is cancelled once no caller is waiting for it anymore.
+
+    The shared task runs in an empty context, so it doesn't inherit the context
+    variables of whichever caller happened to start it. Callers pass what the
+    task needs to know about them as ``member``; ``members(key)`` lists the
+    members of the callers currently waiting.
+    """
+
+    def __init__(self):
+        self._inflight = {}  # key -> {"task": asyncio.Task, "waiters": int, "members": list}
+        self.coalesced = 0
+
+    async def run(self, key, factory, member=None):
+        entry = self._inflight.get(key)
+        if entry is None:
+            entry = {"task": None, "waiters": 0, "members": []}
+            entry["task"] = contextvars.Context().run(asyncio.ensure_future, factory())
+            self._inflight[key] = entry
+            entry["task"].add_done_callback(lambda _: self._forget(key, entry))
+        else:
+            self.coalesced += 1
+            print(f"🔗 Attached to in-flight team consultation ({entry['waiters']} waiting)")
+
+        entry["waiters"] += 1
+        if member is not None:
+            entry["members"].append(member)
+        try:
+            return await asyncio.shield(entry["task"])
+        finally:
+            entry["waiters"] -= 1
+            if member is not None:
+                entry["members"].remove(member)
+            if entry["waiters"] == 0 and not entry["task"].done():
+                entry["task"].cancel()
+
+    def members(self, key) -> list:
+        entry = self._inflight.get(key)
+        return list(entry["members"]) if entry is not None else []
+
+    def _forget(self, key, entry) -> None:
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {"inflight": len(self._inflight), "coalesced": self.coalesced}
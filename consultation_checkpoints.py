@@ -0,0 +1,178 @@
+# consultation_checkpoints.py - Durable progress of team consultations for resume after a restart
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Optional
+
+from pydantic import BaseModel
+
+from specialist_reports import SPECIALIST_SCHEMAS
+
+# --- Checkpoint Configuration ---
+# SQLite file for checkpoints (empty disables). Must live on a volume that survives
+# instance restarts (e.g. a mounted bucket/NFS share on Cloud Run) to be useful there.
+CONSULTATION_CHECKPOINT_DB = os.getenv("CONSULTATION_CHECKPOINT_DB", "tmp/checkpoints.db")
+# A consultation without checkpoint activity for this long is considered orphaned
+# and may be resumed by another instance
+CONSULTATION_CHECKPOINT_LEASE_SECONDS = float(os.getenv("CONSULTATION_CHECKPOINT_LEASE_SECONDS", "60"))
+
+# Stage name of the finished team report
+REPORT_STAGE = "report"
+
+
+def serialize_stage(content) -> str:
+    if isinstance(content, BaseModel):
+        return json.dumps({"type": "schema", "value": content.model_dump()})
+    return json.dumps({"type": "text", "value": content})
+
+
+def deserialize_stage(stage: str, payload: str):
+    data = json.loads(payload)
+    if data["type"] == "schema" and stage in SPECIALIST_SCHEMAS:
+        return SPECIALIST_SCHEMAS[stage].model_validate(data["value"])
+    return data["value"]
+
+
+class CheckpointStore:
+    """Persists unfinished consultations and their completed stages keyed by run_id.
+
+    Each instance owns the consultations it started; a consultation whose owner
+    stopped refreshing it for longer than the lease can be claimed and resumed.
+    """
+
+    def __init__(self, db_file=CONSULTATION_CHECKPOINT_DB, lease_seconds=CONSULTATION_CHECKPOINT_LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        self.instance_id = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self._conn = None
+        if not db_file:
+            return
+
+        directory = os.path.dirname(db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS checkpoint_runs (
+                    run_id TEXT PRIMARY KEY,
+                    session_id TEXT,
+                    tools TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    heartbeat REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS checkpoint_stages (
+                    run_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    PRIMARY KEY (run_id, stage)
+                )"""
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def start(self, run_id: str, session_id: str, tools: list) -> None:
+        """Register a consultation with the paused tool calls needed to continue it."""
+        if not self.enabled:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoint_runs (run_id, session_id, tools, owner, heartbeat) VALUES (?, ?, ?, ?, ?)",
+                (run_id, session_id, json.dumps(tools, default=str), self.instance_id, time.time()),
+            )
+
+    def save_stage(self, run_id: Optional[str], stage: str, content) -> None:
+        """Persist a completed stage and refresh the owner's lease.
+
+        Stages of runs that already finished (e.g. were cancelled) are not stored.
+        """
+        if not self.enabled or not run_id:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO checkpoint_stages (run_id, stage, content)
+                   SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM checkpoint_runs WHERE run_id = ?)""",
+                (run_id, stage, serialize_stage(content), run_id),
+            )
+            self._conn.execute(
+                "UPDATE checkpoint_runs SET heartbeat = ? WHERE run_id = ?", (time.time(), run_id)
+            )
+
+    def load_stages(self, run_id: Optional[str]) -> dict:
+        """Completed stages of a consultation (stage -> content)."""
+        if not self.enabled or not run_id:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, content FROM checkpoint_stages WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        return {stage: deserialize_stage(stage, content) for stage, content in rows}
+
+    def finish(self, run_id: str) -> None:
+        """Drop a consultation that reached a final state."""
+        if not self.enabled:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM checkpoint_stages WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM checkpoint_runs WHERE run_id = ?", (run_id,))
+
+    def refresh_leases(self) -> None:
+        """Keep all consultations of this instance (running or queued) owned by it."""
+        if not self.enabled:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE checkpoint_runs SET heartbeat = ? WHERE owner = ?", (time.time(), self.instance_id)
+            )
+
+    def release(self, run_id: str) -> None:
+        """Give up ownership so the next claim round (on any instance) takes the run."""
+        if not self.enabled:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE checkpoint_runs SET owner = '', heartbeat = 0 WHERE run_id = ?", (run_id,)
+            )
+
+    def is_unfinished(self, run_id: str) -> bool:
+        if not self.enabled:
+            return False
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM checkpoint_runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row is not None
+
+    def claim_orphaned(self) -> list:
+        """Take over consultations whose owner's lease expired (e.g. after a restart)."""
+        if not self.enabled:
+            return []
+        now = time.time()
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT run_id, session_id, tools FROM checkpoint_runs WHERE owner != ? AND heartbeat < ?",
+                (self.instance_id, now - self.lease_seconds),
+            ).fetchall()
+            claimed = []
+            for run_id, session_id, tools in rows:
+                cursor = self._conn.execute(
+                    "UPDATE checkpoint_runs SET owner = ?, heartbeat = ? WHERE run_id = ? AND heartbeat < ?",
+                    (self.instance_id, now, run_id, now - self.lease_seconds),
+                )
+                if cursor.rowcount:
+                    claimed.append({"run_id": run_id, "session_id": session_id, "tools": json.loads(tools)})
+        return claimed
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            runs = self._conn.execute("SELECT COUNT(*) FROM checkpoint_runs").fetchone()[0]
+            stages = self._conn.execute("SELECT COUNT(*) FROM checkpoint_stages").fetchone()[0]
+        return {"enabled": True, "instance_id": self.instance_id, "runs": runs, "stages": stages}
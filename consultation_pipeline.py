@@ -0,0 +1,350 @@
+# consultation_pipeline.py - Parallel specialist pipeline for team consultations
+import os
+import time
+import asyncio
+
+from medical_agent_with_team import (
+    triage_agent,
+    clinical_assessment_agent,
+    diagnostic_agent,
+    investigation_agent,
+    treatment_agent,
+    synthesis_agent,
+    medical_team,
+    team_progress_callback,
+    consultation_checkpoints,
+    consultation_run_ids,
+)
+from model_routing import TRIAGE_LEVEL_PATTERN, create_model, escalation_model
+from specialist_reports import TriageReport, report_as_text, render_team_report, render_partial_report
+from tracing import trace_span
+from latency_control import call_with_deadline, record_partial_report
+
+# --- Pipeline Definition ---
+# Stage name -> (agent, stages whose output it needs).
+# Stages without unfinished dependencies run concurrently:
+#   (Triage ‖ Clinical Assessment) → Diagnostic → (Investigation ‖ Treatment) → Synthesis
+PIPELINE_STAGES = {
+    "triage": (triage_agent, []),
+    "clinical_assessment": (clinical_assessment_agent, []),
+    "diagnostic": (diagnostic_agent, ["triage", "clinical_assessment"]),
+    "investigation": (investigation_agent, ["triage", "diagnostic"]),
+    "treatment": (treatment_agent, ["triage", "diagnostic"]),
+}
+
+STAGE_TITLES = {
+    "triage": "TRIAGE ASSESSMENT",
+    "clinical_assessment": "CLINICAL ASSESSMENT",
+    "diagnostic": "DIFFERENTIAL DIAGNOSIS",
+    "investigation": "RECOMMENDED INVESTIGATIONS",
+    "treatment": "TREATMENT PLAN",
+}
+
+
+# --- Adaptive Depth ---
+# Downstream stages per triage level (levels as defined in the triage agent's instructions).
+# URGENT skips everything after triage: the only right answer is immediate care.
+TRIAGE_DEPTH = {
+    "URGENT": {"triage"},
+    "ROUTINE": set(PIPELINE_STAGES),
+    "MONITOR": {"triage", "clinical_assessment", "treatment"},
+}
+
+# Output passed on in place of a dependency the triage level skipped
+# (MONITOR: treatment works from the clinical assessment instead of the diagnoses)
+SKIPPED_STAGE_STAND_INS = {"diagnostic": "clinical_assessment"}
+
+# Keep running the full pipeline in the background after an URGENT escalation
+URGENT_CONTINUE_FULL_PIPELINE = os.getenv("URGENT_CONTINUE_FULL_PIPELINE", "false").lower() == "true"
+
+background_reports = set()  # keeps background full-report tasks alive
+escalated_agents = {}  # (stage, model id) -> copy of the stage agent on the larger model
+
+
+def parse_triage_level(triage_output) -> str:
+    """Extract URGENT / ROUTINE / MONITOR from the triage agent's answer.
+
+    Uses the typed result if available, then an explicit "PRIORITY: <LEVEL>" line;
+    otherwise takes the most severe level mentioned. Defaults to ROUTINE (full
+    pipeline) when nothing is found.
+    """
+    if isinstance(triage_output, TriageReport):
+        return triage_output.priority
+
+    match = TRIAGE_LEVEL_PATTERN.search(triage_output or "")
+    if match:
+        return match.group(1).upper()
+
+    text = (triage_output or "").upper()
+    for level in ("URGENT", "ROUTINE", "MONITOR"):
+        if level in text:
+            return level
+    return "ROUTINE"
+
+
+def render_escalation(triage_output) -> str:
+    """Immediate escalation response for URGENT cases (no further LLM calls)."""
+    if isinstance(triage_output, TriageReport):
+        triage_output = triage_output.render()
+    return (
+        "## TRIAGE ASSESSMENT\n"
+        "**URGENT – immediate medical attention required.**\n\n"
+        f"{triage_output}\n\n"
+        "## FOLLOW-UP RECOMMENDATIONS\n"
+        "Seek emergency care now: call the emergency number 112 or go to the nearest "
+        "emergency department. Do not wait for further assessment or tests."
+    )
+
+
+def build_stage_input(patient_summary: str, dependency_outputs: dict) -> str:
+    """Compose the input of a stage from the patient case and its dependencies' outputs."""
+    parts = [f"PATIENT CASE FOR MEDICAL TEAM ANALYSIS:\n\n{patient_summary}"]
+    for stage, content in dependency_outputs.items():
+        parts.append(f"{STAGE_TITLES[stage]} (from colleague):\n\n{report_as_text(content)}")
+    return "\n\n".join(parts)
+
+
+def report_progress(event: str, data: dict):
+    """Forward progress to the web app if a callback is registered for this run."""
+    callback = team_progress_callback.get()
+    if callback is not None:
+        callback(event, data)
+
+
+def escalated_agent(stage: str, agent, model_id: str):
+    """Copy of a stage agent running on another model (created once per stage and model)."""
+    key = (stage, model_id)
+    if key not in escalated_agents:
+        escalated_agents[key] = agent.deep_copy(update={"model": create_model(model_id, stage)})
+    return escalated_agents[key]
+
+
+async def run_stage(stage: str, agent, patient_summary: str, dependency_outputs: dict) -> dict:
+    """Run a single specialist and time it.
+
+    Each call has the role's deadline, retries and optional hedging (see latency_control).
+    If a small model's answer fails the role's structural check, the stage is
+    re-run once on the large model (see model_routing).
+    """
+    report_progress("progress", {"member": agent.name, "stage": "started"})
+    started = time.perf_counter()
+
+    stage_input = build_stage_input(patient_summary, dependency_outputs)
+    with trace_span(stage, model=agent.model.id) as span:
+        response = await call_with_deadline(stage, lambda: agent.arun(stage_input, stream=False))
+        span["metrics"] = response.metrics
+
+    model_id = escalation_model(stage, response.content)
+    if model_id is not None:
+        print(f"⬆️ {agent.name} output failed structural check, retrying with {model_id}")
+        with trace_span(stage, model=model_id) as span:
+            escalated = escalated_agent(stage, agent, model_id)
+            response = await call_with_deadline(stage, lambda: escalated.arun(stage_input, stream=False))
+            span["metrics"] = response.metrics
+
+    seconds = time.perf_counter() - started
+    report_progress("progress", {"member": agent.name, "stage": "completed"})
+    print(f"⏱️ {agent.name} finished in {seconds:.1f}s")
+    # Typed results stay typed until the final report is rendered
+    return {"content": response.content or "", "seconds": seconds}
+
+
+async def run_consultation_pipeline(patient_summary: str, adaptive: bool = False, on_full_report=None,
+                                    deadline: float = None) -> dict:
+    """Run all specialists as a dependency graph and synthesize the final report.
+
+    With ``adaptive`` the parsed triage level decides which downstream stages run
+    (see TRIAGE_DEPTH). URGENT cases return an escalation response right after
+    triage; with URGENT_CONTINUE_FULL_PIPELINE the remaining stages still finish in
+    the background and ``on_full_report(content)`` receives the full report.
+
+    Stages completed by an earlier attempt of the same run (see consultation_checkpoints)
+    are restored instead of being run again; newly completed stages are checkpointed.
+
+    If the pipeline takes longer than ``deadline`` seconds, the unfinished stages are
+    cancelled and the content is a partial report of the stages completed so far.
+
+    Returns a dict with the final ``content``, per-stage results under ``stages``,
+    the ``triage_level`` (adaptive mode only) and the total wall time in ``seconds``.
+    """
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + deadline if deadline else None
+    restored = {}
+    for run_id in consultation_run_ids():
+        restored.update(consultation_checkpoints.load_stages(run_id))
+    tasks = {}
+    active_stages = set(PIPELINE_STAGES)
+    decision = {"triage_level": None}
+
+    async def run_when_ready(stage: str):
+        agent, dependencies = PIPELINE_STAGES[stage]
+        dependency_results = await asyncio.gather(*(tasks[dep] for dep in dependencies))
+        if stage not in active_stages:
+            print(f"⏭️ Skipping {agent.name} ({decision['triage_level']})")
+            return None
+
+        dependency_outputs = {}
+        for dep, result in zip(dependencies, dependency_results):
+            stand_in = SKIPPED_STAGE_STAND_INS.get(dep)
+            if result is None and stand_in is not None and stand_in not in dependency_outputs:
+                dep, result = stand_in, await tasks[stand_in]
+            if result is not None:
+                dependency_outputs[dep] = result["content"]
+        if stage in restored:
+            print(f"♻️ {agent.name} restored from checkpoint")
+            result = {"content": restored[stage], "seconds": 0.0}
+        else:
+            result = await run_stage(stage, agent, patient_summary, dependency_outputs)
+            for run_id in consultation_run_ids():
+                consultation_checkpoints.save_stage(run_id, stage, result["content"])
+
+        if adaptive and stage == "triage":
+            # Decide pipeline depth before any dependent stage starts
+            level = parse_triage_level(result["content"])
+            decision["triage_level"] = level
+            if not (level == "URGENT" and URGENT_CONTINUE_FULL_PIPELINE):
+                active_stages.intersection_update(TRIAGE_DEPTH[level])
+            print(f"🚦 Triage level {level}: running {', '.join(sorted(active_stages))}")
+        return result
+
+    # Tasks are created in definition order, so dependencies always exist already
+    for stage in PIPELINE_STAGES:
+        tasks[stage] = asyncio.ensure_future(run_when_ready(stage))
+
+    async def finish() -> dict:
+        try:
+            stage_results = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        results = {stage: result for stage, result in stage_results.items() if result is not None}
+        stage_outputs = {stage: result["content"] for stage, result in results.items()}
+
+        # Typed specialist results are assembled without another LLM call
+        rendered = render_team_report(stage_outputs, decision["triage_level"])
+        if rendered is not None:
+            results["synthesis"] = {"content": rendered, "seconds": 0.0}
+        else:
+            results["synthesis"] = await run_stage("synthesis", synthesis_agent, patient_summary, stage_outputs)
+        return results
+
+    async def until_deadline(awaitable):
+        if deadline_at is None:
+            return await awaitable
+        return await asyncio.wait_for(awaitable, max(deadline_at - loop.time(), 0))
+
+    def partial_result() -> dict:
+        """Partial report of the stages that completed before the deadline."""
+        for task in tasks.values():
+            task.cancel()
+        completed = {
+            stage: task.result()["content"]
+            for stage, task in tasks.items()
+            if task.done() and not task.cancelled() and task.exception() is None and task.result() is not None
+        }
+        missing = [STAGE_TITLES[stage] for stage in PIPELINE_STAGES if stage in active_stages and stage not in completed]
+        print(f"⏰ Consultation deadline of {deadline:g}s reached, returning {len(completed)} completed stage(s)")
+        record_partial_report()
+        return {
+            "content": render_partial_report(completed, missing),
+            "stages": {stage: {"content": content} for stage, content in completed.items()},
+            "triage_level": decision["triage_level"],
+            "seconds": time.perf_counter() - started,
+        }
+
+    if adaptive:
+        try:
+            triage = await until_deadline(tasks["triage"])
+        except asyncio.TimeoutError:
+            return partial_result()
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        if decision["triage_level"] == "URGENT":
+            if URGENT_CONTINUE_FULL_PIPELINE:
+                # Full report keeps running; the patient gets the escalation now
+                background = asyncio.ensure_future(finish())
+                background.add_done_callback(lambda task: deliver_full_report(task, on_full_report))
+                background_reports.add(background)
+                background.add_done_callback(background_reports.discard)
+            else:
+                for task in tasks.values():
+                    task.cancel()
+
+            return {
+                "content": render_escalation(triage["content"]),
+                "stages": {"triage": triage},
+                "triage_level": "URGENT",
+                "seconds": time.perf_counter() - started,
+            }
+
+    try:
+        results = await until_deadline(finish())
+    except asyncio.TimeoutError:
+        return partial_result()
+    return {
+        "content": results["synthesis"]["content"],
+        "stages": results,
+        "triage_level": decision["triage_level"],
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def deliver_full_report(task, on_full_report):
+    """Hand the background full report of an URGENT case to the caller."""
+    if task.cancelled() or task.exception() is not None:
+        print(f"❌ Background full report failed: {task.exception() if not task.cancelled() else 'cancelled'}")
+        return
+    print("📄 Full report for URGENT case completed in background")
+    if on_full_report is not None:
+        on_full_report(task.result()["synthesis"]["content"])
+
+
+# --- Latency Comparison ---
+SAMPLE_CASE = """PATIENT: 54, male
+CHIEF COMPLAINT: Pressure-like chest discomfort on exertion
+HISTORY OF PRESENT ILLNESS:
+- Onset: 3 days ago while climbing stairs
+- Duration: Episodes of 5-10 minutes
+- Location: Retrosternal, radiating to left arm
+- Quality: Pressure, tightness
+- Severity: 6/10, stops him from walking further
+- Associated symptoms: Mild shortness of breath, sweating
+- Aggravating factors: Exertion, cold air
+- Alleviating factors: Rest
+MEDICAL HISTORY: Hypertension, smoker (30 pack-years)
+MEDICATIONS: Ramipril 5 mg; no known allergies
+CLINICAL QUESTIONS: Urgency, likely causes, next diagnostic steps"""
+
+
+async def compare_modes(patient_summary: str = SAMPLE_CASE):
+    """Run the same case through the sequential team and the parallel pipeline."""
+    print("👥 Sequential team run...")
+    started = time.perf_counter()
+    await medical_team.arun(
+        f"PATIENT CASE FOR MEDICAL TEAM ANALYSIS:\n\n{patient_summary}\n\nPlease provide comprehensive analysis following your established workflow.",
+        stream=False,
+    )
+    sequential_seconds = time.perf_counter() - started
+
+    print("🔀 Parallel pipeline run...")
+    pipeline = await run_consultation_pipeline(patient_summary)
+
+    print("=" * 60)
+    print(f"{'Mode':<24}{'Wall time':>12}")
+    print(f"{'Sequential team':<24}{sequential_seconds:>11.1f}s")
+    print(f"{'Parallel pipeline':<24}{pipeline['seconds']:>11.1f}s")
+    print("-" * 60)
+    for stage, result in pipeline["stages"].items():
+        print(f"  {stage:<22}{result['seconds']:>11.1f}s")
+    print("=" * 60)
+    print(f"Speedup: {sequential_seconds / pipeline['seconds']:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(compare_modes())
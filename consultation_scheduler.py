@@ -0,0 +1,130 @@
+# consultation_scheduler.py - Admission control for background team consultations
+import os
+import heapq
+import asyncio
+import itertools
+from typing import Optional
+
+# --- Scheduler Configuration ---
+MAX_CONCURRENT_TEAM_CONSULTATIONS = int(os.getenv("MAX_CONCURRENT_TEAM_CONSULTATIONS", "4"))
+MAX_QUEUED_TEAM_CONSULTATIONS = int(os.getenv("MAX_QUEUED_TEAM_CONSULTATIONS", "50"))
+
+# Priorities (lower runs first)
+URGENT_PRIORITY = 0
+ROUTINE_PRIORITY = 1
+
+# Red-flag symptoms from the triage agent's URGENT criteria (chest pain, breathing
+# difficulty, severe symptoms). Summaries may be written in English or German.
+RED_FLAG_KEYWORDS = [
+    "chest pain", "chest pressure", "chest tightness", "brustschmerz", "brustdruck",
+    "engegefühl in der brust",
+    "breathing difficulty", "difficulty breathing", "shortness of breath", "dyspnea",
+    "dyspnoea", "atemnot", "kurzatmig", "luftnot",
+    "unconscious", "loss of consciousness", "syncope", "bewusstlos", "ohnmacht",
+    "stroke", "paralysis", "slurred speech", "schlaganfall", "lähmung",
+    "severe bleeding", "vomiting blood", "starke blutung", "bluterbrechen",
+    "suicidal", "suizid",
+    "anaphylaxis", "anaphylaxie",
+]
+
+
+def is_urgent_case(text: str) -> bool:
+    """Check a patient summary for red-flag symptoms."""
+    text = text.lower()
+    return any(keyword in text for keyword in RED_FLAG_KEYWORDS)
+
+
+class ConsultationQueueFull(Exception):
+    """Raised when no consultation slot and no queue space is available."""
+
+
+class ConsultationScheduler:
+    """Runs background consultations with bounded concurrency and a priority queue.
+
+    Jobs are zero-argument callables returning a coroutine, so queued work is only
+    created once a slot frees up. Urgent cases are dequeued before routine ones,
+    otherwise first come, first served.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENT_TEAM_CONSULTATIONS,
+                 max_queue_size=MAX_QUEUED_TEAM_CONSULTATIONS, on_queue_change=None):
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.on_queue_change = on_queue_change  # callback({run_id: position})
+        self._queue = []  # heap of (priority, sequence, run_id, job)
+        self._running = {}  # run_id -> asyncio.Task
+        self._sequence = itertools.count()
+
+    def submit(self, run_id: str, job, priority: int = ROUTINE_PRIORITY) -> Optional[int]:
+        """Start or enqueue a job. Returns its queue position (None if started)."""
+        if len(self._running) < self.max_concurrency:
+            self._start(run_id, job)
+            return None
+
+        if len(self._queue) >= self.max_queue_size:
+            raise ConsultationQueueFull(
+                f"Consultation queue is full ({self.max_queue_size} waiting)"
+            )
+
+        heapq.heappush(self._queue, (priority, next(self._sequence), run_id, job))
+        self._notify_queue_change()
+        return self.queue_position(run_id)
+
+    def _start(self, run_id: str, job) -> None:
+        task = asyncio.create_task(job())
+        self._running[run_id] = task
+        task.add_done_callback(lambda _: self._on_done(run_id))
+
+    def _on_done(self, run_id: str) -> None:
+        self._running.pop(run_id, None)
+
+        started = False
+        while self._queue and len(self._running) < self.max_concurrency:
+            _, _, next_run_id, job = heapq.heappop(self._queue)
+            print(f"▶️ Dequeued consultation for run_id: {next_run_id}")
+            self._start(next_run_id, job)
+            started = True
+
+        if started:
+            self._notify_queue_change()
+
+    def cancel(self, run_id: str) -> bool:
+        """Drop a queued job or cancel a running one. Returns False if unknown."""
+        for index, entry in enumerate(self._queue):
+            if entry[2] == run_id:
+                self._queue.pop(index)
+                heapq.heapify(self._queue)
+                self._notify_queue_change()
+                return True
+
+        task = self._running.get(run_id)
+        if task is not None:
+            # Cancels the awaited model calls; the slot frees up once the task unwinds
+            task.cancel()
+            return True
+
+        return False
+
+    def active_run_ids(self) -> list:
+        """Run ids that are running or waiting in the queue."""
+        return list(self._running) + [entry[2] for entry in self._queue]
+
+    def _notify_queue_change(self) -> None:
+        if self.on_queue_change is not None:
+            self.on_queue_change(self.queue_positions())
+
+    def queue_positions(self) -> dict:
+        """Map queued run_ids to their 1-based position."""
+        return {entry[2]: position for position, entry in enumerate(sorted(self._queue), start=1)}
+
+    def queue_position(self, run_id: str) -> Optional[int]:
+        """1-based queue position of a run, or None if it is running or unknown."""
+        return self.queue_positions().get(run_id)
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "queued": len(self._queue),
+            "max_concurrency": self.max_concurrency,
+            "max_queue_size": self.max_queue_size,
+        }
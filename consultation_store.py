@@ -0,0 +1,212 @@
+# consultation_store.py - Storage for background consultation state
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# --- Store Configuration ---
+CONSULTATION_STORE = os.getenv("CONSULTATION_STORE", "memory")  # memory | sqlite
+CONSULTATION_DB_FILE = os.getenv("CONSULTATION_DB_FILE", "tmp/consultations.db")
+CONSULTATION_TTL_SECONDS = float(os.getenv("CONSULTATION_TTL_SECONDS", "3600"))
+CONSULTATION_MAX_ENTRIES = int(os.getenv("CONSULTATION_MAX_ENTRIES", "1000"))
+CONSULTATION_MAX_BYTES = int(os.getenv("CONSULTATION_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+def record_size(record: dict) -> int:
+    """Approximate memory footprint of a stored record (serialized size in bytes)."""
+    return len(json.dumps(record, default=str).encode("utf-8"))
+
+
+class ConsultationStore:
+    """Interface for consultation state keyed by run_id.
+
+    Records are dicts of the form {status, result, timestamp}.
+    """
+
+    def get(self, run_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def set(self, run_id: str, record: dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, run_id: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+    def __contains__(self, run_id: str) -> bool:
+        return self.get(run_id) is not None
+
+
+class InMemoryConsultationStore(ConsultationStore):
+    """Process-local store with TTL expiry and LRU eviction by entry count and size."""
+
+    def __init__(self, ttl_seconds=CONSULTATION_TTL_SECONDS,
+                 max_entries=CONSULTATION_MAX_ENTRIES, max_bytes=CONSULTATION_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._records = OrderedDict()  # run_id -> (record, size), least recently used first
+        self._bytes = 0
+        self._evictions = 0
+
+    def _is_expired(self, record: dict, now: float) -> bool:
+        return now - record["timestamp"] > self.ttl_seconds
+
+    def _remove(self, run_id: str) -> None:
+        _, size = self._records.pop(run_id)
+        self._bytes -= size
+
+    def _evict(self) -> None:
+        now = time.time()
+        while self._records:
+            run_id, (record, _) = next(iter(self._records.items()))
+            over_limit = len(self._records) > self.max_entries or self._bytes > self.max_bytes
+            if not over_limit and not self._is_expired(record, now):
+                break
+            self._remove(run_id)
+            self._evictions += 1
+
+    def get(self, run_id: str) -> Optional[dict]:
+        entry = self._records.get(run_id)
+        if entry is None:
+            return None
+        record, _ = entry
+        if self._is_expired(record, time.time()):
+            self._remove(run_id)
+            self._evictions += 1
+            return None
+        self._records.move_to_end(run_id)
+        return record
+
+    def set(self, run_id: str, record: dict) -> None:
+        if run_id in self._records:
+            self._remove(run_id)
+        size = record_size(record)
+        self._records[run_id] = (record, size)
+        self._bytes += size
+        self._evict()
+
+    def delete(self, run_id: str) -> None:
+        if run_id in self._records:
+            self._remove(run_id)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "entries": len(self._records),
+            "bytes": self._bytes,
+            "evictions": self._evictions,
+        }
+
+
+class SqliteConsultationStore(ConsultationStore):
+    """SQLite-backed store shared by all workers/instances that mount the same file."""
+
+    def __init__(self, db_file=CONSULTATION_DB_FILE, ttl_seconds=CONSULTATION_TTL_SECONDS,
+                 max_entries=CONSULTATION_MAX_ENTRIES, max_bytes=CONSULTATION_MAX_BYTES):
+        self.db_file = db_file
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS consultations (
+                    run_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    timestamp REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_consultations_accessed ON consultations (accessed)"
+            )
+
+    def _evict(self) -> None:
+        now = time.time()
+        cursor = self._conn.execute(
+            "DELETE FROM consultations WHERE timestamp < ?", (now - self.ttl_seconds,)
+        )
+        self._evictions += cursor.rowcount
+
+        count, total_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM consultations"
+        ).fetchone()
+        while count > self.max_entries or total_bytes > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT run_id, size FROM consultations ORDER BY accessed LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM consultations WHERE run_id = ?", (row[0],))
+            self._evictions += 1
+            count -= 1
+            total_bytes -= row[1]
+
+    def get(self, run_id: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT status, result, timestamp FROM consultations WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[2] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM consultations WHERE run_id = ?", (run_id,))
+                self._evictions += 1
+                return None
+            self._conn.execute(
+                "UPDATE consultations SET accessed = ? WHERE run_id = ?", (now, run_id)
+            )
+        return {"status": row[0], "result": json.loads(row[1]), "timestamp": row[2]}
+
+    def set(self, run_id: str, record: dict) -> None:
+        result = json.dumps(record.get("result"), default=str)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO consultations
+                   (run_id, status, result, timestamp, accessed, size)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (run_id, record["status"], result, record["timestamp"], time.time(), record_size(record)),
+            )
+            self._evict()
+
+    def delete(self, run_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM consultations WHERE run_id = ?", (run_id,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM consultations"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "entries": count,
+            "bytes": total_bytes,
+            "evictions": self._evictions,
+        }
+
+
+def create_consultation_store() -> ConsultationStore:
+    """Create the consultation store selected via CONSULTATION_STORE."""
+    if CONSULTATION_STORE == "sqlite":
+        return SqliteConsultationStore()
+    if CONSULTATION_STORE == "memory":
+        return InMemoryConsultationStore()
+    raise ValueError(f"Unknown CONSULTATION_STORE: {CONSULTATION_STORE}")
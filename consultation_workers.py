@@ -0,0 +1,412 @@
+# consultation_workers.py - SQLite job queue and worker processes for team consultations
+#
+# With CONSULTATION_QUEUE=sqlite the web app enqueues paused Dr. Hausarzt runs instead
+# of continuing them in its own event loop. Worker processes claim the jobs, continue
+# the runs and write progress and results back; the app relays them to the status
+# endpoints. The paused runs are read from the shared session database, so
+# SESSION_DB_FILE must be set (see session_storage.py).
+#
+# Usage: python consultation_workers.py --workers 4
+#        (workers next to an app started with CONSULTATION_WORKERS=0)
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import argparse
+import threading
+import subprocess
+from typing import Optional
+
+from consultation_scheduler import ConsultationQueueFull, MAX_QUEUED_TEAM_CONSULTATIONS, ROUTINE_PRIORITY
+
+# --- Job Queue Configuration ---
+CONSULTATION_QUEUE = os.getenv("CONSULTATION_QUEUE", "inprocess")  # inprocess | sqlite
+CONSULTATION_QUEUE_DB = os.getenv("CONSULTATION_QUEUE_DB", "tmp/consultation_jobs.db")
+# Worker processes started by the web app (0: run them separately with this script)
+CONSULTATION_WORKERS = int(os.getenv("CONSULTATION_WORKERS", "2"))
+# Consultations one worker process continues at the same time
+CONSULTATION_WORKER_CONCURRENCY = int(os.getenv("CONSULTATION_WORKER_CONCURRENCY", "2"))
+# A running job whose worker sent no heartbeat for this long is queued again
+CONSULTATION_JOB_LEASE_SECONDS = float(os.getenv("CONSULTATION_JOB_LEASE_SECONDS", "30"))
+
+JOB_POLL_SECONDS = 0.2
+TOKEN_FLUSH_SECONDS = 0.25  # answer tokens are written in batches, not one row per token
+TERMINAL_STATUSES = ("COMPLETED", "ERROR", "CANCELLED")
+
+
+class JobQueue:
+    """Team consultation jobs and their progress events in a SQLite file.
+
+    Jobs belong to the app instance that enqueued them (``owner``); only that
+    instance relays their events and results. Lower priority values run first,
+    otherwise first come, first served.
+    """
+
+    def __init__(self, db_file=CONSULTATION_QUEUE_DB, lease_seconds=CONSULTATION_JOB_LEASE_SECONDS,
+                 max_queue_size=MAX_QUEUED_TEAM_CONSULTATIONS):
+        self.lease_seconds = lease_seconds
+        self.max_queue_size = max_queue_size
+        self.instance_id = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        directory = os.path.dirname(db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS consultation_jobs (
+                    run_id TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    session_id TEXT,
+                    tools TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    worker TEXT,
+                    heartbeat REAL,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    result TEXT
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS consultation_job_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    data TEXT NOT NULL
+                )"""
+            )
+
+    # --- App side ---
+    def enqueue(self, run_id: str, session_id: str, tools: list, priority: int = ROUTINE_PRIORITY) -> int:
+        """Queue a paused run for the workers. Returns its queue position."""
+        with self._lock, self._conn:
+            queued = self._conn.execute(
+                "SELECT COUNT(*) FROM consultation_jobs WHERE status = 'QUEUED'"
+            ).fetchone()[0]
+            if queued >= self.max_queue_size:
+                raise ConsultationQueueFull(f"Consultation queue is full ({self.max_queue_size} waiting)")
+            self._conn.execute(
+                """INSERT OR REPLACE INTO consultation_jobs
+                   (run_id, owner, session_id, tools, priority, enqueued_at, status)
+                   VALUES (?, ?, ?, ?, ?, ?, 'QUEUED')""",
+                (run_id, self.instance_id, session_id, json.dumps(tools, default=str), priority, time.time()),
+            )
+        return self.queue_positions().get(run_id)
+
+    def queue_positions(self) -> dict:
+        """Map this instance's queued run_ids to their 1-based position in the shared queue."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT run_id, owner FROM consultation_jobs WHERE status = 'QUEUED' ORDER BY priority, enqueued_at"
+            ).fetchall()
+        return {run_id: position for position, (run_id, owner) in enumerate(rows, start=1) if owner == self.instance_id}
+
+    def active_run_ids(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT run_id FROM consultation_jobs WHERE owner = ? AND status IN ('QUEUED', 'RUNNING')",
+                (self.instance_id,),
+            ).fetchall()
+        return [run_id for (run_id,) in rows]
+
+    def cancel(self, run_id: str) -> bool:
+        """Drop a queued job or ask its worker to cancel a running one. Returns False if unknown."""
+        with self._lock, self._conn:
+            queued = self._conn.execute(
+                "UPDATE consultation_jobs SET status = 'CANCELLED' WHERE run_id = ? AND status = 'QUEUED'", (run_id,)
+            ).rowcount
+            running = self._conn.execute(
+                "UPDATE consultation_jobs SET cancel_requested = 1 WHERE run_id = ? AND status = 'RUNNING'", (run_id,)
+            ).rowcount
+        return bool(queued or running)
+
+    def updates(self, after_event_id: int) -> tuple:
+        """New progress events and finished jobs of this instance."""
+        with self._lock:
+            events = self._conn.execute(
+                """SELECT e.id, e.run_id, e.event, e.data FROM consultation_job_events e
+                   JOIN consultation_jobs j ON j.run_id = e.run_id
+                   WHERE e.id > ? AND j.owner = ? ORDER BY e.id""",
+                (after_event_id, self.instance_id),
+            ).fetchall()
+            finished = self._conn.execute(
+                f"""SELECT run_id, session_id, status, result FROM consultation_jobs
+                    WHERE owner = ? AND status IN ({', '.join('?' * len(TERMINAL_STATUSES))})""",
+                (self.instance_id, *TERMINAL_STATUSES),
+            ).fetchall()
+        return (
+            [(event_id, run_id, event, json.loads(data)) for event_id, run_id, event, data in events],
+            [{"run_id": run_id, "session_id": session_id, "status": status, "result": result}
+             for run_id, session_id, status, result in finished],
+        )
+
+    def acknowledge(self, run_id: str) -> None:
+        """Remove a finished job once its result was delivered."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM consultation_job_events WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM consultation_jobs WHERE run_id = ?", (run_id,))
+
+    def requeue_stale(self) -> list:
+        """Queue running jobs again whose worker stopped sending heartbeats (e.g. it crashed)."""
+        cutoff = time.time() - self.lease_seconds
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT run_id FROM consultation_jobs WHERE status = 'RUNNING' AND heartbeat < ?", (cutoff,)
+            ).fetchall()
+        if not rows:
+            return []  # no write transaction (and no lock contention with the workers) in the common case
+        requeued = []
+        with self._lock, self._conn:
+            for (run_id,) in rows:
+                # A worker may have sent a heartbeat since the SELECT
+                if self._conn.execute(
+                    """UPDATE consultation_jobs SET status = 'QUEUED', worker = NULL
+                       WHERE run_id = ? AND status = 'RUNNING' AND heartbeat < ?""",
+                    (run_id, cutoff),
+                ).rowcount:
+                    requeued.append(run_id)
+        return requeued
+
+    # --- Worker side ---
+    def claim(self, worker: str) -> Optional[dict]:
+        """Take the next queued job, if any."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                """SELECT run_id, session_id, tools FROM consultation_jobs
+                   WHERE status = 'QUEUED' ORDER BY priority, enqueued_at LIMIT 1"""
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = self._conn.execute(
+                """UPDATE consultation_jobs SET status = 'RUNNING', worker = ?, heartbeat = ?
+                   WHERE run_id = ? AND status = 'QUEUED'""",
+                (worker, time.time(), row[0]),
+            ).rowcount
+        if not claimed:
+            return None
+        return {"run_id": row[0], "session_id": row[1], "tools": json.loads(row[2])}
+
+    def heartbeat(self, run_ids: list) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE consultation_jobs SET heartbeat = ? WHERE run_id = ?", [(time.time(), run_id) for run_id in run_ids]
+            )
+
+    def cancel_requested(self, run_ids: list) -> list:
+        if not run_ids:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT run_id FROM consultation_jobs
+                    WHERE cancel_requested = 1 AND run_id IN ({', '.join('?' * len(run_ids))})""",
+                run_ids,
+            ).fetchall()
+        return [run_id for (run_id,) in rows]
+
+    def publish(self, run_id: str, event: str, data: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO consultation_job_events (run_id, event, data) VALUES (?, ?, ?)",
+                (run_id, event, json.dumps(data, default=str)),
+            )
+
+    def finish(self, run_id: str, status: str, result) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE consultation_jobs SET status = ?, result = ? WHERE run_id = ?", (status, result, run_id)
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM consultation_jobs GROUP BY status"
+            ).fetchall()
+            workers = self._conn.execute(
+                "SELECT COUNT(DISTINCT worker) FROM consultation_jobs WHERE status = 'RUNNING'"
+            ).fetchone()[0]
+        counts = dict(rows)
+        return {
+            "queued": counts.get("QUEUED", 0),
+            "running": counts.get("RUNNING", 0),
+            "busy_workers": workers,
+            "max_queue_size": self.max_queue_size,
+            "instance_id": self.instance_id,
+        }
+
+
+# --- Worker Process ---
+async def run_job(agent, queue: JobQueue, job: dict) -> None:
+    """Continue one paused Dr. Hausarzt run and write its answer back to the queue."""
+    from agno.models.response import ToolExecution
+    from agno.run.agent import RunEvent
+    from medical_agent_with_team import (
+        team_session_context,
+        patient_session_context,
+        consultation_run_context,
+        team_progress_callback,
+    )
+    from history_compaction import log_prompt_size
+    from tracing import trace_span
+
+    run_id = job["run_id"]
+    session_id = job["session_id"]
+    print(f"🔄 Worker continues consultation for run_id: {run_id}")
+    try:
+        queue.publish(run_id, "queue", {"queue_position": None})
+        team_session_context.set(f"team:{session_id}:{run_id}")
+        patient_session_context.set(session_id)
+        consultation_run_context.set(run_id)
+        team_progress_callback.set(lambda event, data: queue.publish(run_id, event, data))
+
+        tools = [ToolExecution.from_dict(tool) for tool in job["tools"]]
+        for tool in tools:
+            if tool.requires_confirmation:
+                tool.confirmed = True
+
+        # The app paused this run after our memory tier last saw the session: read it from SQLite
+        if hasattr(agent.db, "forget"):
+            agent.db.forget(session_id)
+
+        result = ""
+        pending_tokens = ""
+        flushed_at = time.monotonic()
+        metrics = None
+        with trace_span("hausarzt_continue", model=agent.model.id) as span:
+            async for event in agent.acontinue_run(
+                run_id=run_id,
+                updated_tools=tools,
+                session_id=session_id,
+                stream=True,
+                stream_intermediate_steps=True,
+            ):
+                if event.event == RunEvent.run_content and event.content:
+                    result += str(event.content)
+                    pending_tokens += str(event.content)
+                    if time.monotonic() - flushed_at >= TOKEN_FLUSH_SECONDS:
+                        queue.publish(run_id, "token", {"content": pending_tokens})
+                        pending_tokens, flushed_at = "", time.monotonic()
+                elif event.event == RunEvent.run_completed:
+                    metrics = getattr(event, "metrics", None)
+                elif event.event == RunEvent.run_error:
+                    raise RuntimeError(event.content)
+            span["metrics"] = metrics
+
+        if pending_tokens:
+            queue.publish(run_id, "token", {"content": pending_tokens})
+        log_prompt_size(session_id, None, metrics)
+        queue.finish(run_id, "COMPLETED", result)
+        print(f"✅ Worker completed consultation for run_id: {run_id}")
+
+    except asyncio.CancelledError:
+        print(f"🛑 Worker cancelled consultation for run_id: {run_id}")
+        queue.finish(run_id, "CANCELLED", "Consultation cancelled")
+
+    except Exception as e:
+        print(f"❌ Worker consultation failed: {e}")
+        queue.finish(run_id, "ERROR", f"Error: {str(e)}")
+
+
+async def worker_loop(worker_id: str) -> None:
+    """Claim and run jobs until the process is stopped."""
+    from medical_agent_with_team import create_hausarzt_agent, shared_db
+    from session_storage import BoundedSqliteDb
+
+    if not isinstance(shared_db, BoundedSqliteDb):
+        print("⚠️ SESSION_DB_FILE is empty: workers can't see the app's paused runs")
+
+    queue = JobQueue()
+    agent = create_hausarzt_agent()
+    running = {}  # run_id -> asyncio.Task
+    last_heartbeat = 0.0
+    print(f"👷 Consultation worker {worker_id} ready ({CONSULTATION_WORKER_CONCURRENCY} slot(s))")
+
+    while True:
+        for run_id, task in list(running.items()):
+            if task.done():
+                del running[run_id]
+
+        while len(running) < CONSULTATION_WORKER_CONCURRENCY:
+            job = queue.claim(worker_id)
+            if job is None:
+                break
+            running[job["run_id"]] = asyncio.create_task(run_job(agent, queue, job))
+
+        for run_id in queue.cancel_requested(list(running)):
+            running[run_id].cancel()
+
+        if time.time() - last_heartbeat >= queue.lease_seconds / 3:
+            queue.heartbeat(list(running))
+            last_heartbeat = time.time()
+
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+
+class WorkerPool:
+    """Worker processes started (and restarted after a crash) by the app or this script."""
+
+    def __init__(self, size: int = CONSULTATION_WORKERS):
+        self.size = size
+        self.processes = {}  # worker id -> subprocess.Popen
+        self.prefix = uuid.uuid4().hex[:6]
+
+    def _spawn(self, worker_id: str) -> None:
+        self.processes[worker_id] = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker-id", worker_id]
+        )
+
+    def start(self) -> None:
+        for index in range(self.size):
+            self._spawn(f"{self.prefix}-{index}")
+        print(f"👷 Started {self.size} consultation worker process(es)")
+
+    def supervise(self) -> None:
+        """Restart workers that exited; their running jobs are queued again after the lease."""
+        for worker_id, process in list(self.processes.items()):
+            if process.poll() is not None:
+                print(f"⚠️ Consultation worker {worker_id} exited with {process.returncode}, restarting")
+                self._spawn(worker_id)
+
+    def stop(self) -> None:
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes.clear()
+
+    def stats(self) -> dict:
+        return {"processes": self.size, "alive": sum(process.poll() is None for process in self.processes.values())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker processes for queued team consultations")
+    parser.add_argument("--workers", type=int, default=CONSULTATION_WORKERS or 1, help="Worker processes to start")
+    parser.add_argument("--worker-id", help=argparse.SUPPRESS)  # run a single worker in this process
+    args = parser.parse_args()
+
+    if args.worker_id:
+        try:
+            asyncio.run(worker_loop(args.worker_id))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    pool = WorkerPool(args.workers)
+    pool.start()
+    try:
+        while True:
+            time.sleep(5)
+            pool.supervise()
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# history_compaction.py - Keeps Dr. Hausarzt's conversation history within a token budget
+import os
+import re
+
+from agno.db.base import SessionType
+from agno.run.base import RunStatus
+
+# --- Compaction Configuration ---
+# Estimated tokens of replayed history above which older runs are compacted (0 disables)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "12000"))
+# Most recent runs that are always kept verbatim
+HISTORY_KEEP_RECENT_RUNS = int(os.getenv("HISTORY_KEEP_RECENT_RUNS", "2"))
+# Compaction goes down to this share of the budget, so it (and the invalidation of the
+# provider's cached history prefix it causes) happens once per batch instead of every turn
+HISTORY_COMPACT_TARGET_RATIO = float(os.getenv("HISTORY_COMPACT_TARGET_RATIO", "0.75"))
+# Upper bound for a compacted message (team report summary or truncated answer)
+HISTORY_COMPACTED_MESSAGE_CHARS = int(os.getenv("HISTORY_COMPACTED_MESSAGE_CHARS", "1200"))
+
+COMPACTED_MARKER = "[Compacted]"
+
+# Runs agno leaves out of the history replay
+SKIPPED_RUN_STATUSES = (RunStatus.paused, RunStatus.cancelled, RunStatus.error)
+
+TEAM_REPORT_SECTIONS = [
+    "TRIAGE ASSESSMENT",
+    "CLINICAL FINDINGS",
+    "DIFFERENTIAL DIAGNOSIS",
+    "RECOMMENDED INVESTIGATIONS",
+    "TREATMENT PLAN",
+    "FOLLOW-UP RECOMMENDATIONS",
+]
+
+
+def estimate_tokens(text) -> int:
+    """Rough token estimate (about 4 characters per token), good enough for budgeting."""
+    return len(str(text or "")) // 4
+
+
+def is_team_report(text: str) -> bool:
+    return sum(section in text for section in TEAM_REPORT_SECTIONS) >= 3
+
+
+def summarize_team_report(text: str) -> str:
+    """Reduce a team report to the first lines of each of its sections."""
+    per_section = HISTORY_COMPACTED_MESSAGE_CHARS // len(TEAM_REPORT_SECTIONS)
+    pattern = "|".join(re.escape(section) for section in TEAM_REPORT_SECTIONS)
+    parts = re.split(f"({pattern})", text)
+
+    lines = [f"{COMPACTED_MARKER} Team report summary:"]
+    for index in range(1, len(parts) - 1, 2):
+        body = " ".join(parts[index + 1].replace("#", " ").replace("*", " ").split())
+        body = body.lstrip(":- ")
+        if len(body) > per_section:
+            body = body[:per_section].rsplit(" ", 1)[0] + " …"
+        lines.append(f"- {parts[index]}: {body}")
+    return "\n".join(lines)[:HISTORY_COMPACTED_MESSAGE_CHARS]
+
+
+def compact_text(text: str) -> str:
+    """Bounded replacement for a long message from an older run."""
+    if is_team_report(text):
+        return summarize_team_report(text)
+    return f"{COMPACTED_MARKER} {text[:HISTORY_COMPACTED_MESSAGE_CHARS].rsplit(' ', 1)[0]} …"
+
+
+def history_runs(session, num_history_runs: int) -> list:
+    """The runs agno replays: the last num_history_runs that are not paused, cancelled or errored."""
+    runs = [run for run in session.runs or [] if getattr(run, "status", None) not in SKIPPED_RUN_STATUSES]
+    return runs[-num_history_runs:]
+
+
+def history_messages(run) -> list:
+    """Messages of a run that agno replays (no system prompt, no history copied in from earlier runs)."""
+    return [
+        message for message in run.messages or []
+        if message.role != "system" and not getattr(message, "from_history", False)
+    ]
+
+
+def estimate_history_tokens(runs) -> int:
+    return sum(estimate_tokens(message.content) for run in runs for message in history_messages(run))
+
+
+def compact_session_history(db, session_id: str, num_history_runs: int,
+                            token_budget: int = HISTORY_TOKEN_BUDGET) -> int:
+    """Compact older runs of a Hausarzt session once its history exceeds the token budget.
+
+    Long messages of runs older than the most recent HISTORY_KEEP_RECENT_RUNS are replaced
+    (team reports by a per-section summary, other text by a truncated version), oldest first,
+    until the estimate fits HISTORY_COMPACT_TARGET_RATIO of the budget. Returns the
+    estimated history tokens afterwards.
+    """
+    if not session_id:
+        return 0
+
+    session = db.get_session(session_id=session_id, session_type=SessionType.AGENT)
+    if session is None or not session.runs:
+        return 0
+
+    runs = history_runs(session, num_history_runs)
+    tokens = estimate_history_tokens(runs)
+    if token_budget <= 0 or tokens <= token_budget:
+        return tokens
+
+    tokens_before = tokens
+    target = token_budget * HISTORY_COMPACT_TARGET_RATIO
+    compactable = runs[:-HISTORY_KEEP_RECENT_RUNS] if HISTORY_KEEP_RECENT_RUNS else runs
+    for run in compactable:
+        for message in history_messages(run):
+            content = message.content
+            if not isinstance(content, str) or content.startswith(COMPACTED_MARKER):
+                continue
+            if len(content) <= HISTORY_COMPACTED_MESSAGE_CHARS:
+                continue
+            message.content = compact_text(content)
+            tokens -= estimate_tokens(content) - estimate_tokens(message.content)
+
+        if isinstance(run.content, str) and len(run.content) > HISTORY_COMPACTED_MESSAGE_CHARS \
+                and not run.content.startswith(COMPACTED_MARKER):
+            run.content = compact_text(run.content)
+
+        if tokens <= target:
+            break
+
+    db.upsert_session(session)
+    print(f"🗜️ Compacted history for session {session_id}: ~{tokens_before} → ~{tokens} tokens (budget {token_budget})")
+    return tokens
+
+
+def log_prompt_size(session_id: str, history_tokens, metrics) -> None:
+    """Report estimated history size and the actual prompt/completion tokens of a turn."""
+    input_tokens = getattr(metrics, "input_tokens", None) if metrics else None
+    output_tokens = getattr(metrics, "output_tokens", None) if metrics else None
+    cached_tokens = getattr(metrics, "cache_read_tokens", None) if metrics else None
+    history = f"history ~{history_tokens} tokens, " if history_tokens is not None else ""
+    print(
+        f"📏 Prompt size for session {session_id}: {history}"
+        f"input {input_tokens} tokens ({cached_tokens or 0} cached), output {output_tokens} tokens"
+    )
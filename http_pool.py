@@ -0,0 +1,134 @@
+# http_pool.py - Process-wide pooled HTTP clients (async and sync) shared by all OpenAI model instances
+import os
+import threading
+
+import httpx
+
+from prompt_caching import observe_request_body
+
+# --- Pool Configuration ---
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "60"))
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "10"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120"))
+# Retries of failed requests (exponential backoff with jitter, done by the OpenAI SDK)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+# Retries of failed connection attempts (done by the transport)
+OPENAI_CONNECT_RETRIES = int(os.getenv("OPENAI_CONNECT_RETRIES", "2"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "true").lower() == "true"
+
+try:
+    import h2  # noqa: F401 - optional, enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+pool_stats = {"requests": 0, "connections_opened": 0}
+_stats_lock = threading.Lock()
+_client_lock = threading.Lock()
+_async_client = None
+_sync_client = None
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        pool_stats[key] += 1
+
+
+def _count_connection(event_name: str) -> None:
+    # httpcore only emits connect events when the pool has to open a new connection
+    if event_name in ("connection.connect_tcp.complete", "connection.connect_unix_socket.complete"):
+        _count("connections_opened")
+
+
+def _observe(request: httpx.Request) -> None:
+    _count("requests")
+    if isinstance(request.stream, httpx.ByteStream):
+        observe_request_body(request.content)
+
+
+async def _trace(event_name: str, info: dict) -> None:
+    _count_connection(event_name)
+
+
+def _trace_sync(event_name: str, info: dict) -> None:
+    _count_connection(event_name)
+
+
+async def _on_request(request: httpx.Request) -> None:
+    request.extensions["trace"] = _trace
+    _observe(request)
+
+
+def _on_request_sync(request: httpx.Request) -> None:
+    request.extensions["trace"] = _trace_sync
+    _observe(request)
+
+
+def _transport_settings() -> dict:
+    # Limits, HTTP/2 and connect retries live on the transport (the client ignores them then)
+    return {
+        "http2": OPENAI_HTTP2 and HTTP2_AVAILABLE,
+        "limits": httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+        ),
+        "retries": OPENAI_CONNECT_RETRIES,
+    }
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS)
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """The shared async client (created on first use)."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(**_transport_settings()),
+            timeout=_timeout(),
+            event_hooks={"request": [_on_request]},
+        )
+    return _async_client
+
+
+def get_sync_http_client() -> httpx.Client:
+    """The shared sync client for blocking model calls (created on first use, thread-safe)."""
+    global _sync_client
+    with _client_lock:
+        if _sync_client is None or _sync_client.is_closed:
+            _sync_client = httpx.Client(
+                transport=httpx.HTTPTransport(**_transport_settings()),
+                timeout=_timeout(),
+                event_hooks={"request": [_on_request_sync]},
+            )
+        return _sync_client
+
+
+async def close_http_client() -> None:
+    global _async_client, _sync_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    with _client_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
+
+
+def http_pool_stats() -> dict:
+    requests = pool_stats["requests"]
+    opened = pool_stats["connections_opened"]
+    return {
+        "requests": requests,
+        "connections_opened": opened,
+        "connections_reused": max(requests - opened, 0),
+        "reuse_rate": (requests - opened) / requests if requests else 0.0,
+        "http2": OPENAI_HTTP2 and HTTP2_AVAILABLE,
+        "sync_client": _sync_client is not None,
+        "max_connections": OPENAI_MAX_CONNECTIONS,
+        "max_keepalive_connections": OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    }
@@ -0,0 +1,133 @@
+# latency_control.py - Deadlines, retries and hedged requests for specialist and leader calls
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+# --- Latency Control Configuration ---
+# Deadline of a single agent call in seconds; per role via AGENT_DEADLINE_<ROLE>
+# (e.g. AGENT_DEADLINE_TRIAGE=30). Also used as the OpenAI request timeout of the role's model.
+AGENT_DEADLINE_SECONDS = float(os.getenv("AGENT_DEADLINE_SECONDS", "90"))
+# Extra attempts of a pipeline agent call that timed out or failed
+AGENT_CALL_RETRIES = int(os.getenv("AGENT_CALL_RETRIES", "1"))
+# Base delay of the exponential backoff between attempts (with full jitter)
+AGENT_RETRY_BACKOFF_SECONDS = float(os.getenv("AGENT_RETRY_BACKOFF_SECONDS", "1.0"))
+# Start a duplicate call when the first one is slower than the role's p<HEDGE_PERCENTILE>
+# latency. Costs an extra model call for every hedged request, so it is opt-in.
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# Successful calls of a role needed before its percentile is trusted for hedging
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Whole team consultation; afterwards the sections finished so far are returned (0 disables)
+CONSULTATION_DEADLINE_SECONDS = float(os.getenv("CONSULTATION_DEADLINE_SECONDS", "300"))
+
+LATENCY_WINDOW = 200  # recent successful call durations kept per role
+
+latency_stats = {"calls": 0, "timeouts": 0, "retries": 0, "hedged": 0, "hedge_wins": 0, "partial_reports": 0}
+_stats_lock = threading.Lock()
+_durations = {}  # role -> deque of recent successful call durations
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        latency_stats[key] += 1
+
+
+def deadline_for(role: str) -> float:
+    return float(os.getenv(f"AGENT_DEADLINE_{role.upper()}", AGENT_DEADLINE_SECONDS))
+
+
+def record_duration(role: str, seconds: float) -> None:
+    with _stats_lock:
+        _durations.setdefault(role, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def latency_percentile(role: str, percent: float):
+    """Percentile of the role's recent call durations (None until HEDGE_MIN_SAMPLES calls)."""
+    with _stats_lock:
+        durations = sorted(_durations.get(role, ()))
+    if len(durations) < HEDGE_MIN_SAMPLES:
+        return None
+    return durations[min(len(durations) - 1, int(len(durations) * percent / 100))]
+
+
+async def hedged(role: str, make_call):
+    """Await ``make_call()``; with HEDGE_REQUESTS start a duplicate once the first is slow.
+
+    The first successful result wins and the other call is cancelled.
+    """
+    hedge_delay = latency_percentile(role, HEDGE_PERCENTILE) if HEDGE_REQUESTS else None
+    if hedge_delay is None:
+        return await make_call()
+
+    primary = asyncio.ensure_future(make_call())
+    pending = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        _count("hedged")
+        hedge = asyncio.ensure_future(make_call())
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for call in done:
+                if call.exception() is None:
+                    if call is hedge:
+                        _count("hedge_wins")
+                    return call.result()
+                error = call.exception()
+        raise error
+    finally:
+        for call in pending:
+            call.cancel()
+
+
+async def call_with_deadline(role: str, make_call):
+    """Run an agent call with the role's deadline, bounded retries with backoff and hedging.
+
+    ``make_call`` returns a new awaitable per attempt (e.g. ``lambda: agent.arun(text)``).
+    """
+    deadline = deadline_for(role)
+    for attempt in range(AGENT_CALL_RETRIES + 1):
+        _count("calls")
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(hedged(role, make_call), deadline)
+            record_duration(role, time.perf_counter() - started)
+            return result
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                _count("timeouts")
+                print(f"⏰ {role} call exceeded its {deadline:g}s deadline (attempt {attempt + 1})")
+            else:
+                print(f"⚠️ {role} call failed (attempt {attempt + 1}): {e}")
+            if attempt == AGENT_CALL_RETRIES:
+                raise
+        _count("retries")
+        await asyncio.sleep(random.uniform(0, AGENT_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+
+def consultation_deadline():
+    """Seconds a team consultation may take, or None if unlimited."""
+    return CONSULTATION_DEADLINE_SECONDS if CONSULTATION_DEADLINE_SECONDS > 0 else None
+
+
+def record_partial_report() -> None:
+    _count("partial_reports")
+
+
+def latency_control_stats() -> dict:
+    with _stats_lock:
+        stats = dict(latency_stats)
+        roles = list(_durations)
+    return {
+        **stats,
+        "hedging": HEDGE_REQUESTS,
+        "consultation_deadline_seconds": consultation_deadline(),
+        "p95_seconds": {role: latency_percentile(role, 95) for role in roles},
+    }
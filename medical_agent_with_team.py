@@ -1,213 +1,475 @@
+import os
+import json
 import uuid
+import time
+import asyncio
+import threading
+import contextvars
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
-from agno.team.team import Team
 from agno.tools import tool
-from agno.db.in_memory import InMemoryDb
-
-# Setup shared in-memory database for conversation history
-shared_db = InMemoryDb()
-
-# Triage Agent - Assesses urgency and priority
-triage_agent = Agent(
-    name="Triage Agent",
-    role="Emergency Assessment and Prioritization",
-    model=OpenAIChat("gpt-4.1"),
-    instructions=[
-        "You are a Triage Agent specializing in European primary care emergency assessment.",
-        "Your role is to assess urgency of patient symptoms and determine priority level.",
-        "",
-        "KEY RESPONSIBILITIES:",
-        "1. Evaluate symptom severity and potential emergency conditions",
-        "2. Assess vital signs if provided (temperature, BP, HR, respiratory rate)",
-        "3. Identify red flag symptoms requiring immediate medical attention",
-        "4. Determine if symptoms suggest urgent care, routine care, or self-care",
-        "5. Consider patient age, medical history, and symptom duration",
-        "",
-        "PRIORITY LEVELS:",
-        "- URGENT: Immediate medical attention (chest pain, breathing difficulty, severe symptoms)",
-        "- ROUTINE: See doctor within days (persistent symptoms, concerning changes)",
-        "- MONITOR: Home management with monitoring (mild symptoms, improving conditions)",
-        "",
-        "Always err on the side of caution for serious symptoms.",
-        "Use European medical standards and practices.",
-    ],
-    markdown=True,
-)
+from agno.db.base import SessionType
+from agno.run.agent import RunEvent
+from agno.run.team import TeamRunEvent
+from history_compaction import compact_session_history, log_prompt_size
+from consultation_cache import ConsultationCache, SingleFlight, consultation_cache_key
+from model_routing import model_for
+from http_pool import close_http_client
+from tracing import trace_span, record_span
+from consultation_checkpoints import CheckpointStore, REPORT_STAGE
+from specialist_reports import output_schema_for, render_partial_report, PARTIAL_REPORT_MARKER
+from session_storage import create_session_db
+from latency_control import consultation_deadline, record_partial_report
+
+# Setup shared database for conversation history (SQLite with bounded sessions, see session_storage.py)
+shared_db = create_session_db()
+
+# --- Specialist Team ---
+def create_medical_team() -> dict:
+    """Build the five specialists, the team and the synthesis agent (see TEAM_COMPONENTS)."""
+    from agno.team.team import Team
+
+    # Triage Agent - Assesses urgency and priority
+    triage_schema = output_schema_for("triage")
+    triage_agent = Agent(
+        name="Triage Agent",
+        role="Emergency Assessment and Prioritization",
+        model=model_for("triage"),
+        instructions=[
+            "You are a Triage Agent specializing in European primary care emergency assessment.",
+            "Your role is to assess urgency of patient symptoms and determine priority level.",
+            "",
+            "KEY RESPONSIBILITIES:",
+            "1. Evaluate symptom severity and potential emergency conditions",
+            "2. Assess vital signs if provided (temperature, BP, HR, respiratory rate)",
+            "3. Identify red flag symptoms requiring immediate medical attention",
+            "4. Determine if symptoms suggest urgent care, routine care, or self-care",
+            "5. Consider patient age, medical history, and symptom duration",
+            "",
+            "PRIORITY LEVELS:",
+            "- URGENT: Immediate medical attention (chest pain, breathing difficulty, severe symptoms)",
+            "- ROUTINE: See doctor within days (persistent symptoms, concerning changes)",
+            "- MONITOR: Home management with monitoring (mild symptoms, improving conditions)",
+            "",
+            "Always err on the side of caution for serious symptoms.",
+            "Use European medical standards and practices.",
+            # Structured outputs carry the level in TriageReport.priority
+            *([] if triage_schema else [
+                "",
+                "Start your answer with one line: 'PRIORITY: URGENT', 'PRIORITY: ROUTINE' or 'PRIORITY: MONITOR'.",
+            ]),
+        ],
+        output_schema=triage_schema,
+        markdown=True,
+    )
 
-# Clinical Assessment Agent - Reviews symptom completeness
-clinical_assessment_agent = Agent(
-    name="Clinical Assessment Agent",
-    role="Clinical History and Symptom Analysis",
-    model=OpenAIChat("gpt-4.1"),
-    instructions=[
-        "You are a Clinical Assessment Agent specializing in primary care symptom evaluation.",
-        "Your role is to analyze completeness and significance of patient-reported symptoms.",
-        "",
-        "KEY RESPONSIBILITIES:",
-        "1. Evaluate symptom description completeness (onset, duration, severity, location)",
-        "2. Identify missing important clinical information",
-        "3. Assess symptom patterns and associated findings",
-        "4. Note relevant medical history or risk factors",
-        "5. Identify related symptoms or syndrome components",
-        "",
-        "FOCUS AREAS:",
-        "- Symptom characteristics (quality, timing, triggers, relieving factors)",
-        "- Associated symptoms of clinical significance",
-        "- Functional impact on daily activities",
-        "- Previous similar episodes",
-        "",
-        "Use European clinical standards and guidelines.",
-        "Focus on primary care relevant assessments.",
-    ],
-    markdown=True,
-)
+    # Clinical Assessment Agent - Reviews symptom completeness
+    clinical_assessment_agent = Agent(
+        name="Clinical Assessment Agent",
+        role="Clinical History and Symptom Analysis",
+        model=model_for("clinical_assessment"),
+        instructions=[
+            "You are a Clinical Assessment Agent specializing in primary care symptom evaluation.",
+            "Your role is to analyze completeness and significance of patient-reported symptoms.",
+            "",
+            "KEY RESPONSIBILITIES:",
+            "1. Evaluate symptom description completeness (onset, duration, severity, location)",
+            "2. Identify missing important clinical information",
+            "3. Assess symptom patterns and associated findings",
+            "4. Note relevant medical history or risk factors",
+            "5. Identify related symptoms or syndrome components",
+            "",
+            "FOCUS AREAS:",
+            "- Symptom characteristics (quality, timing, triggers, relieving factors)",
+            "- Associated symptoms of clinical significance",
+            "- Functional impact on daily activities",
+            "- Previous similar episodes",
+            "",
+            "Use European clinical standards and guidelines.",
+            "Focus on primary care relevant assessments.",
+        ],
+        output_schema=output_schema_for("clinical_assessment"),
+        markdown=True,
+    )
 
-# Diagnostic Agent - Suggests possible diagnoses
-diagnostic_agent = Agent(
-    name="Diagnostic Agent",
-    role="Differential Diagnosis and Clinical Reasoning",
-    model=OpenAIChat("gpt-4.1"),
-    instructions=[
-        "You are a Diagnostic Agent specializing in primary care differential diagnosis.",
-        "Your role is to suggest possible diagnoses based on symptoms and clinical information.",
-        "",
-        "KEY RESPONSIBILITIES:",
-        "1. Generate differential diagnosis list based on symptoms",
-        "2. Consider common conditions first (common things are common)",
-        "3. Include serious conditions that must not be missed",
-        "4. Consider age-specific conditions and presentations",
-        "5. Factor in European population epidemiological factors",
-        "",
-        "DIAGNOSTIC APPROACH:",
-        "- Start with most likely diagnoses",
-        "- Include 'red flag' conditions to exclude",
-        "- Consider both acute and chronic conditions",
-        "- Use system-based approach (cardiac, respiratory, GI, etc.)",
-        "",
-        "Present diagnoses with brief rationale for each.",
-        "Use European diagnostic criteria and disease patterns.",
-        "Focus on European primary care common conditions.",
-    ],
-    markdown=True,
-)
+    # Diagnostic Agent - Suggests possible diagnoses
+    diagnostic_agent = Agent(
+        name="Diagnostic Agent",
+        role="Differential Diagnosis and Clinical Reasoning",
+        model=model_for("diagnostic"),
+        instructions=[
+            "You are a Diagnostic Agent specializing in primary care differential diagnosis.",
+            "Your role is to suggest possible diagnoses based on symptoms and clinical information.",
+            "",
+            "KEY RESPONSIBILITIES:",
+            "1. Generate differential diagnosis list based on symptoms",
+            "2. Consider common conditions first (common things are common)",
+            "3. Include serious conditions that must not be missed",
+            "4. Consider age-specific conditions and presentations",
+            "5. Factor in European population epidemiological factors",
+            "",
+            "DIAGNOSTIC APPROACH:",
+            "- Start with most likely diagnoses",
+            "- Include 'red flag' conditions to exclude",
+            "- Consider both acute and chronic conditions",
+            "- Use system-based approach (cardiac, respiratory, GI, etc.)",
+            "",
+            "Present diagnoses with brief rationale for each.",
+            "Use European diagnostic criteria and disease patterns.",
+            "Focus on European primary care common conditions.",
+        ],
+        output_schema=output_schema_for("diagnostic"),
+        markdown=True,
+    )
 
-# Investigation Agent - Recommends tests and investigations
-investigation_agent = Agent(
-    name="Investigation Agent",
-    role="Diagnostic Testing and Investigations",
-    model=OpenAIChat("gpt-4.1"),
-    instructions=[
-        "You are an Investigation Agent specializing in primary care diagnostic testing.",
-        "Your role is to recommend appropriate investigations based on symptoms and differential diagnosis.",
-        "",
-        "KEY RESPONSIBILITIES:",
-        "1. Suggest appropriate diagnostic tests (blood work, imaging, specialized tests)",
-        "2. Consider cost-effectiveness and European primary care availability",
-        "3. Prioritize investigations by clinical urgency and probability",
-        "4. Distinguish primary care tests vs. specialist referrals",
-        "5. Consider patient safety and contraindications",
-        "",
-        "INVESTIGATION PRIORITIES:",
-        "- Essential tests to confirm/exclude serious conditions",
-        "- Age-appropriate routine screening",
-        "- Investigations to guide treatment decisions",
-        "- Tests that can be delayed or are optional",
-        "",
-        "Consider European healthcare system structure and resources.",
-        "Focus on evidence-based testing that changes management.",
-    ],
-    markdown=True,
-)
+    # Investigation Agent - Recommends tests and investigations
+    investigation_agent = Agent(
+        name="Investigation Agent",
+        role="Diagnostic Testing and Investigations",
+        model=model_for("investigation"),
+        instructions=[
+            "You are an Investigation Agent specializing in primary care diagnostic testing.",
+            "Your role is to recommend appropriate investigations based on symptoms and differential diagnosis.",
+            "",
+            "KEY RESPONSIBILITIES:",
+            "1. Suggest appropriate diagnostic tests (blood work, imaging, specialized tests)",
+            "2. Consider cost-effectiveness and European primary care availability",
+            "3. Prioritize investigations by clinical urgency and probability",
+            "4. Distinguish primary care tests vs. specialist referrals",
+            "5. Consider patient safety and contraindications",
+            "",
+            "INVESTIGATION PRIORITIES:",
+            "- Essential tests to confirm/exclude serious conditions",
+            "- Age-appropriate routine screening",
+            "- Investigations to guide treatment decisions",
+            "- Tests that can be delayed or are optional",
+            "",
+            "Consider European healthcare system structure and resources.",
+            "Focus on evidence-based testing that changes management.",
+        ],
+        output_schema=output_schema_for("investigation"),
+        markdown=True,
+    )
 
-# Treatment Agent - Provides treatment recommendations
-treatment_agent = Agent(
-    name="Treatment Agent",
-    role="Treatment Planning and Management",
-    model=OpenAIChat("gpt-4.1"),
-    instructions=[
-        "You are a Treatment Agent specializing in primary care management and therapeutics.",
-        "Your role is to provide evidence-based treatment recommendations.",
-        "",
-        "KEY RESPONSIBILITIES:",
-        "1. Suggest appropriate treatments based on likely diagnoses",
-        "2. Provide pharmacological and non-pharmacological interventions",
-        "3. Consider European medication availability and prescribing guidelines",
-        "4. Include self-care measures and lifestyle recommendations",
-        "5. Address symptom management and supportive care",
-        "",
-        "TREATMENT APPROACH:",
-        "- First-line treatments per European guidelines",
-        "- Safety considerations and contraindications",
-        "- Symptomatic vs. specific treatment decisions",
-        "- Treatment duration and follow-up requirements",
-        "",
-        "RECOMMENDATIONS INCLUDE:",
-        "- Medication options (with alternatives)",
-        "- Home care and self-management strategies",
-        "- Warning signs requiring medical attention",
-        "- Expected improvement timeline",
-        "",
-        "Use European therapeutic guidelines and drug availability.",
-    ],
-    markdown=True,
-)
+    # Treatment Agent - Provides treatment recommendations
+    treatment_agent = Agent(
+        name="Treatment Agent",
+        role="Treatment Planning and Management",
+        model=model_for("treatment"),
+        instructions=[
+            "You are a Treatment Agent specializing in primary care management and therapeutics.",
+            "Your role is to provide evidence-based treatment recommendations.",
+            "",
+            "KEY RESPONSIBILITIES:",
+            "1. Suggest appropriate treatments based on likely diagnoses",
+            "2. Provide pharmacological and non-pharmacological interventions",
+            "3. Consider European medication availability and prescribing guidelines",
+            "4. Include self-care measures and lifestyle recommendations",
+            "5. Address symptom management and supportive care",
+            "",
+            "TREATMENT APPROACH:",
+            "- First-line treatments per European guidelines",
+            "- Safety considerations and contraindications",
+            "- Symptomatic vs. specific treatment decisions",
+            "- Treatment duration and follow-up requirements",
+            "",
+            "RECOMMENDATIONS INCLUDE:",
+            "- Medication options (with alternatives)",
+            "- Home care and self-management strategies",
+            "- Warning signs requiring medical attention",
+            "- Expected improvement timeline",
+            "",
+            "Use European therapeutic guidelines and drug availability.",
+        ],
+        output_schema=output_schema_for("treatment"),
+        markdown=True,
+    )
 
-# Medical Specialist Team - v2.0 Compatible
-medical_team = Team(
-    name="Medical Consultation Team",
-    model=OpenAIChat("gpt-4.1"),
-    db=shared_db,
-    # v2.0 attributes instead of deprecated mode parameter
-    respond_directly=False,  # Team leader processes member responses
-    delegate_task_to_all_members=False,  # Sequential workflow
-    determine_input_for_members=True,  # Leader determines input for members
-    instructions=[
-        "You are coordinating a medical specialist team for patient analysis.",
-        "",
-        "WORKFLOW (follow strictly):",
-        "1. TRIAGE: Initial urgency and priority assessment",
-        "2. CLINICAL ASSESSMENT: Complete symptom and history analysis",
-        "3. DIAGNOSTIC: Differential diagnoses and most likely conditions",
-        "4. INVESTIGATION: Recommended tests and examinations",
-        "5. TREATMENT: Treatment recommendations and management plan",
-        "",
-        "Coordinate specialists in this sequence.",
-        "Collect all expert opinions and create structured overall assessment.",
-        "Present result as coherent medical consultation.",
-        "",
-        "Structure your response with clear sections:",
-        "- TRIAGE ASSESSMENT",
-        "- CLINICAL FINDINGS",
-        "- DIFFERENTIAL DIAGNOSIS",
-        "- RECOMMENDED INVESTIGATIONS",
-        "- TREATMENT PLAN",
-        "- FOLLOW-UP RECOMMENDATIONS"
-    ],
-    members=[
-        triage_agent,
-        clinical_assessment_agent,
-        diagnostic_agent,
-        investigation_agent,
-        treatment_agent,
-    ],
-    markdown=True,
-    debug_mode=True,
-    show_members_responses=True,
+    # Medical Specialist Team - v2.0 Compatible
+    medical_team = Team(
+        name="Medical Consultation Team",
+        model=model_for("team_leader"),
+        db=shared_db,
+        # v2.0 attributes instead of deprecated mode parameter
+        respond_directly=False,  # Team leader processes member responses
+        delegate_task_to_all_members=False,  # Sequential workflow
+        determine_input_for_members=True,  # Leader determines input for members
+        instructions=[
+            "You are coordinating a medical specialist team for patient analysis.",
+            "",
+            "WORKFLOW (follow strictly):",
+            "1. TRIAGE: Initial urgency and priority assessment",
+            "2. CLINICAL ASSESSMENT: Complete symptom and history analysis",
+            "3. DIAGNOSTIC: Differential diagnoses and most likely conditions",
+            "4. INVESTIGATION: Recommended tests and examinations",
+            "5. TREATMENT: Treatment recommendations and management plan",
+            "",
+            "Coordinate specialists in this sequence.",
+            "Collect all expert opinions and create structured overall assessment.",
+            "Present result as coherent medical consultation.",
+            "",
+            "Structure your response with clear sections:",
+            "- TRIAGE ASSESSMENT",
+            "- CLINICAL FINDINGS",
+            "- DIFFERENTIAL DIAGNOSIS",
+            "- RECOMMENDED INVESTIGATIONS",
+            "- TREATMENT PLAN",
+            "- FOLLOW-UP RECOMMENDATIONS"
+        ],
+        members=[
+            triage_agent,
+            clinical_assessment_agent,
+            diagnostic_agent,
+            investigation_agent,
+            treatment_agent,
+        ],
+        markdown=True,
+        debug_mode=True,
+        show_members_responses=True,
+    )
+
+    # Member name -> (role, agent); roles match the pipeline stage names used for tracing spans
+    team_members_by_name = {
+        agent.name: (role, agent)
+        for role, agent in [
+            ("triage", triage_agent),
+            ("clinical_assessment", clinical_assessment_agent),
+            ("diagnostic", diagnostic_agent),
+            ("investigation", investigation_agent),
+            ("treatment", treatment_agent),
+        ]
+    }
+
+    # Synthesis Agent - Assembles specialist outputs in pipeline mode
+    synthesis_agent = Agent(
+        name="Synthesis Agent",
+        role="Medical Team Lead and Report Synthesis",
+        model=model_for("synthesis"),
+        instructions=[
+            "You are the lead of a medical specialist team for patient analysis.",
+            "You receive the patient case and the assessments of the Triage, Clinical Assessment,",
+            "Diagnostic, Investigation and Treatment specialists.",
+            "",
+            "Combine all expert opinions into a structured overall assessment.",
+            "Do not invent findings the specialists did not report.",
+            "Present result as coherent medical consultation.",
+            "",
+            "Structure your response with clear sections:",
+            "- TRIAGE ASSESSMENT",
+            "- CLINICAL FINDINGS",
+            "- DIFFERENTIAL DIAGNOSIS",
+            "- RECOMMENDED INVESTIGATIONS",
+            "- TREATMENT PLAN",
+            "- FOLLOW-UP RECOMMENDATIONS"
+        ],
+        markdown=True,
+    )
+
+    return {
+        "triage_agent": triage_agent,
+        "clinical_assessment_agent": clinical_assessment_agent,
+        "diagnostic_agent": diagnostic_agent,
+        "investigation_agent": investigation_agent,
+        "treatment_agent": treatment_agent,
+        "medical_team": medical_team,
+        "team_members_by_name": team_members_by_name,
+        "synthesis_agent": synthesis_agent,
+    }
+
+# --- Lazy Team Construction ---
+# The team is only needed for team consultations, so with LAZY_AGENTS it is built on
+# first use (or by the web app's warm-up) instead of during a scale-to-zero cold start.
+LAZY_AGENTS = os.getenv("LAZY_AGENTS", "true").lower() == "true"
+
+TEAM_COMPONENTS = (
+    "triage_agent",
+    "clinical_assessment_agent",
+    "diagnostic_agent",
+    "investigation_agent",
+    "treatment_agent",
+    "medical_team",
+    "team_members_by_name",
+    "synthesis_agent",
 )
+team_components_lock = threading.Lock()
+team_build_seconds = None  # set once the team has been built
+
+def get_team_components() -> dict:
+    """Build the team once and publish its parts as module attributes."""
+    global team_build_seconds
+    with team_components_lock:
+        if team_build_seconds is None:
+            started = time.perf_counter()
+            globals().update(create_medical_team())
+            team_build_seconds = time.perf_counter() - started
+            print(f"🏗️ Medical team built in {team_build_seconds * 1000:.0f} ms")
+    return {name: globals()[name] for name in TEAM_COMPONENTS}
+
+def team_ready() -> bool:
+    return team_build_seconds is not None
+
+def team_build_stats() -> dict:
+    return {
+        "lazy_agents": LAZY_AGENTS,
+        "team_built": team_ready(),
+        "team_build_seconds": round(team_build_seconds, 3) if team_ready() else None,
+    }
+
+def __getattr__(name):
+    # Lazily built module attributes, e.g. ``from medical_agent_with_team import triage_agent``
+    if name in TEAM_COMPONENTS:
+        return get_team_components()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if not LAZY_AGENTS:
+    get_team_components()
+
+def record_member_span(member_name: str, seconds: float, metrics) -> None:
+    """Record a team member's run as a span named after its role."""
+    role, agent = get_team_components()["team_members_by_name"].get(member_name, (member_name, None))
+    record_span(role, seconds, model=agent.model.id if agent else None, metrics=metrics)
+
+# Team execution mode:
+# - "team": agno Team, leader delegates to the specialists one after another
+# - "pipeline": specialists run as a dependency graph with independent stages in parallel
+# - "adaptive": pipeline whose depth follows the triage level (URGENT escalates immediately)
+MEDICAL_TEAM_MODE = os.getenv("MEDICAL_TEAM_MODE", "team")
+
+# Team reports keyed by the normalized structured patient summary, so summaries that
+# differ only in field order, case, punctuation or whitespace share one result
+consultation_cache = ConsultationCache()
+
+# Identical (patient session, summary) consultations running at the same time share one team run
+inflight_team_consultations = SingleFlight()
+
+# Completed stages of running consultations, so a restarted instance can resume them
+consultation_checkpoints = CheckpointStore()
 
 # Global variables for team consultation
-team_session_id = None
+team_session_id = None  # Prefix for team sessions created by the CLI
+
+# Team session of the current consultation. The web app derives it from the
+# patient's session and run, so every consultation gets its own compact team
+# history instead of one ever-growing shared session.
+team_session_context = contextvars.ContextVar("team_session_context", default=None)
+
+# Patient session of the current consultation (scopes in-flight de-duplication)
+patient_session_context = contextvars.ContextVar("patient_session_context", default=None)
+
+# Background run of the current consultation (keys its checkpoints)
+consultation_run_context = contextvars.ContextVar("consultation_run_context", default=None)
+
+# Inside a shared team run: callable returning the runs currently attached to it
+shared_consultation_runs = contextvars.ContextVar("shared_consultation_runs", default=None)
+
+def consultation_run_ids() -> list:
+    """Runs the current team consultation works for (all attached runs of a shared one)."""
+    attached_runs = shared_consultation_runs.get()
+    if attached_runs is not None:
+        return attached_runs()
+    run_id = consultation_run_context.get()
+    return [run_id] if run_id else []
+
+def current_team_session_id() -> str:
+    """Team session for the current consultation (new isolated session if none is set)."""
+    session_id = team_session_context.get()
+    if session_id is None:
+        session_id = f"{team_session_id or 'team'}_{uuid.uuid4().hex[:8]}"
+    return session_id
+
+# Team sessions measured per stats request (most recently updated first)
+TEAM_SESSION_STATS_LIMIT = int(os.getenv("TEAM_SESSION_STATS_LIMIT", "200"))
+
+def team_session_size(session: dict) -> dict:
+    """Number of stored runs and serialized size in bytes of a stored team session."""
+    return {
+        "session_id": session["session_id"],
+        "runs": len(session.get("runs") or []),
+        "bytes": len(json.dumps(session, default=str).encode("utf-8")),
+    }
+
+def get_team_session_size(session_id: str) -> dict:
+    """Number of stored runs and serialized size in bytes of one team session."""
+    session = shared_db.get_session(
+        session_id=session_id,
+        session_type=SessionType.TEAM,
+        deserialize=False
+    )
+    if not session:
+        return {"session_id": session_id, "runs": 0, "bytes": 0}
+    return team_session_size(session)
+
+def team_session_stats() -> dict:
+    """Number of team sessions and size of the most recently updated ones.
+
+    Reads up to TEAM_SESSION_STATS_LIMIT sessions once; blocking, so the web app
+    calls it in a thread.
+    """
+    sessions, total = shared_db.get_sessions(
+        session_type=SessionType.TEAM,
+        limit=TEAM_SESSION_STATS_LIMIT,
+        sort_by="updated_at",
+        sort_order="desc",
+        deserialize=False,
+    )
+    sizes = [team_session_size(session) for session in sessions]
+    return {
+        "sessions": total,
+        "measured_sessions": len(sizes),
+        "bytes": sum(size["bytes"] for size in sizes),
+        "largest": sorted(sizes, key=lambda size: size["bytes"], reverse=True)[:10],
+    }
+
+# Progress reporting for streamed consultations.
+# The web app sets a callback(event, data) per background run; when unset the
+# team runs without streaming exactly as in the CLI.
+team_progress_callback = contextvars.ContextVar("team_progress_callback", default=None)
+
+async def run_team_with_progress(team_input: str, session_id: str, report_progress, member_outputs: dict = None) -> tuple:
+    """Run the medical team in streaming mode and report member progress events.
+
+    Finished member answers are added to ``member_outputs`` (member name -> content).
+    Returns the team's answer and the leader's run metrics.
+    """
+    content = ""
+    final_content = None
+    leader_metrics = None
+    member_started = {}
+
+    medical_team = get_team_components()["medical_team"]
+    async for event in medical_team.arun(
+        team_input,
+        session_id=session_id,
+        stream=True,
+        stream_intermediate_steps=True
+    ):
+        member_name = getattr(event, "agent_name", None)
+
+        if member_name and event.event == RunEvent.run_started:
+            member_started[member_name] = time.perf_counter()
+            report_progress("progress", {"member": member_name, "stage": "started"})
+        elif member_name and event.event == RunEvent.run_completed:
+            started = member_started.pop(member_name, None)
+            seconds = time.perf_counter() - started if started is not None else 0.0
+            record_member_span(member_name, seconds, getattr(event, "metrics", None))
+            if member_outputs is not None and event.content is not None:
+                member_outputs[member_name] = event.content
+            report_progress("progress", {"member": member_name, "stage": "completed"})
+        elif member_name is None and event.event == TeamRunEvent.run_content and event.content:
+            content += str(event.content)
+        elif member_name is None and event.event == TeamRunEvent.run_completed:
+            leader_metrics = getattr(event, "metrics", None)
+            if event.content:
+                final_content = str(event.content)
+
+    return final_content or content, leader_metrics
 
 @tool(
     name="medical_team_consultation",
     description="Consult a specialized medical team for comprehensive patient analysis including triage assessment, clinical evaluation, differential diagnosis, recommended investigations, and evidence-based treatment plans. Use this tool when you need expert medical analysis for patient symptoms.",
     show_result=True,
-    cache_results=True,
-    cache_ttl=1800,  # 30 minutes cache for medical consultations
     requires_confirmation=True  # Agent pauses for background processing
 )
-def consult_medical_team(patient_summary: str) -> str:
+async def consult_medical_team(patient_summary: str) -> str:
     """
     Consult the medical specialist team for comprehensive patient analysis.
 
@@ -244,17 +506,137 @@ def consult_medical_team(patient_summary: str) -> str:
         sufficient clinical information, or when expert medical input is needed
         for diagnosis and treatment decisions.
     """
-    print("🔄 Consulting medical specialist team...")
-    print("👥 Team: Triage → Clinical Assessment → Diagnostic → Investigation → Treatment")
+    return await get_team_report(patient_summary)
+
+async def get_team_report(patient_summary: str) -> str:
+    """Team report for a patient summary: checkpoint, cache, in-flight run or a new team run."""
+    run_id = consultation_run_context.get()
+    checkpointed_report = consultation_checkpoints.load_stages(run_id).get(REPORT_STAGE)
+    if checkpointed_report is not None:
+        print(f"♻️ Team report restored from checkpoint for run_id: {run_id}")
+        return checkpointed_report
 
-    # Run team consultation (blocking)
-    team_result = medical_team.run(
-        f"PATIENT CASE FOR MEDICAL TEAM ANALYSIS:\n\n{patient_summary}\n\nPlease provide comprehensive analysis following your established workflow.",
-        session_id=team_session_id
+    print("🔄 Consulting medical specialist team...")
+    if MEDICAL_TEAM_MODE in ("pipeline", "adaptive"):
+        print("👥 Team: (Triage ‖ Clinical Assessment) → Diagnostic → (Investigation ‖ Treatment)")
+    else:
+        print("👥 Team: Triage → Clinical Assessment → Diagnostic → Investigation → Treatment")
+
+    # Content-aware cache (replaces the tool's byte-exact result cache)
+    cache_key = consultation_cache_key(patient_summary, MEDICAL_TEAM_MODE)
+    cached_content = consultation_cache.get(cache_key)
+    if cached_content is not None:
+        print(f"💾 Medical team consultation served from cache ({consultation_cache.stats()['hits']} hits)")
+        return cached_content
+
+    # Identical consultations already running for this patient share that run
+    inflight_key = (patient_session_context.get(), cache_key)
+    member = {"run_id": run_id, "progress": team_progress_callback.get(), "team_session": team_session_context.get()}
+    team_content = await inflight_team_consultations.run(
+        inflight_key, lambda: run_shared_team_consultation(inflight_key, patient_summary, cache_key), member
     )
 
-    print("✅ Medical team consultation completed")
-    return team_result.content if team_result.content else "Team consultation completed but no content returned."
+    if not team_content:
+        return "Team consultation completed but no content returned."
+
+    # Partial reports (consultation deadline reached) are not reused for later consultations
+    if not team_content.startswith(PARTIAL_REPORT_MARKER):
+        consultation_cache.set(cache_key, team_content)
+    consultation_checkpoints.save_stage(run_id, REPORT_STAGE, team_content)
+    return team_content
+
+def ignore_progress(event: str, data: dict):
+    pass
+
+def partial_team_report(member_outputs: dict, deadline: float) -> str:
+    """Report of the members that answered before the consultation deadline."""
+    members = get_team_components()["team_members_by_name"]
+    completed = {members[name][0]: content for name, content in member_outputs.items() if name in members}
+    missing = [name for name, (role, _) in members.items() if role not in completed]
+    print(f"⏰ Consultation deadline of {deadline:g}s reached, returning {len(completed)} member answer(s)")
+    record_partial_report()
+    return render_partial_report(completed, missing)
+
+async def run_shared_team_consultation(inflight_key, patient_summary: str, cache_key: str) -> str:
+    """Team run shared by every consultation attached to ``inflight_key``.
+
+    Runs in a context of its own (see SingleFlight): progress goes to all attached
+    clients and stage checkpoints are saved for all attached runs.
+    """
+    def attached() -> list:
+        return inflight_team_consultations.members(inflight_key)
+
+    def report_to_all(event: str, data: dict):
+        for member in attached():
+            if member["progress"] is not None:
+                member["progress"](event, data)
+
+    members = attached()
+    if members:
+        team_session_context.set(members[0]["team_session"])
+    if any(member["progress"] is not None for member in members):
+        team_progress_callback.set(report_to_all)
+    shared_consultation_runs.set(lambda: [member["run_id"] for member in attached() if member["run_id"]])
+    return await run_team_consultation(patient_summary, cache_key)
+
+async def run_team_consultation(patient_summary: str, cache_key: str) -> str:
+    """Run the specialist team in the configured mode and return its report.
+
+    After CONSULTATION_DEADLINE_SECONDS the report holds the sections finished so far.
+    """
+    with trace_span("team_consultation"):
+        team_input = f"PATIENT CASE FOR MEDICAL TEAM ANALYSIS:\n\n{patient_summary}\n\nPlease provide comprehensive analysis following your established workflow."
+
+        report_progress = team_progress_callback.get()
+        # All paths await the model API, so the event loop keeps serving other
+        # requests and several team consultations can progress concurrently.
+        if MEDICAL_TEAM_MODE in ("pipeline", "adaptive"):
+            # Parallel specialist pipeline (imported lazily, it imports this module).
+            # A full report finished after an URGENT escalation replaces the cached one.
+            from consultation_pipeline import run_consultation_pipeline
+            pipeline_result = await run_consultation_pipeline(
+                patient_summary,
+                adaptive=MEDICAL_TEAM_MODE == "adaptive",
+                on_full_report=lambda content: consultation_cache.set(cache_key, content),
+                deadline=consultation_deadline(),
+            )
+            team_content = pipeline_result["content"]
+        else:
+            session_id = current_team_session_id()
+            medical_team = get_team_components()["medical_team"]
+            deadline = consultation_deadline()
+            member_outputs = {}
+            try:
+                with trace_span("team_leader", model=medical_team.model.id) as span:
+                    if report_progress is not None or deadline is not None:
+                        # Streamed team consultation: member progress is forwarded to the client
+                        # (if any) and finished member answers are kept for a partial report
+                        team_content, span["metrics"] = await asyncio.wait_for(
+                            run_team_with_progress(
+                                team_input, session_id, report_progress or ignore_progress, member_outputs
+                            ),
+                            deadline,
+                        )
+                    else:
+                        # Run team consultation
+                        team_result = await medical_team.arun(team_input, session_id=session_id, stream=False)
+                        team_content = team_result.content
+                        span["metrics"] = team_result.metrics
+                        for member_response in team_result.member_responses or []:
+                            member_metrics = member_response.metrics
+                            record_member_span(
+                                getattr(member_response, "agent_name", None),
+                                getattr(member_metrics, "duration", None) or 0.0,
+                                member_metrics,
+                            )
+            except asyncio.TimeoutError:
+                team_content = partial_team_report(member_outputs, deadline)
+
+            session_size = get_team_session_size(session_id)
+            print(f"🗂️ Team session {session_id}: {session_size['runs']} run(s), {session_size['bytes']} bytes")
+
+        print("✅ Medical team consultation completed")
+        return team_content
 
 # Hausarzt Agent - Patient Interface with Custom Tool
 def create_hausarzt_agent():
@@ -263,7 +645,7 @@ def create_hausarzt_agent():
     return Agent(
         name="Dr. Hausarzt",
         role="European Family Doctor and Patient Interface",
-        model=OpenAIChat("gpt-4.1"),
+        model=model_for("hausarzt"),
         db=shared_db,
         tools=[consult_medical_team],
         add_history_to_context=True,
@@ -361,7 +743,7 @@ def run_medical_consultation():
     team_session_id = f"team_{uuid.uuid4().hex[:8]}"
 
     print(f"📋 Patient Session: {patient_session_id}")
-    print(f"👥 Team Session: {team_session_id}")
+    print(f"👥 Team Session Prefix: {team_session_id}")
     print("-" * 60)
 
     # Create Hausarzt agent with custom tool
@@ -372,6 +754,9 @@ def run_medical_consultation():
     print("Type 'quit' to end consultation")
     print("=" * 60)
 
+    # One event loop for the whole session, so pooled connections can be reused across turns
+    loop = asyncio.new_event_loop()
+
     # Consultation loop
     while True:
         try:
@@ -387,12 +772,20 @@ def run_medical_consultation():
 
             print("\n" + "-" * 40)
 
-            # Hausarzt responds (may use tool automatically)
-            hausarzt_response = hausarzt.run(
-                patient_input,
-                session_id=patient_session_id
+            # Keep the replayed history within the token budget
+            history_tokens = compact_session_history(
+                shared_db, patient_session_id, hausarzt.num_history_runs
             )
 
+            # Hausarzt responds (may use tool automatically; the team tool is async)
+            hausarzt_response = loop.run_until_complete(hausarzt.arun(
+                patient_input,
+                session_id=patient_session_id,
+                stream=False
+            ))
+
+            log_prompt_size(patient_session_id, history_tokens, hausarzt_response.metrics)
+
             print(f"\n👨‍⚕️ Dr. Hausarzt: {hausarzt_response.content}")
             print("-" * 40)
 
@@ -403,6 +796,9 @@ def run_medical_consultation():
             print(f"\n❌ Error during consultation: {e}")
             print("Please try again or type 'quit' to exit.")
 
+    loop.run_until_complete(close_http_client())
+    loop.close()
+
 # Example usage
 if __name__ == "__main__":
     run_medical_consultation()
\ No newline at end of file
@@ -0,0 +1,121 @@
+# model_routing.py - Per-role model selection for the medical agents
+import os
+import re
+import json
+
+from agno.models.openai import OpenAIChat
+from openai import OpenAI
+from pydantic import BaseModel
+
+from http_pool import get_async_http_client, get_sync_http_client, OPENAI_MAX_RETRIES
+from prompt_caching import prompt_cache_params
+from latency_control import deadline_for
+
+# --- Routing Configuration ---
+LARGE_MODEL = os.getenv("LARGE_MODEL", "gpt-4.1")
+SMALL_MODEL = os.getenv("SMALL_MODEL", "gpt-4.1-mini")
+# Optional JSON file {"role": "model id", ...} overriding the defaults below
+MODEL_ROUTES_FILE = os.getenv("MODEL_ROUTES_FILE", "")
+# Re-run a stage on the large model when a small model's output fails its structural check
+MODEL_ESCALATION = os.getenv("MODEL_ESCALATION", "true").lower() == "true"
+
+# Fast models for the screening roles, the large model where reasoning quality matters.
+# Every role can also be overridden via MODEL_<ROLE>, e.g. MODEL_TRIAGE=gpt-4.1.
+DEFAULT_MODEL_ROUTES = {
+    "triage": SMALL_MODEL,
+    "clinical_assessment": SMALL_MODEL,
+    "diagnostic": LARGE_MODEL,
+    "investigation": LARGE_MODEL,
+    "treatment": LARGE_MODEL,
+    "synthesis": LARGE_MODEL,
+    "team_leader": LARGE_MODEL,
+    "hausarzt": LARGE_MODEL,
+}
+
+TRIAGE_LEVEL_PATTERN = re.compile(r"PRIORITY\W*(?:LEVEL)?\W*(URGENT|ROUTINE|MONITOR)", re.IGNORECASE)
+
+CLINICAL_ASSESSMENT_MIN_CHARS = 200
+
+
+def load_model_routes() -> dict:
+    """Merge default routes, the routes file and MODEL_<ROLE> environment overrides."""
+    routes = dict(DEFAULT_MODEL_ROUTES)
+    if MODEL_ROUTES_FILE:
+        with open(MODEL_ROUTES_FILE, encoding="utf-8") as routes_file:
+            routes.update(json.load(routes_file))
+    for role in routes:
+        override = os.getenv(f"MODEL_{role.upper()}")
+        if override:
+            routes[role] = override
+    return routes
+
+
+model_routes = load_model_routes()
+escalation_counts = {}  # role -> number of escalated calls
+
+
+class PooledOpenAIChat(OpenAIChat):
+    """OpenAIChat whose blocking calls (run, print_response) also use a pooled client.
+
+    agno takes a single http_client, which is the async one here; without this, every
+    sync call would create a new OpenAI client with its own connections.
+    """
+
+    def get_client(self) -> OpenAI:
+        return OpenAI(**self._get_client_params(), http_client=get_sync_http_client())
+
+
+def create_model(model_id: str, role: str = None) -> OpenAIChat:
+    """OpenAI model using the process-wide pooled HTTP clients.
+
+    With a role, requests use its prompt cache key and its deadline as request timeout.
+    """
+    if role is None:
+        return PooledOpenAIChat(model_id, http_client=get_async_http_client(), max_retries=OPENAI_MAX_RETRIES)
+    return PooledOpenAIChat(
+        model_id,
+        http_client=get_async_http_client(),
+        max_retries=OPENAI_MAX_RETRIES,
+        timeout=deadline_for(role),
+        **prompt_cache_params(role),
+    )
+
+
+def model_for(role: str) -> OpenAIChat:
+    """Model configured for an agent role."""
+    return create_model(model_routes.get(role, LARGE_MODEL), role)
+
+
+# --- Structural Checks ---
+def passes_structural_check(role: str, content: str) -> bool:
+    """Cheap sanity check of a specialist answer. Roles without a check always pass.
+
+    Typed results (see specialist_reports) were already validated against their schema.
+    """
+    if isinstance(content, BaseModel):
+        return True
+    content = (content or "").strip()
+    if role == "triage":
+        return bool(TRIAGE_LEVEL_PATTERN.search(content))
+    if role == "clinical_assessment":
+        has_structure = any(line.lstrip().startswith(("-", "*", "#", "1.")) for line in content.splitlines())
+        return len(content) >= CLINICAL_ASSESSMENT_MIN_CHARS and has_structure
+    return True
+
+
+def escalation_model(role: str, content: str):
+    """Large model id to retry with, or None if no escalation is needed or possible."""
+    if not MODEL_ESCALATION or model_routes.get(role, LARGE_MODEL) == LARGE_MODEL:
+        return None
+    if passes_structural_check(role, content):
+        return None
+    escalation_counts[role] = escalation_counts.get(role, 0) + 1
+    return LARGE_MODEL
+
+
+def model_routing_stats() -> dict:
+    return {
+        "routes": model_routes,
+        "escalation_enabled": MODEL_ESCALATION,
+        "escalations": escalation_counts,
+    }
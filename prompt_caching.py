@@ -0,0 +1,128 @@
+# prompt_caching.py - Stable prompt prefixes for OpenAI's automatic prompt caching
+#
+# OpenAI caches the longest previously seen prefix of a prompt (from 1024 tokens on)
+# and bills/serves those tokens faster. A prefix only matches if it is byte-identical,
+# so every agent keeps its static parts (system message with instructions, tool and
+# output schemas) first and the volatile parts (history, patient case) after them.
+# agno already orders requests that way and adds no per-request context (date,
+# location, session state) to the system message unless asked to; PrefixMonitor
+# reports it when an agent's prefix changes anyway.
+import os
+import json
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import span_tokens, time_to_first_token
+
+# --- Prompt Cache Configuration ---
+# Route requests by agent role and watch that their static prefix stays the same
+PROMPT_CACHE_LAYOUT = os.getenv("PROMPT_CACHE_LAYOUT", "true").lower() == "true"
+# Requests with the same prompt_cache_key are routed to the same cache by OpenAI
+PROMPT_CACHE_KEY_PREFIX = os.getenv("PROMPT_CACHE_KEY_PREFIX", "medical-bot")
+# Share of outgoing requests whose prefix is checked (0 disables the prefix monitor)
+PROMPT_PREFIX_SAMPLE_RATE = float(os.getenv("PROMPT_PREFIX_SAMPLE_RATE", "0.02"))
+# Prompts shorter than this are never cached by OpenAI
+MIN_CACHEABLE_PROMPT_TOKENS = 1024
+
+
+def prompt_cache_params(role: str) -> dict:
+    """OpenAIChat options that send a per-role prompt_cache_key."""
+    if not PROMPT_CACHE_LAYOUT:
+        return {}
+    return {"extra_body": {"prompt_cache_key": f"{PROMPT_CACHE_KEY_PREFIX}:{role}"}}
+
+
+def static_prefix(body: dict) -> str:
+    """The part of a chat completion request that must not change between calls."""
+    system_messages = []
+    for message in body.get("messages") or []:
+        if message.get("role") not in ("system", "developer"):
+            break
+        system_messages.append(message.get("content"))
+    return json.dumps(
+        [system_messages, body.get("tools"), body.get("response_format")], sort_keys=True, default=str
+    )
+
+
+class PrefixMonitor:
+    """Detects when the static prefix sent under a prompt_cache_key changes.
+
+    A change means the provider cache can't be hit, e.g. because someone added
+    the current date or per-patient data to an agent's instructions.
+    """
+
+    def __init__(self):
+        self._prefixes = {}  # cache key -> {"fingerprint", "tokens", "sampled_requests", "changes"}
+        self._lock = threading.Lock()
+
+    def observe(self, body: dict) -> None:
+        cache_key = body.get("prompt_cache_key")
+        if not cache_key:
+            return
+        prefix = static_prefix(body)
+        fingerprint = hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            entry = self._prefixes.setdefault(
+                cache_key, {"fingerprint": fingerprint, "tokens": 0, "sampled_requests": 0, "changes": 0}
+            )
+            entry["sampled_requests"] += 1
+            entry["tokens"] = len(prefix) // 4  # rough estimate, see history_compaction
+            changed = entry["fingerprint"] != fingerprint
+            if changed:
+                entry["fingerprint"] = fingerprint
+                entry["changes"] += 1
+        if changed:
+            print(f"⚠️ Static prompt prefix of {cache_key} changed, the provider prompt cache will miss")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {key: dict(entry) for key, entry in self._prefixes.items()}
+
+
+prefix_monitor = PrefixMonitor()
+# Parses sampled request bodies (history included) away from the event loop
+_prefix_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prompt-prefix")
+
+
+def _observe_sampled(content: bytes) -> None:
+    try:
+        prefix_monitor.observe(json.loads(content))
+    except ValueError:
+        pass
+
+
+def observe_request_body(content: bytes) -> None:
+    """Sample an outgoing chat completion request for the prefix monitor (see http_pool).
+
+    Runs in the httpx request hook, so it only decides whether to sample; the body
+    is parsed in a background thread.
+    """
+    if not PROMPT_CACHE_LAYOUT or random.random() >= PROMPT_PREFIX_SAMPLE_RATE:
+        return
+    if b'"prompt_cache_key"' in content:
+        _prefix_executor.submit(_observe_sampled, content)
+
+
+def prompt_cache_stats() -> dict:
+    """Cached share of prompt tokens and time to first token per span, plus prefix stability."""
+    tokens = span_tokens.values()
+    spans = {}
+    for (span, model, kind), value in tokens.items():
+        entry = spans.setdefault(span, {"prompt_tokens": 0, "cached_tokens": 0})
+        if kind == "prompt":
+            entry["prompt_tokens"] += value
+        elif kind == "cached":
+            entry["cached_tokens"] += value
+    for span, entry in spans.items():
+        entry["cache_hit_rate"] = entry["cached_tokens"] / entry["prompt_tokens"] if entry["prompt_tokens"] else 0.0
+    for (span, model), series in time_to_first_token.summaries().items():
+        spans.setdefault(span, {}).setdefault("avg_time_to_first_token", {})[model] = series["sum"] / series["count"]
+    return {
+        "layout": PROMPT_CACHE_LAYOUT,
+        "min_cacheable_prompt_tokens": MIN_CACHEABLE_PROMPT_TOKENS,
+        "prefix_sample_rate": PROMPT_PREFIX_SAMPLE_RATE,
+        "spans": spans,
+        "prefixes": prefix_monitor.stats(),
+    }
@@ -0,0 +1,164 @@
+# session_storage.py - Bounded, persistent storage for Hausarzt and team sessions
+import os
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from agno.db.base import SessionType
+from agno.db.in_memory import InMemoryDb
+from agno.db.sqlite import SqliteDb
+from agno.session import AgentSession, TeamSession
+
+# --- Session Storage Configuration ---
+# SQLite file for sessions (empty keeps everything in process memory as before)
+SESSION_DB_FILE = os.getenv("SESSION_DB_FILE", "tmp/sessions.db")
+# Runs kept per session; Dr. Hausarzt replays the last 10, older runs are dropped on write
+SESSION_MAX_RUNS = int(os.getenv("SESSION_MAX_RUNS", "20"))
+# Serialized size limit per session; oldest runs are dropped until it fits
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(1024 * 1024)))
+# In-memory tier of active sessions in front of SQLite
+SESSION_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_CACHE_MAX_SESSIONS", "200"))
+SESSION_CACHE_IDLE_SECONDS = float(os.getenv("SESSION_CACHE_IDLE_SECONDS", "600"))
+
+SESSION_CLASSES = {
+    SessionType.AGENT: AgentSession,
+    SessionType.TEAM: TeamSession,
+}
+
+
+def session_size(session_dict: dict) -> int:
+    return len(json.dumps(session_dict, default=str).encode("utf-8"))
+
+
+class BoundedSqliteDb(SqliteDb):
+    """SQLite session storage with per-session limits and a small memory tier.
+
+    Writes go through to SQLite, so sessions survive restarts and scale-down.
+    Recently used sessions are also kept in memory; sessions idle for longer than
+    SESSION_CACHE_IDLE_SECONDS (or beyond SESSION_CACHE_MAX_SESSIONS) leave memory
+    and are read back from disk on their next use. Because every stored session is
+    trimmed to its most recent SESSION_MAX_RUNS runs, loading a session for the
+    history replay never reads more than those runs.
+    """
+
+    def __init__(self, db_file=SESSION_DB_FILE, max_runs=SESSION_MAX_RUNS, max_bytes=SESSION_MAX_BYTES,
+                 cache_max_sessions=SESSION_CACHE_MAX_SESSIONS, cache_idle_seconds=SESSION_CACHE_IDLE_SECONDS):
+        directory = os.path.dirname(db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        super().__init__(db_file=db_file)
+        self.max_runs = max_runs
+        self.max_bytes = max_bytes
+        self.cache_max_sessions = cache_max_sessions
+        self.cache_idle_seconds = cache_idle_seconds
+        self._active = OrderedDict()  # (session_id, session_type) -> (session dict, last access)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._idle_evictions = 0
+        self._trimmed_runs = 0
+
+    def _evict_idle(self, now: float) -> None:
+        while self._active:
+            key, (_, last_access) = next(iter(self._active.items()))
+            if len(self._active) <= self.cache_max_sessions and now - last_access <= self.cache_idle_seconds:
+                break
+            del self._active[key]
+            self._idle_evictions += 1
+
+    def _remember(self, session_dict: dict, session_type) -> None:
+        now = time.time()
+        key = (session_dict["session_id"], session_type)
+        with self._lock:
+            self._active[key] = (session_dict, now)
+            self._active.move_to_end(key)
+            self._evict_idle(now)
+
+    def _trim(self, session) -> None:
+        """Drop the oldest runs beyond the run-count and size limits."""
+        runs = session.runs or []
+        if len(runs) > self.max_runs:
+            self._trimmed_runs += len(runs) - self.max_runs
+            session.runs = runs = runs[-self.max_runs:]
+        while len(runs) > 1 and session_size(session.to_dict()) > self.max_bytes:
+            session.runs = runs = runs[1:]
+            self._trimmed_runs += 1
+
+    def get_session(self, session_id, session_type=None, user_id=None, deserialize=True, *args, **kwargs):
+        if session_type is None or args or kwargs.get("runs_limit") is not None:
+            # Lookups the memory tier can't answer as such (any type, only the last runs) go to SQLite
+            return super().get_session(session_id, session_type, user_id, deserialize, *args, **kwargs)
+
+        key = (session_id, session_type)
+        now = time.time()
+        with self._lock:
+            entry = self._active.get(key)
+            if entry is not None and (user_id is None or entry[0].get("user_id") == user_id):
+                self._active[key] = (entry[0], now)
+                self._active.move_to_end(key)
+                self._hits += 1
+                session_dict = entry[0]
+            else:
+                session_dict = None
+                self._misses += 1
+            self._evict_idle(now)
+
+        if session_dict is None:
+            session_dict = super().get_session(
+                session_id=session_id, session_type=session_type, user_id=user_id, deserialize=False, **kwargs
+            )
+            if session_dict is None:
+                return None
+            self._remember(session_dict, session_type)
+
+        # Callers get their own copy; the memory tier only changes through upsert_session.
+        # (agno's from_dict also pops fields such as the run messages off the dict it is given.)
+        if not deserialize:
+            return json.loads(json.dumps(session_dict, default=str))
+        return SESSION_CLASSES[session_type].from_dict(copy.deepcopy(session_dict))
+
+    def upsert_session(self, session, deserialize=True, *args, **kwargs):
+        self._trim(session)
+        stored = super().upsert_session(session, deserialize, *args, **kwargs)
+        session_type = SessionType.TEAM if isinstance(session, TeamSession) else SessionType.AGENT
+        self._remember(session.to_dict(), session_type)
+        return stored
+
+    def forget(self, session_id) -> None:
+        """Drop a session from the memory tier, e.g. after another process wrote it."""
+        with self._lock:
+            for key in [key for key in self._active if key[0] == session_id]:
+                del self._active[key]
+
+    def delete_session(self, session_id):
+        self.forget(session_id)
+        return super().delete_session(session_id)
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "backend": "sqlite",
+            "active_sessions": len(self._active),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "idle_evictions": self._idle_evictions,
+            "trimmed_runs": self._trimmed_runs,
+            "max_runs": self.max_runs,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def create_session_db():
+    """Session storage selected via SESSION_DB_FILE (empty: unbounded InMemoryDb)."""
+    if SESSION_DB_FILE:
+        return BoundedSqliteDb()
+    return InMemoryDb()
+
+
+def session_storage_stats(db) -> dict:
+    if isinstance(db, BoundedSqliteDb):
+        return db.stats()
+    return {"backend": "memory"}
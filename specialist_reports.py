@@ -0,0 +1,177 @@
+# specialist_reports.py - Typed specialist outputs and the deterministic team report renderer
+import os
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+# --- Configuration ---
+# Specialists return compact typed results instead of free-form markdown
+STRUCTURED_SPECIALIST_OUTPUTS = os.getenv("STRUCTURED_SPECIALIST_OUTPUTS", "true").lower() == "true"
+
+
+# --- Specialist Schemas ---
+class TriageReport(BaseModel):
+    priority: Literal["URGENT", "ROUTINE", "MONITOR"] = Field(..., description="Priority level of the case")
+    red_flags: List[str] = Field(default_factory=list, description="Red flag symptoms found, if any")
+    rationale: str = Field(..., description="One or two sentences explaining the priority level")
+
+    def render(self) -> str:
+        lines = [f"**Priority: {self.priority}** – {self.rationale}"]
+        if self.red_flags:
+            lines.append("Red flags: " + ", ".join(self.red_flags))
+        return "\n".join(lines)
+
+
+class ClinicalFindings(BaseModel):
+    key_findings: List[str] = Field(..., description="Clinically significant findings, one short phrase each")
+    risk_factors: List[str] = Field(default_factory=list, description="Relevant history and risk factors")
+    missing_information: List[str] = Field(default_factory=list, description="Important information still missing")
+
+    def render(self) -> str:
+        lines = [f"- {finding}" for finding in self.key_findings]
+        if self.risk_factors:
+            lines.append("- Risk factors: " + ", ".join(self.risk_factors))
+        if self.missing_information:
+            lines.append("- Missing information: " + ", ".join(self.missing_information))
+        return "\n".join(lines)
+
+
+class Diagnosis(BaseModel):
+    name: str
+    likelihood: Literal["high", "medium", "low"]
+    rationale: str = Field(..., description="One sentence")
+    must_not_miss: bool = Field(False, description="Serious condition that has to be excluded")
+
+
+class DifferentialDiagnosis(BaseModel):
+    diagnoses: List[Diagnosis] = Field(..., description="Most likely diagnoses first")
+
+    def render(self) -> str:
+        lines = []
+        for index, diagnosis in enumerate(self.diagnoses, start=1):
+            flag = " ⚠️ must not miss" if diagnosis.must_not_miss else ""
+            lines.append(f"{index}. **{diagnosis.name}** ({diagnosis.likelihood}){flag} – {diagnosis.rationale}")
+        return "\n".join(lines)
+
+
+class Investigation(BaseModel):
+    test: str
+    purpose: str = Field(..., description="What the test confirms or excludes")
+    urgency: Literal["immediate", "soon", "optional"]
+    setting: Literal["primary care", "specialist"] = "primary care"
+
+
+class InvestigationPlan(BaseModel):
+    investigations: List[Investigation] = Field(..., description="Most urgent first")
+
+    def render(self) -> str:
+        return "\n".join(
+            f"- **{item.test}** ({item.urgency}, {item.setting}) – {item.purpose}"
+            for item in self.investigations
+        )
+
+
+class TreatmentPlan(BaseModel):
+    medications: List[str] = Field(default_factory=list, description="Drug, dose and alternatives per entry")
+    non_pharmacological: List[str] = Field(default_factory=list, description="Self-care and lifestyle measures")
+    warning_signs: List[str] = Field(default_factory=list, description="Symptoms requiring immediate medical attention")
+    follow_up: str = Field(..., description="When and why to see the doctor again, expected improvement timeline")
+
+    def render(self) -> str:
+        lines = [f"- {medication}" for medication in self.medications]
+        lines += [f"- {measure}" for measure in self.non_pharmacological]
+        return "\n".join(lines) or "- No specific treatment required"
+
+    def render_follow_up(self) -> str:
+        lines = [self.follow_up]
+        if self.warning_signs:
+            lines.append("Seek medical attention immediately if: " + ", ".join(self.warning_signs))
+        return "\n".join(lines)
+
+
+SPECIALIST_SCHEMAS = {
+    "triage": TriageReport,
+    "clinical_assessment": ClinicalFindings,
+    "diagnostic": DifferentialDiagnosis,
+    "investigation": InvestigationPlan,
+    "treatment": TreatmentPlan,
+}
+
+
+def output_schema_for(role: str):
+    """Output schema for a specialist role, or None when structured outputs are disabled."""
+    return SPECIALIST_SCHEMAS.get(role) if STRUCTURED_SPECIALIST_OUTPUTS else None
+
+
+def report_as_text(content) -> str:
+    """Compact text of a specialist result for the next stage's prompt."""
+    if isinstance(content, BaseModel):
+        return content.model_dump_json(exclude_defaults=True)
+    return content or ""
+
+
+# --- Team Report ---
+def render_team_report(stage_outputs: dict, triage_level: Optional[str] = None) -> Optional[str]:
+    """Assemble the six report sections from typed specialist results without an LLM call.
+
+    Returns None if any available result is free-form text (e.g. the model's answer
+    could not be parsed), so the caller can fall back to LLM synthesis.
+    """
+    if not all(isinstance(content, BaseModel) for content in stage_outputs.values()):
+        return None
+
+    skipped = f"Not required at triage level {triage_level}." if triage_level else "Not assessed."
+
+    def section(stage: str) -> str:
+        content = stage_outputs.get(stage)
+        return content.render() if content is not None else skipped
+
+    treatment = stage_outputs.get("treatment")
+    sections = [
+        ("TRIAGE ASSESSMENT", section("triage")),
+        ("CLINICAL FINDINGS", section("clinical_assessment")),
+        ("DIFFERENTIAL DIAGNOSIS", section("diagnostic")),
+        ("RECOMMENDED INVESTIGATIONS", section("investigation")),
+        ("TREATMENT PLAN", section("treatment")),
+        ("FOLLOW-UP RECOMMENDATIONS", treatment.render_follow_up() if treatment is not None else skipped),
+    ]
+    return "\n\n".join(f"## {title}\n{body}" for title, body in sections)
+
+
+# Marks a report assembled after the consultation deadline (never cached)
+PARTIAL_REPORT_MARKER = "[Partial report]"
+
+
+def render_partial_report(stage_outputs: dict, missing: list) -> str:
+    """Report from the specialist results that finished before the consultation deadline.
+
+    Typed results are rendered, free-form answers are included as written; sections
+    without a result say so, and the report starts with PARTIAL_REPORT_MARKER.
+    """
+    unavailable = "Not available: the specialist did not finish within the consultation deadline."
+
+    def section(stage: str) -> str:
+        content = stage_outputs.get(stage)
+        if content is None:
+            return unavailable
+        return content.render() if isinstance(content, BaseModel) else content
+
+    treatment = stage_outputs.get("treatment")
+    if isinstance(treatment, TreatmentPlan):
+        follow_up = treatment.render_follow_up()
+    else:
+        follow_up = "See treatment plan." if treatment else unavailable
+    sections = [
+        ("TRIAGE ASSESSMENT", section("triage")),
+        ("CLINICAL FINDINGS", section("clinical_assessment")),
+        ("DIFFERENTIAL DIAGNOSIS", section("diagnostic")),
+        ("RECOMMENDED INVESTIGATIONS", section("investigation")),
+        ("TREATMENT PLAN", section("treatment")),
+        ("FOLLOW-UP RECOMMENDATIONS", follow_up),
+    ]
+    header = (
+        f"{PARTIAL_REPORT_MARKER} The specialist team did not finish in time. "
+        f"Missing: {', '.join(missing) if missing else 'final synthesis'}. "
+        "Please present the available findings and say that the assessment is incomplete."
+    )
+    return header + "\n\n" + "\n\n".join(f"## {title}\n{body}" for title, body in sections)
@@ -4,6 +4,7 @@ const $form = document.getElementById("composer");
 const $input = document.getElementById("input");
 const $send = document.getElementById("send");
 const $typing = document.getElementById("typing");
+const $typingStatus = document.getElementById("typingStatus");
 
 // Translation system
 const translations = {
@@ -48,7 +49,10 @@ const translations = {
         atTime: "um",
         teamConsultation: "🔄 Medizinisches Team wird konsultiert...",
         consultationWarning: "⏳ Die Team-Konsultation kann bis zu 10 Minuten dauern. Bitte schließen Sie den Browser nicht.",
-        consultationTimeout: "❌ Etwas ist schiefgelaufen. Diese Konversation ist beendet. Laden Sie die Seite neu und versuchen Sie es erneut."
+        consultationTimeout: "❌ Etwas ist schiefgelaufen. Diese Konversation ist beendet. Laden Sie die Seite neu und versuchen Sie es erneut.",
+        memberStarted: "arbeitet...",
+        memberCompleted: "fertig",
+        queuePosition: "Warteschlange – Position"
     },
     ru: {
         title: "Медицинская консультация - Доктор Хаусарцт",
@@ -91,7 +95,10 @@ const translations = {
         atTime: "в",
         teamConsultation: "🔄 Медицинская команда консультируется...",
         consultationWarning: "⏳ Консультация команды может занять до 10 минут. Пожалуйста, не закрывайте браузер.",
-        consultationTimeout: "❌ Что-то пошло не так. Эта беседа завершена. Обновите страницу и попробуйте еще раз."
+        consultationTimeout: "❌ Что-то пошло не так. Эта беседа завершена. Обновите страницу и попробуйте еще раз.",
+        memberStarted: "работает...",
+        memberCompleted: "готово",
+        queuePosition: "Очередь – позиция"
     }
 };
 
@@ -601,6 +608,77 @@ function bubble(text, who = "bot", { markdown = false } = {}) {
 function setLoading(loading) {
     $send.disabled = loading || !$input.value.trim();
     $typing.classList.toggle("hidden", !loading);
+    if (!loading) setTypingStatus("");
+}
+
+// Show team member progress next to the typing indicator
+function setTypingStatus(text) {
+    if ($typingStatus) $typingStatus.textContent = text;
+}
+
+// Bot bubble that grows while answer tokens arrive (not saved to history)
+function streamingBubble() {
+    let div = null;
+    let text = "";
+
+    return {
+        append(token) {
+            if (!div) {
+                div = document.createElement("div");
+                div.className = "bubble bot";
+                $messages.appendChild(div);
+            }
+            text += token;
+            div.innerHTML = marked.parse(text);
+            scrollToBottom();
+        },
+        // Remove the live bubble and return the streamed text
+        finish() {
+            if (div) div.remove();
+            div = null;
+            const result = text;
+            text = "";
+            return result;
+        }
+    };
+}
+
+// Read a Server-Sent Events response body and dispatch each event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const chunk = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = "message";
+            let data = "";
+            for (const line of chunk.split("\n")) {
+                if (line.startsWith("event: ")) eventName = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            }
+            if (data) onEvent(eventName, JSON.parse(data));
+        }
+    }
+}
+
+function showQueuePosition(position) {
+    setTypingStatus(position ? `${translations[currentLang].queuePosition} ${position}` : "");
+}
+
+function handleProgressEvent(progress) {
+    const label = progress.stage === "completed"
+        ? translations[currentLang].memberCompleted
+        : translations[currentLang].memberStarted;
+    setTypingStatus(`${progress.member} ${label}`);
 }
 
 // Auto-resize textarea function
@@ -643,6 +721,9 @@ $form.addEventListener("submit", async (e) => {
             formData.append("user_id", currentUserName);
         }
 
+        // Ask for token streaming (server may still answer with plain JSON)
+        formData.append("stream", "true");
+
         const consultationRes = await fetch(`/api/consultation`, {
             method: "POST",
             body: formData
@@ -652,7 +733,31 @@ $form.addEventListener("submit", async (e) => {
             throw new Error(`HTTP ${consultationRes.status}`);
         }
 
-        const data = await consultationRes.json();
+        let data = null;
+        const contentType = consultationRes.headers.get("content-type") || "";
+
+        if (contentType.includes("text/event-stream") && consultationRes.body) {
+            // Render Dr. Hausarzt's answer while it is generated
+            const live = streamingBubble();
+            await readEventStream(consultationRes, (eventName, eventData) => {
+                if (eventName === "token") {
+                    live.append(eventData.content);
+                } else if (eventName === "status") {
+                    data = eventData;
+                }
+            });
+
+            const streamedText = live.finish();
+            if (data && data.status === "TEAM_CONSULTATION_STARTED" && streamedText.trim()) {
+                // Keep what the doctor said before handing over to the team
+                bubble(streamedText, "bot", { markdown: true });
+            }
+            if (!data) {
+                throw new Error("Stream ended without status");
+            }
+        } else {
+            data = await consultationRes.json();
+        }
 
         // Check for team consultation code word
         if (data.status === "TEAM_CONSULTATION_STARTED") {
@@ -663,14 +768,19 @@ $form.addEventListener("submit", async (e) => {
 
             // Show consultation warning
             bubble(translations[currentLang].consultationWarning, "bot");
+            showQueuePosition(data.queue_position);
+            activeConsultationRunId = data.run_id;
 
-            // Start polling for results
-            startConsultationPolling(data.run_id);
+            // Wait for results (SSE stream, polling as fallback)
+            startConsultationStream(data.run_id);
         } else if (data.status === "COMPLETED") {
             // Direct response (no team consultation needed)
             const responseText = data.result || "Response received.";
             bubble(responseText, "bot", { markdown: true });
             setLoading(false);
+        } else if (data.status === "ERROR") {
+            bubble(data.result || translations[currentLang].errorMessage, "bot");
+            setLoading(false);
         } else {
             throw new Error(`Unexpected response status: ${data.status}`);
         }
@@ -683,13 +793,119 @@ $form.addEventListener("submit", async (e) => {
     }
 });
 
+// Result handling shared by the status stream and the polling fallback
+function finishConsultation(statusData) {
+    activeConsultationRunId = null;
+
+    if (statusData.status === "COMPLETED") {
+        // Team consultation completed
+        const resultText = statusData.result || "Team consultation completed.";
+        bubble(resultText, "bot", { markdown: true });
+    } else {
+        // Team consultation failed
+        const errorText = statusData.result || "Team consultation failed.";
+        bubble(errorText, "bot");
+    }
+
+    setLoading(false);
+    $input.focus();
+}
+
+const consultationMaxDuration = 10 * 60 * 1000; // 10 minutes max
+const terminalStatuses = ["COMPLETED", "ERROR", "CANCELLED"];
+
+// Team consultation the page is currently waiting for (cancelled when abandoned)
+let activeConsultationRunId = null;
+
+function cancelConsultation(runId) {
+    if (!runId) return;
+    console.log(`🛑 Cancelling consultation run_id: ${runId}`);
+    // keepalive lets the request finish while the page unloads
+    fetch(`/api/consultation/${runId}`, { method: "DELETE", keepalive: true })
+        .catch((err) => console.error("Cancel error:", err));
+}
+
+window.addEventListener("pagehide", () => {
+    cancelConsultation(activeConsultationRunId);
+});
+
+// Server-Sent Events stream for team consultations (falls back to polling)
+function startConsultationStream(runId) {
+    if (!window.EventSource) {
+        startConsultationPolling(runId);
+        return;
+    }
+
+    console.log(`📡 Opening status stream for run_id: ${runId}`);
+
+    const source = new EventSource(`/api/consultation/${runId}/stream`);
+    const live = streamingBubble();
+    let finished = false;
+
+    const timeout = setTimeout(() => {
+        if (finished) return;
+        finished = true;
+        source.close();
+        live.finish();
+        console.log("⏱️ Stream timeout reached");
+        cancelConsultation(runId);
+        activeConsultationRunId = null;
+
+        bubble(translations[currentLang].consultationTimeout, "bot");
+        setLoading(false);
+        $input.focus();
+    }, consultationMaxDuration);
+
+    source.addEventListener("status", (e) => {
+        const statusData = JSON.parse(e.data);
+        console.log(`📡 Stream status: ${statusData.status}`);
+
+        if (terminalStatuses.includes(statusData.status)) {
+            finished = true;
+            clearTimeout(timeout);
+            source.close();
+            live.finish();
+            finishConsultation(statusData);
+        } else {
+            // Still "RUNNING" (possibly queued), wait for the next event
+            showQueuePosition(statusData.queue_position);
+        }
+    });
+
+    // Queue position updates while waiting for a free consultation slot
+    source.addEventListener("queue", (e) => {
+        showQueuePosition(JSON.parse(e.data).queue_position);
+    });
+
+    // Answer tokens of Dr. Hausarzt while the final response is written
+    source.addEventListener("token", (e) => {
+        live.append(JSON.parse(e.data).content);
+    });
+
+    // Team member progress ("Triage Agent fertig")
+    source.addEventListener("progress", (e) => {
+        handleProgressEvent(JSON.parse(e.data));
+    });
+
+    source.onerror = () => {
+        if (finished) return;
+        finished = true;
+        clearTimeout(timeout);
+        source.close();
+        live.finish();
+
+        console.warn("📡 Status stream unavailable, falling back to polling");
+        startConsultationPolling(runId);
+    };
+}
+
 // Polling system for team consultations
 let consultationPollingInterval = null;
 
 function startConsultationPolling(runId) {
     console.log(`📊 Starting polling for run_id: ${runId}`);
 
-    const maxDuration = 10 * 60 * 1000; // 10 minutes max
+    const maxDuration = consultationMaxDuration;
     const pollInterval = 10 * 1000; // 10 seconds
     const startTime = Date.now();
 
@@ -700,6 +916,8 @@ function startConsultationPolling(runId) {
             if (Date.now() - startTime > maxDuration) {
                 console.log("⏱️ Polling timeout reached");
                 clearInterval(consultationPollingInterval);
+                cancelConsultation(runId);
+                activeConsultationRunId = null;
                 
                 bubble(translations[currentLang].consultationTimeout, "bot");
 
@@ -718,27 +936,13 @@ function startConsultationPolling(runId) {
             const statusData = await statusRes.json();
             console.log(`📊 Polling status: ${statusData.status}`);
 
-            if (statusData.status === "COMPLETED") {
-                // Team consultation completed
-                clearInterval(consultationPollingInterval);
-                
-                const resultText = statusData.result || "Team consultation completed.";
-                bubble(resultText, "bot", { markdown: true });
-
-                setLoading(false);
-                $input.focus();
-
-            } else if (statusData.status === "ERROR") {
-                // Team consultation failed
+            if (terminalStatuses.includes(statusData.status)) {
                 clearInterval(consultationPollingInterval);
-                
-                const errorText = statusData.result || "Team consultation failed.";
-                bubble(errorText, "bot");
-
-                setLoading(false);
-                $input.focus();
+                finishConsultation(statusData);
+            } else {
+                // If status is still "RUNNING", continue polling
+                showQueuePosition(statusData.queue_position);
             }
-            // If status is still "RUNNING", continue polling
 
         } catch (err) {
             console.error("Polling error:", err);
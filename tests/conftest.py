@@ -0,0 +1,62 @@
+# conftest.py - Shared test setup: isolated storage files and a fake OpenAI API
+import os
+import sys
+import json
+import tempfile
+
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Module-level configuration is read on import, so it has to be set before any test imports the app
+TEST_DIR = tempfile.mkdtemp(prefix="medical-bot-tests-")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.pop("AUTH_PASSWORD", None)
+os.environ["SESSION_DB_FILE"] = os.path.join(TEST_DIR, "sessions.db")
+os.environ["CONSULTATION_CHECKPOINT_DB"] = os.path.join(TEST_DIR, "checkpoints.db")
+os.environ["CONSULTATION_DB_FILE"] = os.path.join(TEST_DIR, "consultations.db")
+os.environ["CONSULTATION_QUEUE_DB"] = os.path.join(TEST_DIR, "consultation_jobs.db")
+os.environ.setdefault("WARMUP_TEAM", "false")
+
+
+def chat_completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-test",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+    }
+
+
+def chat_completion_stream(content: str) -> bytes:
+    chunks = [
+        {"id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "gpt-test",
+         "choices": [{"index": 0, "delta": {"role": "assistant", "content": word}, "finish_reason": None}]}
+        for word in content.split(" ")
+    ]
+    chunks.append({"id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "gpt-test",
+                   "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+    return body.encode("utf-8")
+
+
+@pytest.fixture
+def fake_openai():
+    """Async HTTP client answering every chat completion with a fixed text (streamed or not)."""
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append(body)
+        if body.get("stream"):
+            return httpx.Response(200, content=chat_completion_stream("Alles in Ordnung"),
+                                  headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json=chat_completion("Alles in Ordnung"))
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client.requests = requests
+    return client
@@ -0,0 +1,35 @@
+# test_batch_consultations.py - Batch runs reach the team for every case unless caching is asked for
+import asyncio
+import json
+
+import pytest
+
+import medical_agent_with_team
+from batch_consultations import run_batch
+from medical_agent_with_team import consultation_cache
+
+CASES = [{"id": f"case-{n}", "patient_summary": "PATIENT: 40 years\nCHIEF COMPLAINT: Cough"} for n in range(2)]
+
+
+@pytest.fixture
+def team_runs(monkeypatch):
+    runs = []
+
+    async def run_team_consultation(patient_summary, cache_key):
+        runs.append(patient_summary)
+        return "Team report"
+
+    monkeypatch.setattr(medical_agent_with_team, "run_team_consultation", run_team_consultation)
+    yield runs
+    consultation_cache.enabled = True
+
+
+@pytest.mark.parametrize("use_cache, expected_runs", [(False, 2), (True, 1)])
+def test_equivalent_cases_hit_the_team_unless_cached(tmp_path, team_runs, use_cache, expected_runs):
+    output = tmp_path / f"results-{use_cache}.jsonl"
+    counts = asyncio.run(run_batch(CASES, str(output), concurrency=1, rate=0, use_cache=use_cache))
+
+    assert counts == {"ok": 2, "error": 0}
+    assert len(team_runs) == expected_runs
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [result["team_report"] for result in results] == ["Team report"] * 2
@@ -0,0 +1,58 @@
+# test_benchmark_fake_server.py - The benchmark's fake OpenAI server plays Hausarzt, team leader and specialists
+import json
+
+from fastapi.testclient import TestClient
+
+from benchmark import CONSULT_MARKER, create_fake_openai_app
+
+LEADER_PROMPT = """<team_members>
+ - Agent 1:
+   - ID: triage-agent
+   - Name: Triage Agent
+ - Agent 2:
+   - ID: treatment-agent
+   - Name: Treatment Agent
+</team_members>"""
+DELEGATION_TOOL = {"type": "function", "function": {"name": "delegate_task_to_member", "parameters": {}}}
+
+
+def complete(client: TestClient, messages: list, **body) -> dict:
+    response = client.post("/v1/chat/completions", json={"model": "gpt-test", "messages": messages, **body})
+    return response.json()["choices"][0]
+
+
+def tool_result(call: dict) -> list:
+    return [{"role": "assistant", "tool_calls": [call]}, {"role": "tool", "tool_call_id": call["id"], "content": "ok"}]
+
+
+def test_hausarzt_requests_a_team_consultation():
+    client = TestClient(create_fake_openai_app(0, 10_000, 5))
+    tools = [{"type": "function", "function": {"name": "medical_team_consultation", "parameters": {}}}]
+
+    choice = complete(client, [{"role": "user", "content": f"Kopfschmerzen {CONSULT_MARKER}"}], tools=tools)
+    assert choice["message"]["tool_calls"][0]["function"]["name"] == "medical_team_consultation"
+
+
+def test_team_leader_delegates_to_every_member_then_answers():
+    client = TestClient(create_fake_openai_app(0, 10_000, 5))
+    messages = [{"role": "developer", "content": LEADER_PROMPT}, {"role": "user", "content": "PATIENT: x"}]
+
+    delegated = []
+    for _ in range(2):
+        choice = complete(client, messages, tools=[DELEGATION_TOOL])
+        call = choice["message"]["tool_calls"][0]
+        delegated.append(json.loads(call["function"]["arguments"])["member_id"])
+        messages += tool_result(call)
+
+    assert delegated == ["triage-agent", "treatment-agent"]
+    final = complete(client, messages, tools=[DELEGATION_TOOL])
+    assert final["finish_reason"] == "stop" and final["message"]["content"]
+
+
+def test_specialists_get_schema_conforming_answers():
+    client = TestClient(create_fake_openai_app(0, 10_000, 5))
+    schema = {"type": "object", "properties": {"priority": {"enum": ["URGENT", "ROUTINE"]}, "red_flags": {"type": "array", "items": {"type": "string"}}}}
+    response_format = {"type": "json_schema", "json_schema": {"name": "TriageReport", "schema": schema}}
+
+    choice = complete(client, [{"role": "user", "content": "PATIENT: x"}], response_format=response_format)
+    assert json.loads(choice["message"]["content"]) == {"priority": "ROUTINE", "red_flags": ["Benchmark placeholder text."]}
@@ -0,0 +1,197 @@
+# test_consultation_cache.py - Cache keys of patient summaries, the report cache and in-flight coalescing
+import asyncio
+import contextvars
+
+import medical_agent_with_team
+from consultation_cache import ConsultationCache, SingleFlight, consultation_cache_key
+from medical_agent_with_team import (
+    consultation_checkpoints,
+    consultation_run_context,
+    consultation_run_ids,
+    get_team_report,
+    patient_session_context,
+    team_progress_callback,
+)
+
+caller_context = contextvars.ContextVar("caller_context", default=None)
+
+SUMMARY = """PATIENT: 58 years, male
+CHIEF COMPLAINT: Chest pain
+Onset: 2 hours ago
+Associated symptoms: shortness of breath, sweating
+Medical history: hypertension
+Medications: ramipril 5 mg"""
+
+
+def with_field(field: str, value: str) -> str:
+    lines = [f"{field}: {value}" if line.startswith(f"{field}:") else line for line in SUMMARY.splitlines()]
+    return "\n".join(lines)
+
+
+def test_formatting_differences_share_a_key():
+    reformatted = "\n".join(
+        ["Medications:   Ramipril 5 mg."]
+        + [f"- {line}" for line in SUMMARY.splitlines() if not line.startswith("Medications")]
+    )
+    assert consultation_cache_key(reformatted, "team") == consultation_cache_key(SUMMARY, "team")
+
+
+def test_negated_findings_get_different_keys():
+    base = consultation_cache_key(with_field("Associated symptoms", "shortness of breath"))
+    negated = consultation_cache_key(with_field("Associated symptoms", "not shortness of breath"))
+    no = consultation_cache_key(with_field("Associated symptoms", "no shortness of breath"))
+    assert len({base, negated, no}) == 3
+
+
+def test_negated_quality_gets_a_different_key():
+    assert consultation_cache_key("Quality: radiating") != consultation_cache_key("Quality: not radiating")
+    assert consultation_cache_key("Medical history: keine bekannt") != consultation_cache_key("Medical history: bekannt")
+
+
+def test_word_order_changes_the_key():
+    assert consultation_cache_key("Location: left arm, not chest") != consultation_cache_key("Location: chest, not left arm")
+
+
+def test_mode_is_part_of_the_key():
+    assert consultation_cache_key(SUMMARY, "team") != consultation_cache_key(SUMMARY, "pipeline")
+
+
+def test_cache_expires_and_evicts():
+    cache = ConsultationCache(ttl_seconds=60, max_entries=2, db_file="")
+    cache.set("a", "report a")
+    cache.set("b", "report b")
+    cache.set("c", "report c")
+
+    assert cache.get("a") is None
+    assert cache.get("c") == "report c"
+    assert cache.stats()["evictions"] == 1
+
+    expired = ConsultationCache(ttl_seconds=0, db_file="")
+    expired.set("a", "report a")
+    assert expired.get("a") is None
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    db_file = str(tmp_path / "cache.db")
+    ConsultationCache(db_file=db_file).set("key", "report")
+
+    cache = ConsultationCache(db_file=db_file)
+    assert cache.get("key") == "report"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+
+    async def consult():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "report"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.run("key", consult) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == ["report"] * 3
+    assert len(calls) == 1
+    assert flight.stats() == {"inflight": 0, "coalesced": 2}
+
+
+def test_disabled_cache_neither_serves_nor_stores():
+    cache = ConsultationCache(db_file="", enabled=False)
+    cache.set("key", "report")
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["misses"] == 0
+
+
+def test_repeated_fields_keep_every_value():
+    def summary(location, severity):
+        return (f"- Location: {location}\n- Severity: {severity}\n"
+                "- Location: left arm\n- Severity: 5/10\nCHIEF COMPLAINT: Pain")
+    assert consultation_cache_key(summary("chest", "8/10")) != consultation_cache_key(summary("back", "3/10"))
+
+
+def test_text_before_the_first_field_is_kept():
+    collapsed = "Patient collapsed, unresponsive.\n" + SUMMARY
+    assert consultation_cache_key(collapsed) != consultation_cache_key(SUMMARY)
+
+
+def test_comparison_and_sign_characters_are_kept():
+    assert consultation_cache_key("Associated symptoms: fever > 40") != consultation_cache_key("Associated symptoms: fever < 40")
+    assert consultation_cache_key("Medical history: HIV +") != consultation_cache_key("Medical history: HIV -")
+
+
+def test_unstructured_bullets_share_a_key():
+    assert consultation_cache_key("- cough\n- fever > 39") == consultation_cache_key("* Cough\n* Fever > 39.")
+
+
+def test_shared_task_does_not_inherit_the_first_callers_context():
+    flight = SingleFlight()
+    seen = {}
+
+    async def consult():
+        await asyncio.sleep(0.01)
+        seen["context"] = caller_context.get()
+        seen["members"] = flight.members("key")
+        return "report"
+
+    async def caller(name):
+        caller_context.set(name)
+        return await flight.run("key", consult, member=name)
+
+    async def scenario():
+        return await asyncio.gather(caller("first"), caller("second"))
+
+    assert asyncio.run(scenario()) == ["report", "report"]
+    assert seen == {"context": None, "members": ["first", "second"]}
+    assert flight.members("key") == []
+
+
+def test_shared_team_run_serves_every_attached_run(monkeypatch):
+    progress = {"run-a": [], "run-b": []}
+
+    async def run_team_consultation(patient_summary, cache_key):
+        await state["second_joined"].wait()
+        team_progress_callback.get()("progress", {"stage": "triage"})
+        for run_id in consultation_run_ids():
+            consultation_checkpoints.save_stage(run_id, "triage", "PRIORITY: ROUTINE")
+
+        await state["first_cancelled"].wait()
+        for run_id in consultation_run_ids():
+            consultation_checkpoints.save_stage(run_id, "diagnostic", "Tension headache")
+        return "Team report"
+
+    monkeypatch.setattr(medical_agent_with_team, "run_team_consultation", run_team_consultation)
+    state = {}
+
+    async def consultation(run_id):
+        patient_session_context.set("patient-1")
+        consultation_run_context.set(run_id)
+        team_progress_callback.set(lambda event, data: progress[run_id].append(data["stage"]))
+        consultation_checkpoints.start(run_id, "patient-1", [])
+        return await get_team_report("PATIENT: 30 years\nCHIEF COMPLAINT: Shared headache")
+
+    async def scenario():
+        state["second_joined"], state["first_cancelled"] = asyncio.Event(), asyncio.Event()
+        first = asyncio.create_task(consultation("run-a"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(consultation("run-b"))
+        await asyncio.sleep(0)
+        state["second_joined"].set()
+        await asyncio.sleep(0.01)
+
+        # The client of run-a cancels: its waiter detaches and its checkpoint is finished
+        first.cancel()
+        await asyncio.sleep(0)
+        stages_of_a = consultation_checkpoints.load_stages("run-a")
+        consultation_checkpoints.finish("run-a")
+        state["first_cancelled"].set()
+        return stages_of_a, await second
+
+    stages_of_a, report = asyncio.run(scenario())
+    assert report == "Team report"
+    assert progress == {"run-a": ["triage"], "run-b": ["triage"]}
+    assert stages_of_a == {"triage": "PRIORITY: ROUTINE"}
+    assert consultation_checkpoints.load_stages("run-a") == {}
+    assert set(consultation_checkpoints.load_stages("run-b")) == {"triage", "diagnostic", "report"}
+    consultation_checkpoints.finish("run-b")
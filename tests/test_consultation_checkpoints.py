@@ -0,0 +1,62 @@
+# test_consultation_checkpoints.py - Checkpointed consultations: leases, resuming and status of orphaned runs
+import asyncio
+import json
+
+import app
+from consultation_checkpoints import CheckpointStore
+
+TEAM_TOOL = {"tool_call_id": "call-1", "tool_name": "medical_team_consultation",
+             "tool_args": {"patient_summary": "PATIENT: x"}, "requires_confirmation": True}
+
+
+class DisconnectedRequest:
+    async def is_disconnected(self):
+        return True
+
+
+def stream_events(run_id: str) -> list:
+    async def collect():
+        response = await app.stream_consultation_status(run_id, DisconnectedRequest())
+        return [chunk async for chunk in response.body_iterator]
+    return asyncio.run(collect())
+
+
+def test_stages_survive_and_orphans_are_claimed_once(tmp_path):
+    db_file = str(tmp_path / "checkpoints.db")
+    gone = CheckpointStore(db_file=db_file, lease_seconds=0)
+    gone.start("run-1", "session-1", [TEAM_TOOL])
+    gone.save_stage("run-1", "triage", "PRIORITY: ROUTINE")
+
+    resumer = CheckpointStore(db_file=db_file, lease_seconds=0)
+    claimed = resumer.claim_orphaned()
+    assert [claim["run_id"] for claim in claimed] == ["run-1"]
+    assert claimed[0]["tools"] == [TEAM_TOOL]
+    assert resumer.load_stages("run-1") == {"triage": "PRIORITY: ROUTINE"}
+
+    resumer.finish("run-1")
+    assert not resumer.is_unfinished("run-1")
+    assert resumer.load_stages("run-1") == {}
+
+
+def test_resume_without_team_tool_marks_the_run_as_error(monkeypatch):
+    async def lost_run(**kwargs):
+        raise RuntimeError("run not found")
+
+    monkeypatch.setattr(app.hausarzt_agent, "acontinue_run", lost_run)
+    other_tool = {**TEAM_TOOL, "tool_name": "something_else"}
+    asyncio.run(app.resume_consultation({"run_id": "run-no-team", "session_id": "s", "tools": [other_tool]}))
+
+    consultation = app.consultation_store.get("run-no-team")
+    assert consultation["status"] == "ERROR"
+    assert consultation["result"] == "Error: consultation could not be resumed"
+
+
+def test_status_stream_finds_checkpointed_runs():
+    app.consultation_checkpoints.start("run-orphaned", "session-1", [TEAM_TOOL])
+    try:
+        events = stream_events("run-orphaned")
+    finally:
+        app.consultation_checkpoints.finish("run-orphaned")
+
+    statuses = [json.loads(event.split("data: ", 1)[1])["status"] for event in events if event.startswith("event: status")]
+    assert statuses == ["RUNNING"]
@@ -0,0 +1,54 @@
+# test_consultation_pipeline.py - Stages run and inputs received per triage level in adaptive mode
+import asyncio
+
+import pytest
+
+import consultation_pipeline
+from consultation_pipeline import run_consultation_pipeline
+
+
+@pytest.fixture
+def stage_inputs(monkeypatch):
+    """Fake specialists: record each stage's dependency inputs and answer with the stage name."""
+    inputs = {}
+
+    def run(level):
+        async def run_stage(stage, agent, patient_summary, dependency_outputs):
+            inputs[stage] = sorted(dependency_outputs)
+            content = f"PRIORITY: {level}" if stage == "triage" else f"{stage} output"
+            return {"content": content, "seconds": 0.0}
+
+        monkeypatch.setattr(consultation_pipeline, "run_stage", run_stage)
+        return asyncio.run(run_consultation_pipeline("PATIENT: x", adaptive=True))
+
+    return inputs, run
+
+
+def test_routine_runs_every_stage_on_its_dependencies(stage_inputs):
+    inputs, run = stage_inputs
+    run("ROUTINE")
+    assert inputs == {
+        "triage": [],
+        "clinical_assessment": [],
+        "diagnostic": ["clinical_assessment", "triage"],
+        "investigation": ["diagnostic", "triage"],
+        "treatment": ["diagnostic", "triage"],
+        "synthesis": ["clinical_assessment", "diagnostic", "investigation", "treatment", "triage"],
+    }
+
+
+def test_monitor_treatment_works_from_the_clinical_assessment(stage_inputs):
+    inputs, run = stage_inputs
+    result = run("MONITOR")
+    assert set(inputs) == {"triage", "clinical_assessment", "treatment", "synthesis"}
+    assert inputs["treatment"] == ["clinical_assessment", "triage"]
+    assert inputs["synthesis"] == ["clinical_assessment", "treatment", "triage"]
+    assert result["triage_level"] == "MONITOR"
+
+
+def test_urgent_stops_after_triage(stage_inputs):
+    inputs, run = stage_inputs
+    result = run("URGENT")
+    assert set(inputs) <= {"triage", "clinical_assessment"}
+    assert "triage" in inputs
+    assert result["content"].startswith("## TRIAGE ASSESSMENT\n**URGENT")
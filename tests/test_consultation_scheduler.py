@@ -0,0 +1,71 @@
+# test_consultation_scheduler.py - Bounded concurrency, priority queue and cancellation of team consultations
+import asyncio
+
+import pytest
+
+from consultation_scheduler import (
+    ROUTINE_PRIORITY,
+    URGENT_PRIORITY,
+    ConsultationQueueFull,
+    ConsultationScheduler,
+    is_urgent_case,
+)
+
+
+def test_red_flags_in_english_and_german():
+    assert is_urgent_case("CHIEF COMPLAINT: Chest pain since 2 hours")
+    assert is_urgent_case("Beschwerden: Atemnot beim Treppensteigen")
+    assert not is_urgent_case("CHIEF COMPLAINT: Mild cough")
+
+
+def test_urgent_jobs_start_before_earlier_routine_jobs():
+    started = []
+    positions = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        def job(name):
+            async def run():
+                started.append(name)
+                if name == "first":
+                    await release.wait()
+            return run
+
+        scheduler = ConsultationScheduler(max_concurrency=1, on_queue_change=positions.append)
+        assert scheduler.submit("first", job("first")) is None
+        assert scheduler.submit("routine", job("routine"), priority=ROUTINE_PRIORITY) == 1
+        assert scheduler.submit("urgent", job("urgent"), priority=URGENT_PRIORITY) == 1
+        assert scheduler.queue_positions() == {"urgent": 1, "routine": 2}
+
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.sleep(0.01)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert started == ["first", "urgent", "routine"]
+    assert stats["running"] == 0 and stats["queued"] == 0
+    assert positions[-1] == {}
+
+
+def test_full_queue_rejects_and_cancel_frees_space():
+    async def scenario():
+        never = asyncio.Event()
+
+        async def wait():
+            await never.wait()
+
+        scheduler = ConsultationScheduler(max_concurrency=1, max_queue_size=1)
+        scheduler.submit("running", wait)
+        scheduler.submit("queued", wait)
+        with pytest.raises(ConsultationQueueFull):
+            scheduler.submit("rejected", wait)
+
+        assert scheduler.cancel("queued")
+        assert scheduler.cancel("running")
+        assert not scheduler.cancel("unknown")
+        await asyncio.sleep(0)
+        return scheduler.stats()
+
+    assert asyncio.run(scenario())["queued"] == 0
@@ -0,0 +1,64 @@
+# test_consultation_store.py - Bounded consultation stores (memory and SQLite)
+import time
+
+import pytest
+
+from consultation_store import InMemoryConsultationStore, SqliteConsultationStore
+
+
+def record(status="COMPLETED", result="report", timestamp=None):
+    return {"status": status, "result": result, "timestamp": time.time() if timestamp is None else timestamp}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**limits):
+        if request.param == "memory":
+            return InMemoryConsultationStore(**limits)
+        return SqliteConsultationStore(db_file=str(tmp_path / "consultations.db"), **limits)
+    return make
+
+
+def test_set_get_delete(make_store):
+    store = make_store()
+    store.set("run-1", record(result={"text": "Bericht"}))
+    assert store.get("run-1")["result"] == {"text": "Bericht"}
+    assert "run-1" in store
+
+    store.delete("run-1")
+    assert store.get("run-1") is None and "run-1" not in store
+
+
+def test_expired_records_are_dropped(make_store):
+    store = make_store(ttl_seconds=60)
+    store.set("old", record(timestamp=0))
+    assert store.get("old") is None
+    assert store.stats()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted(make_store):
+    store = make_store(max_entries=2)
+    store.set("a", record())
+    store.set("b", record())
+    store.get("a")
+    store.set("c", record())
+
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+    assert store.stats()["evictions"] == 1
+
+
+def test_byte_limit_evicts_large_results(make_store):
+    store = make_store(max_bytes=500)
+    store.set("small", record(result="x"))
+    store.set("large", record(result="x" * 400))
+    store.set("other", record(result="y" * 400))
+
+    assert store.stats()["bytes"] <= 500
+    assert store.get("other") is not None
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    db_file = str(tmp_path / "shared.db")
+    SqliteConsultationStore(db_file=db_file).set("run-1", record(status="RUNNING", result=None))
+    assert SqliteConsultationStore(db_file=db_file).get("run-1")["status"] == "RUNNING"
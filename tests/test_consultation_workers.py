@@ -0,0 +1,133 @@
+# test_consultation_workers.py - SQLite job queue, worker jobs and worker process supervision
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from agno.run.agent import RunEvent
+
+from consultation_scheduler import ConsultationQueueFull, URGENT_PRIORITY
+from consultation_workers import JobQueue, WorkerPool, run_job
+
+TOOL = {"tool_call_id": "call-1", "tool_name": "medical_team_consultation",
+        "tool_args": {"patient_summary": "PATIENT: x"}, "requires_confirmation": True}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(db_file=str(tmp_path / "jobs.db"), lease_seconds=30, max_queue_size=3)
+
+
+def test_urgent_jobs_are_claimed_first(queue):
+    assert queue.enqueue("routine", "s1", [TOOL]) == 1
+    assert queue.enqueue("urgent", "s2", [TOOL], priority=URGENT_PRIORITY) == 1
+    assert queue.queue_positions() == {"urgent": 1, "routine": 2}
+
+    assert queue.claim("worker")["run_id"] == "urgent"
+    assert queue.stats()["running"] == 1 and queue.stats()["queued"] == 1
+
+
+def test_full_queue_rejects_new_jobs(queue):
+    for n in range(3):
+        queue.enqueue(f"run-{n}", "s", [TOOL])
+    with pytest.raises(ConsultationQueueFull):
+        queue.enqueue("run-3", "s", [TOOL])
+
+
+def test_results_and_events_reach_the_owner_only(queue, tmp_path):
+    other_instance = JobQueue(db_file=str(tmp_path / "jobs.db"))
+    queue.enqueue("run-1", "session-1", [TOOL])
+    job = queue.claim("worker")
+    queue.publish(job["run_id"], "token", {"content": "Hallo"})
+    queue.finish(job["run_id"], "COMPLETED", "Antwort")
+
+    events, finished = queue.updates(0)
+    assert [(run_id, event, data) for _, run_id, event, data in events] == [("run-1", "token", {"content": "Hallo"})]
+    assert finished == [{"run_id": "run-1", "session_id": "session-1", "status": "COMPLETED", "result": "Antwort"}]
+    assert other_instance.updates(0) == ([], [])
+
+    queue.acknowledge("run-1")
+    assert queue.updates(0) == ([], [])
+
+
+def test_jobs_of_lost_workers_are_queued_again(queue):
+    queue.lease_seconds = 0
+    queue.enqueue("run-1", "s", [TOOL])
+    queue.claim("worker")
+    assert queue.requeue_stale() == ["run-1"]
+    assert queue.claim("other-worker")["run_id"] == "run-1"
+
+
+def test_cancel_drops_queued_and_flags_running_jobs(queue):
+    queue.enqueue("queued", "s", [TOOL])
+    queue.enqueue("running", "s", [TOOL], priority=URGENT_PRIORITY)
+    queue.claim("worker")
+
+    assert queue.cancel("queued") and queue.cancel("running")
+    assert queue.cancel_requested(["running"]) == ["running"]
+    assert not queue.cancel("unknown")
+
+
+def test_worker_reads_the_paused_session_from_disk(queue):
+    calls = []
+
+    async def acontinue_run(**kwargs):
+        calls.append(("continue", kwargs["session_id"]))
+        yield SimpleNamespace(event=RunEvent.run_content, content="Antwort")
+        yield SimpleNamespace(event=RunEvent.run_completed, metrics=None)
+
+    db = SimpleNamespace(forget=lambda session_id: calls.append(("forget", session_id)))
+    agent = SimpleNamespace(model=SimpleNamespace(id="gpt-test"), db=db, acontinue_run=acontinue_run)
+    queue.enqueue("run-1", "session-1", [TOOL])
+
+    asyncio.run(run_job(agent, queue, queue.claim("worker")))
+
+    assert calls == [("forget", "session-1"), ("continue", "session-1")]
+    assert queue.updates(0)[1][0]["result"] == "Antwort"
+
+
+def test_supervise_restarts_exited_workers(monkeypatch):
+    pool = WorkerPool(size=2)
+    spawned = []
+    monkeypatch.setattr(pool, "_spawn", lambda worker_id: spawned.append(worker_id))
+    pool.processes = {"alive": SimpleNamespace(poll=lambda: None), "dead": SimpleNamespace(poll=lambda: 1, returncode=1)}
+
+    pool.supervise()
+    assert spawned == ["dead"]
+
+
+def test_app_relay_supervises_the_worker_processes(monkeypatch, queue):
+    import app
+
+    class Supervised(Exception):
+        pass
+
+    def supervise():
+        raise Supervised
+
+    monkeypatch.setattr(app, "consultation_jobs", queue)
+    monkeypatch.setattr(app.consultation_workers, "supervise", supervise)
+    with pytest.raises(Supervised):
+        asyncio.run(app.relay_job_updates())
+
+
+def test_requeue_check_does_not_write_without_stale_jobs(queue):
+    queue.enqueue("run-1", "s", [TOOL])
+    queue.claim("worker")
+    writes = queue._conn.total_changes
+
+    assert queue.requeue_stale() == []
+    assert queue._conn.total_changes == writes
+
+
+def test_status_polls_use_the_relayed_queue_positions(monkeypatch, queue):
+    import app
+
+    def blocking_query():
+        raise AssertionError("status polls must not query the job queue")
+
+    monkeypatch.setattr(app, "consultation_jobs", queue)
+    monkeypatch.setattr(queue, "queue_positions", blocking_query)
+    monkeypatch.setitem(app.job_queue_positions, "queued-run", 3)
+    app.update_consultation("queued-run", "RUNNING")
+
+    assert app.get_consultation_status_record("queued-run")["queue_position"] == 3
@@ -0,0 +1,74 @@
+# test_history_compaction.py - History token estimate and compaction of old runs
+import time
+
+from agno.db.base import SessionType
+from agno.models.message import Message
+from agno.run.agent import RunOutput
+from agno.run.base import RunStatus
+from agno.session import AgentSession
+
+from history_compaction import (
+    COMPACTED_MARKER,
+    compact_session_history,
+    estimate_history_tokens,
+    estimate_tokens,
+    history_runs,
+)
+from session_storage import BoundedSqliteDb
+
+SYSTEM_PROMPT = "Du bist Dr. Hausarzt. " * 200
+LONG_ANSWER = "Ausführliche Antwort mit vielen Details. " * 200
+
+
+def make_run(index: int, answer: str = LONG_ANSWER, status=RunStatus.completed, earlier: list = ()) -> RunOutput:
+    messages = [Message(role="system", content=SYSTEM_PROMPT)]
+    messages += [Message(role=message.role, content=message.content, from_history=True) for message in earlier]
+    messages += [Message(role="user", content=f"Frage {index}"), Message(role="assistant", content=answer)]
+    return RunOutput(run_id=f"run-{index}", session_id="s", content=answer, messages=messages, status=status)
+
+
+def make_session(runs: list) -> AgentSession:
+    return AgentSession(session_id="s", runs=runs, created_at=int(time.time()))
+
+
+def own_messages(run: RunOutput) -> list:
+    return [message for message in run.messages if message.role != "system" and not message.from_history]
+
+
+def test_estimate_counts_only_replayed_messages():
+    first = make_run(1)
+    second = make_run(2, earlier=own_messages(first))  # agno stores the replayed history again
+    paused = make_run(3, status=RunStatus.paused)
+    session = make_session([first, second, paused])
+
+    runs = history_runs(session, 10)
+    assert [run.run_id for run in runs] == ["run-1", "run-2"]
+    expected = sum(estimate_tokens(message.content) for run in (first, second) for message in own_messages(run))
+    assert estimate_history_tokens(runs) == expected
+
+
+def test_history_below_budget_is_left_alone(tmp_path):
+    db = BoundedSqliteDb(db_file=str(tmp_path / "sessions.db"))
+    db.upsert_session(make_session([make_run(1), make_run(2)]))
+
+    tokens = compact_session_history(db, "s", 10, token_budget=100_000)
+
+    session = db.get_session(session_id="s", session_type=SessionType.AGENT)
+    assert tokens == estimate_history_tokens(session.runs)
+    assert not any(str(message.content).startswith(COMPACTED_MARKER) for run in session.runs for message in run.messages)
+
+
+def test_compaction_skips_system_and_recent_runs(tmp_path):
+    db = BoundedSqliteDb(db_file=str(tmp_path / "sessions.db"))
+    db.upsert_session(make_session([make_run(index) for index in range(1, 6)]))
+    budget = 3 * estimate_tokens(LONG_ANSWER)
+
+    tokens = compact_session_history(db, "s", 10, token_budget=budget)
+
+    session = db.get_session(session_id="s", session_type=SessionType.AGENT)
+    assert tokens <= budget
+    for run in session.runs:
+        assert run.messages[0].content == SYSTEM_PROMPT
+    assert session.runs[0].messages[-1].content.startswith(COMPACTED_MARKER)
+    assert session.runs[-1].messages[-1].content == LONG_ANSWER
+    assert session.runs[-2].messages[-1].content == LONG_ANSWER
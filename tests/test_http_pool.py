@@ -0,0 +1,37 @@
+# test_http_pool.py - Shared async and sync HTTP clients of the OpenAI models
+import asyncio
+
+import httpx
+
+import http_pool
+from http_pool import close_http_client, get_async_http_client, get_sync_http_client, http_pool_stats
+from model_routing import create_model
+
+
+def test_clients_are_shared_and_recreated_after_close():
+    sync_client = get_sync_http_client()
+    async_client = get_async_http_client()
+    assert get_sync_http_client() is sync_client
+    assert get_async_http_client() is async_client
+
+    asyncio.run(close_http_client())
+    assert sync_client.is_closed
+    assert get_sync_http_client() is not sync_client
+
+
+def test_sync_client_uses_the_pool_limits():
+    pool = get_sync_http_client()._transport._pool
+    assert pool._max_connections == http_pool.OPENAI_MAX_CONNECTIONS
+    assert pool._max_keepalive_connections == http_pool.OPENAI_MAX_KEEPALIVE_CONNECTIONS
+
+
+def test_models_use_the_pooled_clients_for_sync_and_async_calls():
+    model = create_model("gpt-test", "triage")
+    assert model.get_client()._client is get_sync_http_client()
+    assert model.get_async_client()._client is get_async_http_client()
+
+
+def test_sync_requests_are_counted():
+    before = http_pool_stats()["requests"]
+    http_pool._on_request_sync(httpx.Request("POST", "https://api.openai.com/v1/chat/completions", json={"a": 1}))
+    assert http_pool_stats()["requests"] == before + 1
@@ -0,0 +1,69 @@
+# test_latency_control.py - Agent call deadlines, retries and hedged requests
+import asyncio
+
+import pytest
+
+import latency_control
+from latency_control import call_with_deadline, hedged, latency_control_stats, latency_percentile, record_duration
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(latency_control, "AGENT_RETRY_BACKOFF_SECONDS", 0)
+
+
+def test_slow_call_times_out_and_is_retried(monkeypatch):
+    monkeypatch.setenv("AGENT_DEADLINE_TESTROLE", "0.05")
+    monkeypatch.setattr(latency_control, "AGENT_CALL_RETRIES", 1)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(1)
+        return "ok"
+
+    before = latency_control_stats()
+    assert asyncio.run(call_with_deadline("testrole", call)) == "ok"
+    after = latency_control_stats()
+    assert len(attempts) == 2
+    assert after["timeouts"] == before["timeouts"] + 1
+    assert after["retries"] == before["retries"] + 1
+
+
+def test_last_failure_is_raised(monkeypatch):
+    monkeypatch.setattr(latency_control, "AGENT_CALL_RETRIES", 1)
+
+    async def call():
+        raise ValueError("model error")
+
+    with pytest.raises(ValueError):
+        asyncio.run(call_with_deadline("failing", call))
+
+
+def test_percentile_needs_enough_samples(monkeypatch):
+    monkeypatch.setattr(latency_control, "HEDGE_MIN_SAMPLES", 3)
+    record_duration("sampled", 0.1)
+    assert latency_percentile("sampled", 95) is None
+    for seconds in (0.2, 0.3):
+        record_duration("sampled", seconds)
+    assert latency_percentile("sampled", 95) == 0.3
+
+
+def test_hedge_wins_over_a_stuck_call(monkeypatch):
+    monkeypatch.setattr(latency_control, "HEDGE_REQUESTS", True)
+    monkeypatch.setattr(latency_control, "HEDGE_MIN_SAMPLES", 1)
+    record_duration("hedged-role", 0.01)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+        return f"call {len(calls)}"
+
+    before = latency_control_stats()
+    assert asyncio.run(hedged("hedged-role", call)) == "call 2"
+    after = latency_control_stats()
+    assert after["hedged"] == before["hedged"] + 1
+    assert after["hedge_wins"] == before["hedge_wins"] + 1
@@ -0,0 +1,64 @@
+# test_prompt_caching.py - Static prompt prefixes stay byte-identical across patients and sessions
+import asyncio
+import json
+import threading
+
+import prompt_caching
+from medical_agent_with_team import create_hausarzt_agent, create_medical_team
+from prompt_caching import PrefixMonitor, observe_request_body, static_prefix
+
+
+def sent_bodies(agent, fake_openai, messages: list) -> list:
+    agent.model.http_client = fake_openai
+
+    async def consult():
+        for n, message in enumerate(messages):
+            await agent.arun(message, session_id=f"prefix-session-{n}", stream=False)
+
+    asyncio.run(consult())
+    return fake_openai.requests
+
+
+def test_hausarzt_prefix_does_not_depend_on_the_patient(fake_openai):
+    bodies = sent_bodies(create_hausarzt_agent(), fake_openai, ["Ich habe Kopfschmerzen.", "Mein Knie tut weh."])
+
+    assert static_prefix(bodies[0]) == static_prefix(bodies[1])
+    assert bodies[0]["prompt_cache_key"] == bodies[1]["prompt_cache_key"]
+    assert bodies[0]["messages"][-1]["content"] != bodies[1]["messages"][-1]["content"]
+
+
+def test_team_leader_prefix_does_not_depend_on_the_patient(fake_openai):
+    team = create_medical_team()["medical_team"]
+    bodies = sent_bodies(team, fake_openai, ["PATIENT: 30 years\nCHIEF COMPLAINT: Cough", "PATIENT: 70 years\nCHIEF COMPLAINT: Dizziness"])
+
+    assert static_prefix(bodies[0]) == static_prefix(bodies[1])
+
+
+def test_monitor_counts_prefix_changes():
+    monitor = PrefixMonitor()
+    body = {"prompt_cache_key": "test:role", "messages": [{"role": "system", "content": "Instructions"}]}
+    monitor.observe(body)
+    monitor.observe({**body, "messages": body["messages"] + [{"role": "user", "content": "case"}]})
+    assert monitor.stats()["test:role"]["changes"] == 0
+
+    monitor.observe({**body, "messages": [{"role": "system", "content": "Instructions, today is Monday"}]})
+    assert monitor.stats()["test:role"] == {**monitor.stats()["test:role"], "sampled_requests": 3, "changes": 1}
+    assert json.loads(static_prefix(body))[0] == ["Instructions"]
+
+
+def test_request_bodies_are_sampled_and_parsed_off_the_caller(monkeypatch):
+    body = {"prompt_cache_key": "test:sampled", "messages": [{"role": "system", "content": "Instructions"}]}
+    content = json.dumps(body).encode("utf-8")
+    parsed_in = []
+    observe = prompt_caching.prefix_monitor.observe
+    monkeypatch.setattr(prompt_caching.prefix_monitor, "observe",
+                        lambda body: parsed_in.append(threading.current_thread().name) or observe(body))
+
+    monkeypatch.setattr(prompt_caching, "PROMPT_PREFIX_SAMPLE_RATE", 0)
+    observe_request_body(content)
+    monkeypatch.setattr(prompt_caching, "PROMPT_PREFIX_SAMPLE_RATE", 1)
+    observe_request_body(content)
+    prompt_caching._prefix_executor.submit(lambda: None).result()  # wait for the sampled body
+
+    assert len(parsed_in) == 1 and parsed_in[0].startswith("prompt-prefix")
+    assert prompt_caching.prefix_monitor.stats()["test:sampled"]["sampled_requests"] == 1
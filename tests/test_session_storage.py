@@ -0,0 +1,102 @@
+# test_session_storage.py - Bounded SQLite session storage with its memory tier
+import inspect
+import time
+
+import pytest
+from agno.db.base import SessionType
+from agno.db.sqlite import SqliteDb
+from agno.models.message import Message
+from agno.run.agent import RunOutput
+from agno.session import AgentSession, TeamSession
+
+import medical_agent_with_team
+from session_storage import BoundedSqliteDb
+
+
+def make_session(session_id: str, run_count: int, answer: str = "Antwort") -> AgentSession:
+    runs = [
+        RunOutput(
+            run_id=f"{session_id}-{index}",
+            session_id=session_id,
+            content=answer,
+            messages=[Message(role="user", content=f"Frage {index}"), Message(role="assistant", content=answer)],
+        )
+        for index in range(run_count)
+    ]
+    return AgentSession(session_id=session_id, runs=runs, created_at=int(time.time()))
+
+
+@pytest.fixture
+def db(tmp_path):
+    return BoundedSqliteDb(db_file=str(tmp_path / "sessions.db"), max_runs=5, max_bytes=100_000)
+
+
+def test_repeated_reads_keep_run_messages(db):
+    db.upsert_session(make_session("s", 2))
+
+    for _ in range(3):
+        session = db.get_session("s", SessionType.AGENT)
+        assert [len(run.messages) for run in session.runs] == [2, 2]
+    assert db.stats()["hits"] == 3
+
+
+def test_runs_beyond_limits_are_trimmed(tmp_path):
+    db = BoundedSqliteDb(db_file=str(tmp_path / "sessions.db"), max_runs=5, max_bytes=3_000)
+    db.upsert_session(make_session("s", 8, answer="x" * 500))
+
+    session = db.get_session("s", SessionType.AGENT)
+    assert 1 <= len(session.runs) < 5
+    assert session.runs[-1].run_id == "s-7"
+    assert db.stats()["trimmed_runs"] == 8 - len(session.runs)
+
+
+def test_forgotten_session_is_read_back_from_disk(db):
+    db.upsert_session(make_session("s", 2))
+    db.forget("s")
+
+    session = db.get_session("s", SessionType.AGENT)
+    assert [run.run_id for run in session.runs] == ["s-0", "s-1"]
+    assert db.stats()["misses"] == 1
+
+
+def test_idle_sessions_leave_memory(tmp_path):
+    db = BoundedSqliteDb(db_file=str(tmp_path / "sessions.db"), cache_max_sessions=1)
+    db.upsert_session(make_session("a", 1))
+    db.upsert_session(make_session("b", 1))
+
+    assert db.stats()["active_sessions"] == 1
+    assert db.get_session("a", SessionType.AGENT).runs[0].run_id == "a-0"
+
+
+def test_unserialized_reads_return_copies(db):
+    db.upsert_session(make_session("s", 1))
+
+    first = db.get_session("s", SessionType.AGENT, deserialize=False)
+    first["runs"].clear()
+    assert len(db.get_session("s", SessionType.AGENT, deserialize=False)["runs"]) == 1
+
+
+@pytest.mark.skipif("runs_limit" not in inspect.signature(SqliteDb.get_session).parameters,
+                    reason="agno version without runs_limit")
+def test_runs_limit_is_passed_through(db):
+    db.upsert_session(make_session("s", 4))
+
+    session = db.get_session("s", SessionType.AGENT, runs_limit=2)
+    assert [run.run_id for run in session.runs] == ["s-2", "s-3"]
+
+
+def test_team_session_stats_read_each_session_once_and_are_capped(db, monkeypatch):
+    for index in range(3):
+        session = make_session(f"team-{index}", index + 1)
+        db.upsert_session(TeamSession(session_id=session.session_id, runs=session.runs, created_at=session.created_at))
+
+    def second_read(*args, **kwargs):
+        raise AssertionError("sizes must come from the rows already fetched")
+
+    monkeypatch.setattr(medical_agent_with_team, "shared_db", db)
+    monkeypatch.setattr(medical_agent_with_team, "TEAM_SESSION_STATS_LIMIT", 2)
+    monkeypatch.setattr(db, "get_session", second_read)
+
+    stats = medical_agent_with_team.team_session_stats()
+    assert stats["sessions"] == 3 and stats["measured_sessions"] == 2
+    assert all(size["runs"] > 0 and size["bytes"] > 0 for size in stats["largest"])
@@ -0,0 +1,69 @@
+# test_specialist_reports.py - Typed specialist results, triage instructions and report rendering
+import specialist_reports
+from consultation_pipeline import parse_triage_level
+from medical_agent_with_team import create_medical_team
+from specialist_reports import (
+    PARTIAL_REPORT_MARKER,
+    Diagnosis,
+    DifferentialDiagnosis,
+    TreatmentPlan,
+    TriageReport,
+    render_partial_report,
+    render_team_report,
+)
+
+PRIORITY_LINE = "Start your answer with one line"
+
+TRIAGE = TriageReport(priority="ROUTINE", rationale="Stable vital signs.")
+DIAGNOSES = DifferentialDiagnosis(diagnoses=[
+    Diagnosis(name="Tension headache", likelihood="high", rationale="Typical pattern."),
+    Diagnosis(name="Meningitis", likelihood="low", rationale="No fever.", must_not_miss=True),
+])
+TREATMENT = TreatmentPlan(medications=["Ibuprofen 400 mg"], warning_signs=["stiff neck"], follow_up="In one week.")
+
+
+def test_triage_relies_on_the_schema_when_structured(monkeypatch):
+    monkeypatch.setattr(specialist_reports, "STRUCTURED_SPECIALIST_OUTPUTS", True)
+    triage_agent = create_medical_team()["triage_agent"]
+
+    assert triage_agent.output_schema is TriageReport
+    assert not any(PRIORITY_LINE in line for line in triage_agent.instructions)
+
+
+def test_triage_asks_for_a_priority_line_without_schema(monkeypatch):
+    monkeypatch.setattr(specialist_reports, "STRUCTURED_SPECIALIST_OUTPUTS", False)
+    triage_agent = create_medical_team()["triage_agent"]
+
+    assert triage_agent.output_schema is None
+    assert any(PRIORITY_LINE in line for line in triage_agent.instructions)
+
+
+def test_parse_triage_level():
+    assert parse_triage_level(TriageReport(priority="URGENT", rationale="Chest pain.")) == "URGENT"
+    assert parse_triage_level("PRIORITY: MONITOR\nMild cold.") == "MONITOR"
+    assert parse_triage_level("no level given") == "ROUTINE"
+
+
+def test_team_report_has_all_sections_in_order():
+    report = render_team_report({"triage": TRIAGE, "diagnostic": DIAGNOSES, "treatment": TREATMENT}, "ROUTINE")
+
+    titles = [line for line in report.splitlines() if line.startswith("## ")]
+    assert titles == [
+        "## TRIAGE ASSESSMENT", "## CLINICAL FINDINGS", "## DIFFERENTIAL DIAGNOSIS",
+        "## RECOMMENDED INVESTIGATIONS", "## TREATMENT PLAN", "## FOLLOW-UP RECOMMENDATIONS",
+    ]
+    assert "⚠️ must not miss" in report
+    assert "Not required at triage level ROUTINE." in report
+    assert "Seek medical attention immediately if: stiff neck" in report
+
+
+def test_team_report_needs_typed_results():
+    assert render_team_report({"triage": TRIAGE, "diagnostic": "free text"}) is None
+
+
+def test_partial_report_is_marked_and_names_missing_stages():
+    report = render_partial_report({"triage": TRIAGE, "diagnostic": "free text"}, ["investigation", "treatment"])
+
+    assert report.startswith(PARTIAL_REPORT_MARKER)
+    assert "Missing: investigation, treatment" in report
+    assert "free text" in report
@@ -0,0 +1,40 @@
+# test_streaming_modes.py - Streamed and non-streamed runs on the same shared agent
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from batch_consultations import run_hausarzt_conversation
+from medical_agent_with_team import create_hausarzt_agent
+
+
+async def consume_stream(agent, message: str, session_id: str) -> None:
+    async for _ in agent.arun(message, session_id=session_id, stream=True):
+        pass
+
+
+def test_non_streamed_run_after_streamed_run(fake_openai):
+    agent = create_hausarzt_agent()
+    agent.model.http_client = fake_openai
+
+    async def scenario():
+        await consume_stream(agent, "Ich habe Kopfschmerzen", "stream-then-plain")
+        return await run_hausarzt_conversation(agent, ["Seit gestern"], "stream-then-plain")
+
+    responses = asyncio.run(scenario())
+    assert responses[0]["answer"] == "Alles in Ordnung"
+    assert fake_openai.requests[-1].get("stream") is not True
+
+
+def test_consultation_endpoint_after_streamed_request(fake_openai):
+    import app
+
+    app.hausarzt_agent.model.http_client = fake_openai
+    client = TestClient(app.app)
+
+    streamed = client.post("/api/consultation", data={"message": "Hallo", "session_id": "endpoint", "stream": "true"})
+    assert streamed.status_code == 200
+    assert "event: status" in streamed.text
+
+    plain = client.post("/api/consultation", data={"message": "Und jetzt?", "session_id": "endpoint"})
+    assert plain.status_code == 200
+    assert plain.json() == {"status": "COMPLETED", "result": "Alles in Ordnung"}
@@ -0,0 +1,65 @@
+# test_tracing.py - Span metrics, cost estimates and the Prometheus exposition
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from tracing import Counter, Histogram, estimate_cost, record_span, render_prometheus, span_cost, span_tokens
+
+
+def metric_types(text: str) -> dict:
+    return {line.split()[2]: line.split()[3] for line in text.splitlines() if line.startswith("# TYPE")}
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Test", ("span",), buckets=(1, 5))
+    histogram.observe(("a",), 0.5)
+    histogram.observe(("a",), 3)
+
+    lines = histogram.render()
+    assert 'test_seconds_bucket{span="a",le="1"} 1' in lines
+    assert 'test_seconds_bucket{span="a",le="5"} 2' in lines
+    assert 'test_seconds_bucket{span="a",le="+Inf"} 2' in lines
+    assert histogram.summaries() == {("a",): {"sum": 3.5, "count": 2}}
+
+
+def test_counter_renders_labels():
+    counter = Counter("test_total", "Test", ("span",))
+    counter.inc(("a",), 2)
+    assert counter.render()[-1] == 'test_total{span="a"} 2'
+
+
+def test_cached_tokens_are_billed_at_the_cached_price():
+    full = estimate_cost("gpt-4.1", 1_000_000, 0)
+    cached = estimate_cost("gpt-4.1", 1_000_000, 0, cached_tokens=1_000_000)
+    assert 0 < cached < full
+    assert estimate_cost("unknown-model", 1000, 1000) == 0
+
+
+def test_record_span_counts_tokens_and_cost():
+    metrics = SimpleNamespace(input_tokens=1000, output_tokens=100, cache_read_tokens=200, time_to_first_token=0.3)
+    record_span("test_span", 1.2, model="gpt-4.1", metrics=metrics)
+
+    tokens = span_tokens.values()
+    assert tokens[("test_span", "gpt-4.1", "prompt")] >= 1000
+    assert tokens[("test_span", "gpt-4.1", "cached")] >= 200
+    assert span_cost.values()[("test_span", "gpt-4.1")] > 0
+
+
+def test_counters_are_exported_with_total_suffix():
+    types = metric_types(render_prometheus({"queue_depth": 3}, {"cache_hits": 7}))
+    assert types["queue_depth"] == "gauge"
+    assert types["cache_hits_total"] == "counter"
+
+
+def test_metrics_endpoint_types():
+    import app
+
+    response = TestClient(app.app).get("/metrics")
+    types = metric_types(response.text)
+
+    assert types["consultation_scheduler_queued"] == "gauge"
+    for name in ("consultation_cache_hits", "consultation_cache_misses", "openai_http_connections_opened",
+                 "consultation_agent_calls_timeouts", "consultation_agent_calls_retries",
+                 "consultation_agent_calls_partial_reports"):
+        assert types[f"{name}_total"] == "counter"
+        assert name not in types
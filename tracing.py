@@ -0,0 +1,192 @@
+# tracing.py - Consultation spans exported as Prometheus metrics (optionally OpenTelemetry)
+import os
+import time
+import asyncio
+import threading
+import contextlib
+
+# --- Tracing Configuration ---
+# Also emit OpenTelemetry spans (needs opentelemetry-api plus an SDK/exporter set up by the deployment)
+OTEL_TRACING = os.getenv("OTEL_TRACING", "false").lower() == "true"
+
+try:
+    from opentelemetry import trace as otel_trace
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+
+tracer = otel_trace.get_tracer("medical-bot") if OTEL_TRACING and OTEL_AVAILABLE else None
+
+# USD per 1M tokens (input, cached input, output); unknown models are counted with cost 0
+MODEL_PRICES = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> {"buckets": [...], "sum": float, "count": int}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            series = self._series.setdefault(labels, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                label_text = format_labels(self.label_names, labels)
+                bucket_prefix = f"{label_text}," if label_text else ""
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f'{self.name}_bucket{{{bucket_prefix}le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{bucket_prefix}le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{label_block(label_text)} {series['sum']}")
+                lines.append(f"{self.name}_count{label_block(label_text)} {series['count']}")
+        return lines
+
+    def summaries(self) -> dict:
+        """labels -> {"sum", "count"}"""
+        with self._lock:
+            return {labels: {"sum": series["sum"], "count": series["count"]} for labels, series in self._series.items()}
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}  # labels -> float
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def values(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{label_block(format_labels(self.label_names, labels))} {value}")
+        return lines
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{str(value).replace(chr(34), chr(39))}"' for name, value in zip(names, values))
+
+
+def label_block(label_text: str) -> str:
+    return f"{{{label_text}}}" if label_text else ""
+
+
+# --- Metrics ---
+span_seconds = Histogram(
+    "consultation_span_seconds", "Wall time of consultation spans", ("span", "status")
+)
+queue_seconds = Histogram(
+    "consultation_queue_seconds", "Time team consultations waited for a slot", ()
+)
+span_tokens = Counter(
+    "consultation_tokens_total", "Model tokens used per span (cached: prompt tokens served from the provider cache)",
+    ("span", "model", "kind")
+)
+time_to_first_token = Histogram(
+    "consultation_time_to_first_token_seconds", "Time to the first streamed model token", ("span", "model")
+)
+span_cost = Counter(
+    "consultation_cost_usd_total", "Estimated model cost per span in USD", ("span", "model")
+)
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    """Cost in USD; ``cached_tokens`` are the part of ``input_tokens`` billed at the cached price."""
+    input_price, cached_price, output_price = MODEL_PRICES.get(model or "", (0.0, 0.0, 0.0))
+    cached_tokens = min(cached_tokens, input_tokens)
+    return ((input_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + output_tokens * output_price) / 1_000_000
+
+
+def record_span(span: str, seconds: float, status: str = "ok", model: str = None, metrics=None) -> None:
+    """Record one finished span with its token usage (agno run metrics, if any)."""
+    span_seconds.observe((span, status), seconds)
+    if metrics is None:
+        return
+    input_tokens = getattr(metrics, "input_tokens", 0) or 0
+    output_tokens = getattr(metrics, "output_tokens", 0) or 0
+    cached_tokens = getattr(metrics, "cache_read_tokens", 0) or 0
+    model = model or "unknown"
+    span_tokens.inc((span, model, "prompt"), input_tokens)
+    span_tokens.inc((span, model, "cached"), cached_tokens)
+    span_tokens.inc((span, model, "completion"), output_tokens)
+    span_cost.inc((span, model), estimate_cost(model, input_tokens, output_tokens, cached_tokens))
+    first_token_seconds = getattr(metrics, "time_to_first_token", None)
+    if first_token_seconds:
+        time_to_first_token.observe((span, model), first_token_seconds)
+
+
+def record_queue_time(seconds: float) -> None:
+    queue_seconds.observe((), seconds)
+
+
+@contextlib.contextmanager
+def trace_span(span: str, model: str = None):
+    """Time a block as a span. Set ``["metrics"]`` on the yielded dict to record token usage."""
+    record = {"metrics": None, "model": model}
+    status = "ok"
+    otel_span = tracer.start_as_current_span(f"consultation.{span}") if tracer else contextlib.nullcontext()
+    started = time.perf_counter()
+    with otel_span as current:
+        try:
+            yield record
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        except asyncio.TimeoutError:
+            status = "timeout"
+            raise
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            record_span(span, seconds, status, record["model"], record["metrics"])
+            if current is not None:
+                current.set_attribute("status", status)
+                if record["model"]:
+                    current.set_attribute("model", record["model"])
+                if record["metrics"] is not None:
+                    current.set_attribute("input_tokens", getattr(record["metrics"], "input_tokens", 0) or 0)
+                    current.set_attribute("output_tokens", getattr(record["metrics"], "output_tokens", 0) or 0)
+                    current.set_attribute("cached_tokens", getattr(record["metrics"], "cache_read_tokens", 0) or 0)
+
+
+def render_prometheus(gauges: dict = None, counters: dict = None) -> str:
+    """All metrics in the Prometheus text exposition format, plus optional plain gauges
+    and counters (monotonic totals, exported with the ``_total`` suffix)."""
+    lines = []
+    for metric in (span_seconds, queue_seconds, time_to_first_token, span_tokens, span_cost):
+        lines += metric.render()
+    for name, value in (gauges or {}).items():
+        lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    for name, value in (counters or {}).items():
+        lines += [f"# TYPE {name}_total counter", f"{name}_total {value}"]
+    return "\n".join(lines) + "\n"